@@ -0,0 +1,89 @@
+import random
+import time
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand
+
+from accesses.services.perimeters import perimeters_service
+from accesses.services.perimeters_hierarchy import HierarchyIndex
+
+
+def build_synthetic_hierarchy(size: int, branching: int) -> list:
+    """rows of (id, above_levels_ids, cohort_id) for a balanced tree of `size` perimeters rooted at 0"""
+    rows = [(0, "", None)]
+    above_levels: Dict[int, List[int]] = {0: []}
+    for p_id in range(1, size):
+        parent_id = (p_id - 1) // branching
+        above_levels[p_id] = [parent_id] + above_levels[parent_id]
+        rows.append((p_id, ",".join(map(str, above_levels[p_id])), None))
+    return rows
+
+
+def legacy_read_rights(above_levels: dict, target_ids: list, read_nomi_ids: list, read_pseudo_ids: list) -> dict:
+    """list-based algorithm previously used by PerimetersService, the DB reads being replaced by `above_levels`"""
+    read_nomi_ids, read_pseudo_ids = list(read_nomi_ids), list(read_pseudo_ids)
+    for p_id in list(read_nomi_ids):
+        if any(parent_id in read_nomi_ids for parent_id in above_levels[p_id]):
+            read_nomi_ids.remove(p_id)
+    for p_id in list(read_pseudo_ids):
+        if any((parent_id in read_pseudo_ids or parent_id in read_nomi_ids or p_id in read_nomi_ids) for parent_id in above_levels[p_id]):
+            read_pseudo_ids.remove(p_id)
+    read_rights = {}
+    for p_id in target_ids:
+        perimeter_and_parents_ids = [p_id] + above_levels[p_id]
+        if any(p in read_nomi_ids for p in perimeter_and_parents_ids):
+            read_rights[p_id] = (True, True)
+        elif any(p in read_pseudo_ids for p in perimeter_and_parents_ids):
+            read_rights[p_id] = (False, True)
+        else:
+            read_rights[p_id] = (False, False)
+    return read_rights
+
+
+def set_based_read_rights(index: HierarchyIndex, target_ids: list, read_nomi_ids: list, read_pseudo_ids: list) -> dict:
+    top_nomi_ids = perimeters_service.get_top_perimeters_with_read_nomi_right(read_nomi_perimeters_ids=read_nomi_ids, index=index)
+    top_pseudo_ids = perimeters_service.get_top_perimeters_with_read_pseudo_right(
+        top_read_nomi_perimeters_ids=top_nomi_ids, read_pseudo_perimeters_ids=read_pseudo_ids, index=index
+    )
+    return perimeters_service.get_read_rights_per_perimeter(
+        perimeters_ids=target_ids, top_read_nomi_perimeters_ids=top_nomi_ids, top_read_pseudo_perimeters_ids=top_pseudo_ids, index=index
+    )
+
+
+class Command(BaseCommand):
+    help = "Benchmark the perimeters read rights computation against the legacy list-based algorithm on a synthetic hierarchy (no DB access)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--perimeters", type=int, default=50_000, help="Number of perimeters in the synthetic hierarchy")
+        parser.add_argument("--branching", type=int, default=8, help="Number of children per perimeter")
+        parser.add_argument("--accesses", type=int, default=500, help="Number of perimeters with a data reading access")
+        parser.add_argument("--targets", type=int, default=5_000, help="Number of target perimeters to compute rights for")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        rows = build_synthetic_hierarchy(size=options["perimeters"], branching=options["branching"])
+        index = HierarchyIndex.build(rows)
+        above_levels = {p_id: sorted(ancestors) for p_id, ancestors in index.ancestors.items()}
+
+        all_ids = list(index.ancestors)
+        read_pseudo_ids = rng.sample(all_ids, options["accesses"])
+        read_nomi_ids = read_pseudo_ids[: len(read_pseudo_ids) // 2]
+        target_ids = rng.sample(all_ids, options["targets"])
+
+        start = time.perf_counter()
+        legacy = legacy_read_rights(above_levels, target_ids, read_nomi_ids, read_pseudo_ids)
+        legacy_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = set_based_read_rights(index, target_ids, read_nomi_ids, read_pseudo_ids)
+        set_based_duration = time.perf_counter() - start
+
+        if result != legacy:
+            self.stderr.write("Results differ between the legacy and the set-based algorithms")
+            return
+        self.stdout.write(
+            f"{len(all_ids)} perimeters, {len(read_pseudo_ids)} data accesses, {len(target_ids)} targets: "
+            f"legacy={legacy_duration * 1000:.1f}ms set-based={set_based_duration * 1000:.1f}ms "
+            f"(x{legacy_duration / max(set_based_duration, 1e-9):.1f})"
+        )
@@ -27,7 +27,11 @@ class Access(BaseModel):
     updated_by = models.ForeignKey(User, on_delete=SET_NULL, related_name="updated_accesses", null=True, db_column="updated_by")
 
     def save(self, *args, **kwargs):
+        from accesses.services.user_rights import user_rights_service
+
         super(Access, self).save(*args, **kwargs)
+        if self.profile is not None and self.profile.user_id is not None:
+            user_rights_service.invalidate(user_id=self.profile.user_id)
         related_models = [Access.__name__] + [f.related_model.__name__ for f in Access._meta.fields if f.is_relation]
         for model in related_models:
             invalidate_cache(model_name=model)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import logging
-from functools import lru_cache, cached_property
+from functools import cached_property
 
 from django.db import models
 from django.db.models import Q
@@ -32,6 +32,12 @@ class Perimeter(BaseModel):
     def __str__(self):
         return f"[{self.id}] {self.name}"
 
+    def save(self, *args, **kwargs):
+        from accesses.services.perimeters_hierarchy import perimeters_hierarchy
+
+        super().save(*args, **kwargs)
+        perimeters_hierarchy.invalidate()
+
     @cached_property
     def names(self):
         return {"name": self.name, "short": self.short_name, "source_value": self.source_value}
@@ -56,12 +62,10 @@ class Perimeter(BaseModel):
             _logger.error(f"Error getting inferior levels ids for perimeter {self}.\n {e}")
             raise e
 
-    @lru_cache(maxsize=None)
     def is_child_of(self, perimeter: Perimeter) -> bool:
         if self.level is None or perimeter.level is None:
             return False
         return self.level > perimeter.level and perimeter.id in self.above_levels
 
-    @lru_cache(maxsize=None)
     def q_all_parents(self) -> Q:
         return Q(perimeter_id__in=self.above_levels)
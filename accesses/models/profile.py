@@ -14,3 +14,10 @@ class Profile(BaseModel):
     source = models.TextField(blank=True, null=True, default=MANUAL)
     is_active = models.BooleanField(blank=True, null=True)
     user = models.ForeignKey(User, on_delete=CASCADE, related_name="profiles", null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        from accesses.services.user_rights import user_rights_service
+
+        super().save(*args, **kwargs)
+        if self.user_id is not None:
+            user_rights_service.invalidate(user_id=self.user_id)
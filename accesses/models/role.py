@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-from functools import lru_cache
-
 from django.db import models
 from django.db.models import Q, UniqueConstraint
 
@@ -37,7 +35,12 @@ class Role(BaseModel):
     class Meta:
         constraints = [UniqueConstraint(name="unique_name", fields=["name"], condition=Q(delete_datetime__isnull=True))]
 
-    @lru_cache(maxsize=None)
+    def save(self, *args, **kwargs):
+        from accesses.services.user_rights import user_rights_service
+
+        super().save(*args, **kwargs)
+        user_rights_service.invalidate()
+
     def has_any_global_management_right(self):
         return any(
             (
@@ -47,13 +50,11 @@ class Role(BaseModel):
             )
         )
 
-    @lru_cache(maxsize=None)
     def has_any_global_right(self):
         return any(
             (self.has_any_global_management_right(), self.right_read_datalabs, self.right_search_patients_by_ipp, self.right_search_opposed_patients)
         )
 
-    @lru_cache(maxsize=None)
     def has_any_level_dependent_management_right(self):
         return any(
             (
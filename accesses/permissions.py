@@ -8,6 +8,7 @@ from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from accesses.models import Role
 from accesses.services.accesses import accesses_service
 from accesses.services.roles import roles_service
+from accesses.services.user_rights import user_rights_service
 from admin_cohort.models import User
 
 
@@ -33,31 +34,31 @@ def can_user_read_accesses(user: User) -> bool:
 
 
 def can_user_manage_users(user: User) -> bool:
-    return any(r.right_manage_users for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_manage_users")
 
 
 def can_user_manage_profiles(user: User) -> bool:
-    return any(r.right_manage_users for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_manage_users")
 
 
 def can_user_make_export_jupyter_nomi(user: User):
-    return any(r.right_export_jupyter_nominative for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_export_jupyter_nominative")
 
 
 def can_user_make_export_jupyter_pseudo(user: User):
-    return any(r.right_export_jupyter_pseudonymized for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_export_jupyter_pseudonymized")
 
 
 def can_user_make_export_csv_xlsx_nomi(user: User):
-    return any(r.right_export_csv_xlsx_nominative for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_export_csv_xlsx_nominative")
 
 
 def can_user_read_datalabs(user: User) -> bool:
-    return any(r.right_read_datalabs for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_read_datalabs")
 
 
 def can_user_manage_datalabs(user: User) -> bool:
-    return any(r.right_manage_datalabs for r in get_bound_roles(user))
+    return user_rights_service.get_snapshot(user).has_right("right_manage_datalabs")
 
 
 class RolesPermission(permissions.BasePermission):
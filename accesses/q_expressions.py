@@ -15,6 +15,36 @@ q_allow_export_csv_xlsx_nominative = Q(role__right_export_csv_xlsx_nominative=Tr
 q_allow_export_jupyter_nominative = Q(role__right_export_jupyter_nominative=True)
 q_allow_export_jupyter_pseudo = join_qs([Q(role__right_export_jupyter_nominative=True), Q(role__right_export_jupyter_pseudonymized=True)])
 
+# SQL counterparts of the `Role.requires_*_right_to_be_managed()` methods
+q_role_requires_full_admin_right_to_be_managed = join_qs(
+    [
+        Q(role__right_full_admin=True),
+        Q(role__right_search_patients_unlimited=True),
+        Q(role__right_manage_admin_accesses_same_level=True),
+        Q(role__right_manage_admin_accesses_inferior_levels=True),
+    ]
+)
+q_role_requires_admin_accesses_managing_right_to_be_managed = join_qs(
+    [
+        Q(role__right_manage_users=True),
+        Q(role__right_manage_data_accesses_same_level=True),
+        Q(role__right_manage_data_accesses_inferior_levels=True),
+        Q(role__right_manage_datalabs=True),
+        Q(role__right_read_datalabs=True),
+    ]
+)
+q_role_requires_data_accesses_managing_right_to_be_managed = join_qs(
+    [
+        Q(role__right_read_patient_nominative=True),
+        Q(role__right_read_patient_pseudonymized=True),
+        Q(role__right_search_patients_by_ipp=True),
+        Q(role__right_search_opposed_patients=True),
+        Q(role__right_export_csv_xlsx_nominative=True),
+        Q(role__right_export_jupyter_nominative=True),
+        Q(role__right_export_jupyter_pseudonymized=True),
+    ]
+)
+
 
 @lru_cache(maxsize=None)
 def q_allow_manage_accesses_on_same_level() -> Q:
@@ -1,8 +1,9 @@
 import logging
 from datetime import date, timedelta, datetime
-from typing import Any, Dict, List, Literal, Union
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set, Union
 
-from django.db.models import QuerySet, Q, Prefetch, F, Value
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import BooleanField, Case, F, Func, QuerySet, Q, TextField, Value, When
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.conf import settings
@@ -10,16 +11,17 @@ from django.conf import settings
 from admin_cohort.models import User
 from admin_cohort.tools import join_qs
 from accesses.q_expressions import (
-    q_allow_read_search_opposed_patient_data,
-    q_allow_read_patient_data_nominative,
-    q_allow_read_patient_data_pseudo,
     q_allow_manage_accesses_on_same_level,
     q_allow_manage_accesses_on_inf_levels,
     q_impact_inferior_levels,
-    q_allow_unlimited_patients_search,
+    q_role_requires_full_admin_right_to_be_managed,
+    q_role_requires_admin_accesses_managing_right_to_be_managed,
+    q_role_requires_data_accesses_managing_right_to_be_managed,
 )
 from accesses.models import Perimeter, Access, Role
+from accesses.services.perimeters_hierarchy import perimeters_hierarchy
 from accesses.services.shared import DataRight
+from accesses.services.user_rights import UserRightsSnapshot, user_rights_service
 
 _logger = logging.getLogger("info")
 
@@ -33,8 +35,9 @@ class AccessesService:
     def get_user_valid_accesses(self, user: User) -> QuerySet:
         return Access.objects.filter(self.q_access_is_valid() & Q(profile__is_active=True) & Q(profile__user=user))
 
-    def user_is_full_admin(self, user: User) -> bool:
-        return any(access.role is not None and access.role.right_full_admin for access in self.get_user_valid_accesses(user))
+    @staticmethod
+    def user_is_full_admin(user: User) -> bool:
+        return user_rights_service.get_snapshot(user).is_full_admin
 
     @staticmethod
     def get_expiring_accesses(user: User, accesses: QuerySet):
@@ -52,20 +55,44 @@ class AccessesService:
                 continue
         return min_access_per_perimeter.values()
 
+    @staticmethod
+    def q_perimeter_is_manageable(snapshot: UserRightsSnapshot, same_level_right: str, inf_levels_right: str) -> Q:
+        """accesses defined on a perimeter where the user has `same_level_right` or on a child of a perimeter where the user has `inf_levels_right`.
+        To be used on querysets annotated with `perimeter_above_levels`
+        """
+        q = Q(perimeter_id__in=snapshot.get_perimeters_ids_with_right(same_level_right))
+        inf_levels_perimeters_ids = snapshot.get_perimeters_ids_with_right(inf_levels_right)
+        if inf_levels_perimeters_ids:
+            q = q | Q(perimeter_above_levels__overlap=[str(p_id) for p_id in inf_levels_perimeters_ids])
+        return q
+
     def filter_accesses_for_user(self, user: User, accesses: QuerySet) -> QuerySet:
         """filter the accesses, the user making the request, is allowed to see.
         return a filtered QuerySet of accesses annotated with "editable" set to True or False to indicate
-        to Front whether to allow the `edit`/`close` actions on access or not
+        to Front whether to allow the `edit`/`close` actions on access or not.
+        The rule is the same as in `can_user_manage_access` but evaluated in SQL, so the queryset can still be paginated
         """
-        editable, readonly = [], []
-        for access in accesses:
-            if self.can_user_manage_access(user=user, target_access=access):
-                editable.append(access.id)
-            else:
-                readonly.append(access.id)
-        editable_accesses = accesses.filter(id__in=editable).annotate(editable=Value(True))
-        readonly_accesses = accesses.filter(id__in=readonly).annotate(editable=Value(False))
-        return editable_accesses.union(readonly_accesses)
+        snapshot = user_rights_service.get_snapshot(user)
+        if snapshot.is_full_admin:
+            return accesses.annotate(editable=Value(True))
+        q_can_manage_admin_accesses = self.q_perimeter_is_manageable(
+            snapshot, "right_manage_admin_accesses_same_level", "right_manage_admin_accesses_inferior_levels"
+        )
+        q_can_manage_data_accesses = q_can_manage_admin_accesses | self.q_perimeter_is_manageable(
+            snapshot, "right_manage_data_accesses_same_level", "right_manage_data_accesses_inferior_levels"
+        )
+        q_editable = (
+            Q(perimeter__isnull=False)
+            & Q(role__isnull=False)
+            & ~q_role_requires_full_admin_right_to_be_managed
+            & (q_can_manage_admin_accesses | ~q_role_requires_admin_accesses_managing_right_to_be_managed)
+            & (q_can_manage_data_accesses | ~q_role_requires_data_accesses_managing_right_to_be_managed)
+        )
+        return accesses.annotate(
+            perimeter_above_levels=Func(
+                F("perimeter__above_levels_ids"), Value(","), function="string_to_array", output_field=ArrayField(TextField())
+            )
+        ).annotate(editable=Case(When(q_editable, then=Value(True)), default=Value(False), output_field=BooleanField()))
 
     def get_accesses_on_perimeter(
         self, user: User, accesses: QuerySet, perimeter_id: int, include_parents: bool = False, include_children: bool = False
@@ -78,22 +105,18 @@ class AccessesService:
         if include_children:
             user_can_read_accesses_from_inferior_levels = user_accesses.filter(q_allow_manage_accesses_on_inf_levels()).exists()
             if user_can_read_accesses_from_inferior_levels:
-                all_child_perimeters_ids = Perimeter.objects.filter(above_levels_ids__contains=str(perimeter_id)).values_list("id", flat=True)
-                q = q | Q(perimeter_id__in=all_child_perimeters_ids)
+                q = q | Q(perimeter_id__in=perimeters_hierarchy.get_descendants_ids(perimeter_id))
         return self.filter_accesses_for_user(user=user, accesses=accesses.filter(q))
 
     def user_has_data_reading_accesses_on_target_perimeters(self, user: User, target_perimeters: QuerySet, read_mode: Literal["max", "min"]) -> bool:
-        perimeters_with_data_accesses = (
-            self.get_user_valid_accesses(user=user)
-            .filter(q_allow_read_patient_data_nominative | q_allow_read_patient_data_pseudo)
-            .values_list("perimeter_id", flat=True)
+        perimeters_with_data_accesses = user_rights_service.get_snapshot(user).get_perimeters_ids_with_right(
+            "right_read_patient_nominative", "right_read_patient_pseudonymized"
         )
         if not perimeters_with_data_accesses:
             return False
         has_access = False
         for perimeter in target_perimeters:
-            perimeter_and_parents_ids = [perimeter.id] + perimeter.above_levels
-            can_access_perimeter = any(p in perimeters_with_data_accesses for p in perimeter_and_parents_ids)
+            can_access_perimeter = perimeters_hierarchy.is_self_or_ancestor_in(perimeter.id, perimeters_with_data_accesses)
             if read_mode == "max":
                 if can_access_perimeter:
                     return True
@@ -103,33 +126,46 @@ class AccessesService:
                 has_access = True
         return has_access
 
-    def get_nominative_perimeters(self, user: User) -> QuerySet[Any, Any]:
-        return self.get_user_valid_accesses(user=user).filter(q_allow_read_patient_data_nominative).values_list("perimeter_id", flat=True)
+    @staticmethod
+    def get_nominative_perimeters(user: User) -> Set[int]:
+        return user_rights_service.get_snapshot(user).get_perimeters_ids_with_right("right_read_patient_nominative")
 
     def user_can_access_at_least_one_target_perimeter_in_nomi(self, user: User, target_perimeters: QuerySet) -> bool:
         nomi_perimeters_ids = self.get_nominative_perimeters(user=user)
-        for perimeter in target_perimeters:
-            perimeter_and_parents_ids = [perimeter.id] + perimeter.above_levels
-            if any(p_id in nomi_perimeters_ids for p_id in perimeter_and_parents_ids):
-                return True
-        return False
+        return any(perimeters_hierarchy.is_self_or_ancestor_in(perimeter.id, nomi_perimeters_ids) for perimeter in target_perimeters)
+
+    @staticmethod
+    def is_user_read_pseudo_only(username: Optional[str], cohorts_ids: Iterable) -> bool:
+        """
+        Effective read mode of a user on a source population (perimeters' cohort ids): pseudonymized unless the user
+        has a nominative read right on one of its perimeters or their parents.
+        Runs no DB query once the user's rights snapshot and the perimeters hierarchy are cached.
+        """
+        if username is None:
+            return True
+        nomi_perimeters_ids = user_rights_service.get_snapshot_by_id(user_id=username).get_perimeters_ids_with_right("right_read_patient_nominative")
+        if not nomi_perimeters_ids:
+            return True
+        return not any(
+            perimeters_hierarchy.is_self_or_ancestor_in(perimeter_id, nomi_perimeters_ids)
+            for perimeter_id in perimeters_hierarchy.get_perimeters_ids_of_cohorts(cohorts_ids)
+        )
 
     def user_can_access_all_target_perimeters_in_nomi(self, user: User, target_perimeters: QuerySet) -> bool:
         nomi_perimeters_ids = self.get_nominative_perimeters(user=user)
-        for perimeter in target_perimeters:
-            perimeter_and_parents_ids = [perimeter.id] + perimeter.above_levels
-            if not any(p_id in nomi_perimeters_ids for p_id in perimeter_and_parents_ids):
-                return False
-        return True
+        return all(perimeters_hierarchy.is_self_or_ancestor_in(perimeter.id, nomi_perimeters_ids) for perimeter in target_perimeters)
 
-    def can_user_read_opposed_patient_data(self, user: User) -> bool:
-        return self.get_user_valid_accesses(user=user).filter(q_allow_read_search_opposed_patient_data).exists()
+    @staticmethod
+    def can_user_read_opposed_patient_data(user: User) -> bool:
+        return user_rights_service.get_snapshot(user).has_right("right_search_opposed_patients")
 
-    def can_user_manage_users(self, user: User) -> bool:
-        return self.get_user_valid_accesses(user=user).filter(role__right_manage_users=True).exists()
+    @staticmethod
+    def can_user_manage_users(user: User) -> bool:
+        return user_rights_service.get_snapshot(user).has_right("right_manage_users")
 
-    def is_user_allowed_unlimited_patients_read(self, user: User) -> bool:
-        return self.get_user_valid_accesses(user=user).filter(q_allow_unlimited_patients_search).exists()
+    @staticmethod
+    def is_user_allowed_unlimited_patients_read(user: User) -> bool:
+        return user_rights_service.get_snapshot(user).has_right("right_search_patients_unlimited")
 
     def get_user_data_accesses(self, user: User) -> QuerySet:
         return self.get_user_valid_accesses(user).filter(
@@ -149,15 +185,7 @@ class AccessesService:
     def get_data_accesses_with_rights(self, user: User) -> QuerySet:
         return (
             self.get_user_data_accesses(user)
-            .prefetch_related("role", "profile")
-            .prefetch_related(
-                Prefetch(
-                    "perimeter",
-                    queryset=Perimeter.objects.all().select_related(
-                        *["parent" + i * "__parent" for i in range(0, len(settings.PERIMETER_TYPES) - 2)]
-                    ),
-                )
-            )
+            .select_related("role")
             .annotate(
                 right_read_patient_nominative=F("role__right_read_patient_nominative"),
                 right_read_patient_pseudonymized=F("role__right_read_patient_pseudonymized"),
@@ -193,7 +221,7 @@ class AccessesService:
         return out
 
     @staticmethod
-    def get_data_rights_for_target_perimeters(user: User, target_perimeters_ids: List[int]) -> List[DataRight]:
+    def get_data_rights_for_target_perimeters(user: User, target_perimeters_ids: Iterable[int]) -> List[DataRight]:
         return [DataRight(user_id=user.pk, perimeter_id=perimeter_id) for perimeter_id in target_perimeters_ids]
 
     @staticmethod
@@ -209,27 +237,15 @@ class AccessesService:
 
     @staticmethod
     def share_data_reading_rights_over_relative_hierarchy(data_rights_per_perimeter: Dict[int | None, DataRight]) -> List[DataRight]:
-        processed_perimeters = []
-        for perimeter_id, data_right in data_rights_per_perimeter.items():
-            if perimeter_id is None:
-                continue
-            if perimeter_id in processed_perimeters:
-                continue
-            processed_perimeters.append(perimeter_id)
-            parental_chain = [data_right]
-            parent_perimeter = Perimeter.objects.get(pk=perimeter_id).parent
-            while parent_perimeter:
-                parent_data_right = data_rights_per_perimeter.get(parent_perimeter.id)
-                if not parent_data_right:
-                    parent_perimeter = parent_perimeter.parent
-                    continue
-                for dr in parental_chain:
-                    dr.acquire_extra_data_reading_rights(dr=parent_data_right)
-                parental_chain.append(parent_data_right)
-                if parent_perimeter.id in processed_perimeters:
-                    break
-                processed_perimeters.append(parent_perimeter.id)
-                parent_perimeter = parent_perimeter.parent
+        """each data right acquires the data reading rights defined on any of its perimeter's parents.
+        Perimeters are processed top-down so that a parent's rights are complete before being shared with its children
+        """
+        index = perimeters_hierarchy.get_index()
+        perimeters_ids = [p_id for p_id in data_rights_per_perimeter if p_id is not None]
+        for perimeter_id in sorted(perimeters_ids, key=lambda p_id: len(index.ancestors.get(p_id, ()))):
+            data_right = data_rights_per_perimeter[perimeter_id]
+            for parent_id in index.ancestors.get(perimeter_id, frozenset()).intersection(data_rights_per_perimeter):
+                data_right.acquire_extra_data_reading_rights(dr=data_rights_per_perimeter[parent_id])
         return list(data_rights_per_perimeter.values())
 
     @staticmethod
@@ -263,22 +279,21 @@ class AccessesService:
                 dr.acquire_extra_global_rights(global_dr)
 
     def get_data_reading_rights(self, user: User, target_perimeters_ids: List[int]) -> List[DataRight]:
-        target_perimeters = Perimeter.objects.filter(id__in=target_perimeters_ids).select_related(
-            *[f"parent{i * '__parent'}" for i in range(0, len(settings.PERIMETER_TYPES) - 2)]
-        )
+        target_ids = set(target_perimeters_ids)
+        target_perimeters_exist = Perimeter.objects.filter(id__in=target_ids).exists()
 
         data_accesses = self.get_data_accesses_with_rights(user)
         data_rights_from_accesses = self.get_data_rights_from_accesses(user=user, data_accesses=data_accesses)
         data_rights_for_perimeters = []
-        if target_perimeters:
-            data_rights_for_perimeters = self.get_data_rights_for_target_perimeters(user=user, target_perimeters_ids=target_perimeters_ids)
+        if target_perimeters_exist:
+            data_rights_for_perimeters = self.get_data_rights_for_target_perimeters(user=user, target_perimeters_ids=target_ids)
         data_rights_per_perimeter = self.group_data_rights_by_perimeter(data_rights=data_rights_from_accesses + data_rights_for_perimeters)
 
         data_rights = self.share_data_reading_rights_over_relative_hierarchy(data_rights_per_perimeter=data_rights_per_perimeter)
 
         self.share_global_rights_over_relative_hierarchy(user=user, data_rights=data_rights, data_accesses=data_accesses)
-        if target_perimeters:
-            data_rights = [dr for dr in data_rights if dr.perimeter_id in target_perimeters_ids]
+        if target_perimeters_exist:
+            data_rights = [dr for dr in data_rights if dr.perimeter_id in target_ids]
 
         return [dr for dr in data_rights if any((dr.right_read_patient_nominative, dr.right_read_patient_pseudonymized))]
 
@@ -300,13 +315,13 @@ class AccessesService:
 
     @staticmethod
     def check_user_rights_on_perimeter(user_access: Access, target_perimeter: Perimeter):
-        role = user_access.role
-        if role is None:
+        role, perimeter = user_access.role, user_access.perimeter
+        if role is None or perimeter is None:
             return False, False
-        if target_perimeter == user_access.perimeter:
+        if target_perimeter == perimeter:
             right_on_admin_accesses = role.right_manage_admin_accesses_same_level
             right_on_data_accesses = role.right_manage_data_accesses_same_level
-        elif target_perimeter.is_child_of(perimeter=user_access.perimeter):
+        elif target_perimeter.is_child_of(perimeter=perimeter):
             right_on_admin_accesses = role.right_manage_admin_accesses_inferior_levels
             right_on_data_accesses = role.right_manage_data_accesses_inferior_levels
         else:
@@ -423,6 +438,7 @@ class AccessesService:
             accesses_service.q_access_is_valid() & (Q(perimeter_id__in=perimeters_to_delete_ids) | Q(perimeter_id__isnull=True))
         )
         accesses_to_delete.update(end_datetime=timezone.now())
+        user_rights_service.invalidate()
         _logger.info(f"{len(accesses_to_delete)} accesses have been closed: {accesses_to_delete}")
 
 
@@ -10,6 +10,7 @@ from fhirpy import SyncFHIRClient
 from accesses.apps import AccessConfig
 from accesses.data.orbis_roles_map import roles_map
 from accesses.models import Role, Profile, Perimeter, Access
+from accesses.services.user_rights import user_rights_service
 from admin_cohort.emails import EmailNotification
 from admin_cohort.models import User
 from admin_cohort.services.auth import jwt_auth_service
@@ -77,6 +78,7 @@ class AccessesSynchronizer:
                 for profile in linked_profiles:
                     profile.accesses.update(end_datetime=timezone.now())
                 count_deactivated = linked_profiles.update(is_active=False)
+                user_rights_service.invalidate(user_id=p.identifier[0].value)
                 self.log(f"{count_deactivated} ORBIS profiles have been deactivated for user `{p.identifier[0].value}`")
         self.log(f"{practitioner_res.count()} users have been synchronized with ORBIS")
 
@@ -152,6 +154,7 @@ class AccessesSynchronizer:
                             skipped_roles.add(fpr.role_name)
                     else:
                         Access.objects.filter(external_id=pr.id).update(end_datetime=timezone.now())
+        user_rights_service.invalidate()
 
         if skipped_roles:
             self.log(f"The following ORBIS roles were not correctly mapped: {skipped_roles}")
@@ -1,30 +1,26 @@
-from functools import reduce, lru_cache
-from typing import Set, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from django.db import transaction
 from django.db.models import QuerySet, Count, Q
 
 from accesses.models import Perimeter, Access
 from accesses.q_expressions import (
-    q_allow_search_patients_by_ipp,
-    q_allow_read_search_opposed_patient_data,
-    q_allow_read_patient_data_nominative,
-    q_allow_read_patient_data_pseudo,
     q_allow_manage_accesses_on_same_level,
     q_allow_manage_accesses_on_inf_levels,
     q_impact_inferior_levels,
 )
 from accesses.services.accesses import accesses_service
+from accesses.services.perimeters_hierarchy import HierarchyIndex, perimeters_cache, perimeters_hierarchy
 from accesses.services.shared import PerimeterReadRight
+from accesses.services.user_rights import user_rights_service
 from admin_cohort.models import User
 from cohort.services.cohort_rights import cohort_rights_service
 
 
 class PerimetersService:
     @staticmethod
-    @lru_cache(maxsize=None)
     def get_all_child_perimeters(perimeter_id: int) -> QuerySet:
-        return Perimeter.objects.filter(above_levels_ids__contains=str(perimeter_id))
+        return Perimeter.objects.filter(id__in=perimeters_hierarchy.get_descendants_ids(perimeter_id))
 
     @staticmethod
     def get_top_perimeters_ids_same_level(same_level_perimeters_ids: List[int], all_perimeters_ids: List[int]) -> Set[int]:
@@ -101,95 +97,115 @@ class PerimetersService:
             return Perimeter.objects.filter(id__in=top_same_level_perimeters_ids.union(top_inf_levels_perimeters_ids))
 
     @staticmethod
-    @lru_cache(maxsize=None)
-    def get_target_perimeters(cohort_ids: str) -> QuerySet:
+    def get_target_perimeters_ids(cohort_ids: str) -> List[int]:
         cohorts_ids = cohort_ids.split(",")
         virtual_cohorts_map = cohort_rights_service.retrieve_virtual_cohorts_ids_from_snapshot(cohorts_ids=cohorts_ids) or {}
         virtual_cohorts = [i for v in virtual_cohorts_map.values() for i in v]
         virtual_cohorts = virtual_cohorts + cohorts_ids
-        return Perimeter.objects.filter(cohort_id__in=virtual_cohorts)
+        return list(Perimeter.objects.filter(cohort_id__in=virtual_cohorts).values_list("id", flat=True))
+
+    def get_target_perimeters(self, cohort_ids: str) -> QuerySet:
+        perimeters_ids = perimeters_cache.get_or_set(
+            key=f"target_perimeters.{cohort_ids}", compute=lambda: self.get_target_perimeters_ids(cohort_ids=cohort_ids)
+        )
+        return Perimeter.objects.filter(id__in=perimeters_ids)
 
     @staticmethod
-    def get_top_perimeters_with_read_nomi_right(read_nomi_perimeters_ids: List[int]) -> List[int]:
-        """for each Perimeter with nominative read right, remove it if any of its parents has nomi access"""
-        for p in Perimeter.objects.filter(id__in=read_nomi_perimeters_ids):
-            if any(parent_id in read_nomi_perimeters_ids for parent_id in p.above_levels):
-                try:
-                    read_nomi_perimeters_ids.remove(p.id)
-                except ValueError:
-                    continue
-        return read_nomi_perimeters_ids
+    def get_top_perimeters_with_read_nomi_right(read_nomi_perimeters_ids: Iterable[int], index: Optional[HierarchyIndex] = None) -> Set[int]:
+        """keep only the Perimeters with nominative read right having none of their parents with nomi access"""
+        index = index or perimeters_hierarchy.get_index()
+        read_nomi_perimeters_ids = set(read_nomi_perimeters_ids)
+        return {p_id for p_id in read_nomi_perimeters_ids if index.ancestors.get(p_id, frozenset()).isdisjoint(read_nomi_perimeters_ids)}
 
     @staticmethod
-    def get_top_perimeters_with_read_pseudo_right(top_read_nomi_perimeters_ids: List[int], read_pseudo_perimeters_ids: List[int]) -> List[int]:
-        """for each Perimeter with pseudo read right, remove it if it has nomi access too
-        or if any of its parents has nomi or pseudo access
+    def get_top_perimeters_with_read_pseudo_right(
+        top_read_nomi_perimeters_ids: Iterable[int], read_pseudo_perimeters_ids: Iterable[int], index: Optional[HierarchyIndex] = None
+    ) -> Set[int]:
+        """keep only the Perimeters with pseudo read right not having nomi access
+        and having none of their parents with nomi or pseudo access
         """
-        for p in Perimeter.objects.filter(id__in=read_pseudo_perimeters_ids):
-            if any(
-                (parent_id in read_pseudo_perimeters_ids or parent_id in top_read_nomi_perimeters_ids or p.id in top_read_nomi_perimeters_ids)
-                for parent_id in p.above_levels
-            ):
-                try:
-                    read_pseudo_perimeters_ids.remove(p.id)
-                except ValueError:
-                    continue
-        return read_pseudo_perimeters_ids
+        index = index or perimeters_hierarchy.get_index()
+        top_read_nomi_perimeters_ids = set(top_read_nomi_perimeters_ids)
+        read_pseudo_perimeters_ids = set(read_pseudo_perimeters_ids)
+        covering_perimeters_ids = read_pseudo_perimeters_ids | top_read_nomi_perimeters_ids
+        return {
+            p_id
+            for p_id in read_pseudo_perimeters_ids - top_read_nomi_perimeters_ids
+            if index.ancestors.get(p_id, frozenset()).isdisjoint(covering_perimeters_ids)
+        }
 
     @staticmethod
+    def get_read_rights_per_perimeter(
+        perimeters_ids: Iterable[int],
+        top_read_nomi_perimeters_ids: Set[int],
+        top_read_pseudo_perimeters_ids: Set[int],
+        index: Optional[HierarchyIndex] = None,
+    ) -> Dict[int, Tuple[bool, bool]]:
+        """map each perimeter to its (read_nomi, read_pseudo) rights, inherited from itself or any of its parents"""
+        index = index or perimeters_hierarchy.get_index()
+        read_rights = {}
+        for p_id in perimeters_ids:
+            ancestors_ids = index.ancestors.get(p_id, frozenset())
+            if p_id in top_read_nomi_perimeters_ids or not ancestors_ids.isdisjoint(top_read_nomi_perimeters_ids):
+                read_rights[p_id] = (True, True)
+            elif p_id in top_read_pseudo_perimeters_ids or not ancestors_ids.isdisjoint(top_read_pseudo_perimeters_ids):
+                read_rights[p_id] = (False, True)
+            else:
+                read_rights[p_id] = (False, False)
+        return read_rights
+
     def get_perimeters_read_rights(
+        self,
         target_perimeters: QuerySet,
-        top_read_nomi_perimeters_ids: List[int],
-        top_read_pseudo_perimeters_ids: List[int],
+        top_read_nomi_perimeters_ids: Set[int],
+        top_read_pseudo_perimeters_ids: Set[int],
         allow_search_by_ipp: bool,
         allow_read_opposed_patient: bool,
     ) -> List[PerimeterReadRight]:
-        perimeter_read_rights: list[PerimeterReadRight] = []
-
         if not (top_read_nomi_perimeters_ids or top_read_pseudo_perimeters_ids):
-            return perimeter_read_rights
-
-        for perimeter in target_perimeters:
-            perimeter_and_parents_ids = [perimeter.id] + perimeter.above_levels
-            read_nomi, read_pseudo = False, False
-            if any(p in top_read_nomi_perimeters_ids for p in perimeter_and_parents_ids):
-                read_nomi, read_pseudo = True, True
-            elif any(p in top_read_pseudo_perimeters_ids for p in perimeter_and_parents_ids):
-                read_pseudo = True
-            perimeter_read_rights.append(
-                PerimeterReadRight(
-                    perimeter=perimeter,
-                    right_read_patient_nominative=read_nomi,
-                    right_read_patient_pseudonymized=read_pseudo,
-                    right_search_patients_by_ipp=allow_search_by_ipp,
-                    right_read_opposed_patients_data=allow_read_opposed_patient,
-                )
+            return []
+
+        perimeters = list(target_perimeters)
+        read_rights = self.get_read_rights_per_perimeter(
+            perimeters_ids=[perimeter.id for perimeter in perimeters],
+            top_read_nomi_perimeters_ids=top_read_nomi_perimeters_ids,
+            top_read_pseudo_perimeters_ids=top_read_pseudo_perimeters_ids,
+        )
+        perimeter_read_rights = [
+            PerimeterReadRight(
+                perimeter=perimeter,
+                right_read_patient_nominative=read_rights[perimeter.id][0],
+                right_read_patient_pseudonymized=read_rights[perimeter.id][1],
+                right_search_patients_by_ipp=allow_search_by_ipp,
+                right_read_opposed_patients_data=allow_read_opposed_patient,
             )
+            for perimeter in perimeters
+        ]
         return sorted(perimeter_read_rights, key=lambda x: (x.perimeter.full_path, x.perimeter.id))
 
     def get_data_read_rights_on_perimeters(self, user: User, is_request_filtered: bool, filtered_perimeters: QuerySet):
-        user_accesses = accesses_service.get_user_valid_accesses(user=user)
-        allow_search_by_ipp = user_accesses.filter(q_allow_search_patients_by_ipp).exists()
-        allow_read_opposed_patient = user_accesses.filter(q_allow_read_search_opposed_patient_data).exists()
+        snapshot = user_rights_service.get_snapshot(user=user)
+        allow_search_by_ipp = snapshot.has_right("right_search_patients_by_ipp")
+        allow_read_opposed_patient = snapshot.has_right("right_search_opposed_patients")
 
-        read_nomi_perimeters_ids = user_accesses.filter(q_allow_read_patient_data_nominative).values_list("perimeter_id", flat=True)
-        read_pseudo_perimeters_ids = user_accesses.filter(q_allow_read_patient_data_pseudo | q_allow_read_patient_data_nominative).values_list(
-            "perimeter_id", flat=True
-        )
+        read_nomi_perimeters_ids = snapshot.get_perimeters_ids_with_right("right_read_patient_nominative")
+        read_pseudo_perimeters_ids = snapshot.get_perimeters_ids_with_right("right_read_patient_pseudonymized", "right_read_patient_nominative")
 
-        top_read_nomi_perimeters_ids = self.get_top_perimeters_with_read_nomi_right(read_nomi_perimeters_ids=list(read_nomi_perimeters_ids))
+        index = perimeters_hierarchy.get_index()
+        top_read_nomi_perimeters_ids = self.get_top_perimeters_with_read_nomi_right(read_nomi_perimeters_ids=read_nomi_perimeters_ids, index=index)
         top_read_pseudo_perimeters_ids = self.get_top_perimeters_with_read_pseudo_right(
-            top_read_nomi_perimeters_ids=top_read_nomi_perimeters_ids, read_pseudo_perimeters_ids=list(read_pseudo_perimeters_ids)
+            top_read_nomi_perimeters_ids=top_read_nomi_perimeters_ids, read_pseudo_perimeters_ids=read_pseudo_perimeters_ids, index=index
         )
 
         if is_request_filtered:
-            perimeters_with_data_accesses = Perimeter.objects.filter(id__in=read_nomi_perimeters_ids.union(read_pseudo_perimeters_ids))
-            perimeters_and_children = [perimeters_with_data_accesses] + [self.get_all_child_perimeters(p.id) for p in perimeters_with_data_accesses]
-            target_perimeters = reduce(lambda qs1, qs2: qs1 | qs2, perimeters_and_children)
+            # read_pseudo_perimeters_ids includes the nominative ones
+            target_perimeters_ids = set(read_pseudo_perimeters_ids)
+            for p_id in read_pseudo_perimeters_ids:
+                target_perimeters_ids.update(index.descendants.get(p_id, []))
         else:
-            target_perimeters = Perimeter.objects.filter(id__in=top_read_nomi_perimeters_ids + top_read_pseudo_perimeters_ids)
+            target_perimeters_ids = top_read_nomi_perimeters_ids | top_read_pseudo_perimeters_ids
 
-        target_perimeters = target_perimeters.filter(id__in=filtered_perimeters)
+        target_perimeters = Perimeter.objects.filter(id__in=target_perimeters_ids).filter(id__in=filtered_perimeters)
 
         data_reading_rights = self.get_perimeters_read_rights(
             target_perimeters=target_perimeters,
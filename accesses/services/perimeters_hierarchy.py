@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from django.core.cache import cache
+
+from accesses.models import Perimeter
+from admin_cohort.tools.cache import GenerationalCache
+
+_logger = logging.getLogger("info")
+
+HIERARCHY_VERSION_CACHE_KEY = "accesses.perimeters_hierarchy.version"
+VERSION_CHECK_INTERVAL_SECONDS = 5
+MAX_INDEX_AGE_SECONDS = 10 * 60
+
+# lookups depending on the perimeters, invalidated along with the hierarchy index
+perimeters_cache = GenerationalCache(namespace="accesses.perimeters", generation_key=HIERARCHY_VERSION_CACHE_KEY)
+
+
+def parse_levels_ids(levels_ids: Optional[str]) -> List[int]:
+    if not levels_ids:
+        return []
+    return [int(i) for i in levels_ids.split(",") if i]
+
+
+@dataclass
+class HierarchyIndex:
+    ancestors: Dict[int, FrozenSet[int]] = field(default_factory=dict)
+    descendants: Dict[int, List[int]] = field(default_factory=dict)
+    perimeters_ids_per_cohort_id: Dict[str, List[int]] = field(default_factory=dict)
+    built_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple]) -> HierarchyIndex:
+        """rows of (id, above_levels_ids, cohort_id), the cohort_id of deleted perimeters being None"""
+        index = cls()
+        for perimeter_id, above_levels_ids, cohort_id in rows:
+            if cohort_id:
+                index.perimeters_ids_per_cohort_id.setdefault(cohort_id, []).append(perimeter_id)
+            above_levels = frozenset(parse_levels_ids(above_levels_ids))
+            index.ancestors[perimeter_id] = above_levels
+            for ancestor_id in above_levels:
+                index.descendants.setdefault(ancestor_id, []).append(perimeter_id)
+        return index
+
+
+class PerimetersHierarchy:
+    """
+    Process-wide, in-memory index of the perimeters tree built from `Perimeter.above_levels_ids`.
+    Answers ancestors/descendants lookups without querying the DB nor re-parsing perimeters strings.
+    The index is rebuilt lazily after an invalidation: the version is shared between workers through the cache,
+    and the index is also refreshed after `MAX_INDEX_AGE_SECONDS` in case the shared cache is disabled.
+    """
+
+    def __init__(self):
+        self._index: Optional[HierarchyIndex] = None
+        self._version: Optional[int] = None
+        self._version_checked_at: float = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_shared_version() -> Optional[int]:
+        return cache.get(HIERARCHY_VERSION_CACHE_KEY)
+
+    def invalidate(self) -> None:
+        perimeters_cache.bump_generation()
+        with self._lock:
+            self._index = None
+
+    def is_stale(self, index: Optional[HierarchyIndex]) -> bool:
+        if index is None:
+            return True
+        now = time.monotonic()
+        if now - index.built_at > MAX_INDEX_AGE_SECONDS:
+            return True
+        if now - self._version_checked_at > VERSION_CHECK_INTERVAL_SECONDS:
+            self._version_checked_at = now
+            return self.get_shared_version() != self._version
+        return False
+
+    def build_index(self) -> HierarchyIndex:
+        """to be called with the lock held"""
+        version = self.get_shared_version()
+        rows = Perimeter.objects.all(even_deleted=True).values_list("id", "above_levels_ids", "cohort_id", "delete_datetime")
+        index = self._index = HierarchyIndex.build(
+            (p_id, above_levels_ids, delete_datetime is None and cohort_id or None) for p_id, above_levels_ids, cohort_id, delete_datetime in rows
+        )
+        self._version = version
+        self._version_checked_at = time.monotonic()
+        _logger.info(f"Perimeters hierarchy index built with {len(index.ancestors)} perimeters (version={version})")
+        return index
+
+    def get_index(self) -> HierarchyIndex:
+        index = self._index
+        if index is not None and not self.is_stale(index):
+            return index
+        with self._lock:
+            # another thread may have rebuilt the index while this one was waiting for the lock
+            current = self._index
+            if current is not None and current is not index and not self.is_stale(current):
+                return current
+            return self.build_index()
+
+    def get_ancestors_ids(self, perimeter_id: int) -> FrozenSet[int]:
+        return self.get_index().ancestors.get(perimeter_id, frozenset())
+
+    def get_descendants_ids(self, perimeter_id: int) -> List[int]:
+        return self.get_index().descendants.get(perimeter_id, [])
+
+    def get_perimeters_ids_of_cohorts(self, cohorts_ids: Iterable[str]) -> List[int]:
+        """ids of the (non deleted) perimeters of the given cohorts"""
+        perimeters_ids_per_cohort_id = self.get_index().perimeters_ids_per_cohort_id
+        return [p_id for cohort_id in cohorts_ids for p_id in perimeters_ids_per_cohort_id.get(str(cohort_id), [])]
+
+    def is_descendant_of(self, perimeter_id: int, ancestor_id: int) -> bool:
+        return ancestor_id in self.get_ancestors_ids(perimeter_id)
+
+    def is_self_or_ancestor_in(self, perimeter_id: int, perimeters_ids: Iterable[int]) -> bool:
+        """check if the perimeter or any of its parents is among the given perimeters"""
+        perimeters_ids = perimeters_ids if isinstance(perimeters_ids, (set, frozenset)) else set(perimeters_ids)
+        return perimeter_id in perimeters_ids or not self.get_ancestors_ids(perimeter_id).isdisjoint(perimeters_ids)
+
+
+perimeters_hierarchy = PerimetersHierarchy()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional, Set
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from accesses.models import Access, Role
+from admin_cohort.middleware.context_request_middleware import context_request
+from admin_cohort.models import User
+
+ROLE_RIGHTS = [f.name for f in Role._meta.fields if f.name.startswith("right_")]
+
+USER_RIGHTS_CACHE_TIMEOUT = 60 * 60
+USER_RIGHTS_VERSION_CACHE_KEY = "accesses.user_rights.version"
+REQUEST_MEMO_ATTRIBUTE = "_user_rights_snapshots"
+
+
+@dataclass
+class UserRightsSnapshot:
+    """
+    Compiled view of a user's valid accesses: for each perimeter, the set of rights granted by the accesses' roles.
+    `expires_at` is the closest datetime at which one of the user's accesses starts or ends, the snapshot must be
+    recompiled after it.
+    """
+
+    user_id: Optional[str]
+    accesses_ids: FrozenSet[int] = field(default_factory=frozenset)
+    roles_ids: FrozenSet[int] = field(default_factory=frozenset)
+    rights_per_perimeter: Dict[Optional[int], FrozenSet[str]] = field(default_factory=dict)
+    expires_at: Optional[datetime] = None
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and self.expires_at <= timezone.now()
+
+    @property
+    def is_full_admin(self) -> bool:
+        return self.has_right("right_full_admin")
+
+    def has_right(self, right: str) -> bool:
+        return any(right in rights for rights in self.rights_per_perimeter.values())
+
+    def has_any_right(self, *rights: str) -> bool:
+        return any(self.has_right(right) for right in rights)
+
+    def get_perimeters_ids_with_right(self, *rights: str) -> Set[int]:
+        """perimeters on which the user has at least one of the given rights"""
+        return {
+            perimeter_id
+            for perimeter_id, perimeter_rights in self.rights_per_perimeter.items()
+            if perimeter_id is not None and not perimeter_rights.isdisjoint(rights)
+        }
+
+
+class UserRightsService:
+    @staticmethod
+    def build_snapshot(user_id: str) -> UserRightsSnapshot:
+        now = timezone.now()
+        accesses = Access.objects.filter(Q(profile__is_active=True) & Q(profile__user_id=user_id) & Q(end_datetime__gte=now)).values(
+            "id", "perimeter_id", "role_id", "start_datetime", "end_datetime", *[f"role__{right}" for right in ROLE_RIGHTS]
+        )
+        accesses_ids: Set[int] = set()
+        roles_ids: Set[int] = set()
+        rights_per_perimeter: Dict[Optional[int], FrozenSet[str]] = {}
+        transitions = []
+        for access in accesses:
+            if access["start_datetime"] is None or access["end_datetime"] is None:
+                continue
+            if access["start_datetime"] > now:
+                transitions.append(access["start_datetime"])
+                continue
+            transitions.append(access["end_datetime"])
+            accesses_ids.add(access["id"])
+            if access["role_id"] is None:
+                continue
+            roles_ids.add(access["role_id"])
+            granted_rights = {right for right in ROLE_RIGHTS if access[f"role__{right}"]}
+            rights_per_perimeter[access["perimeter_id"]] = rights_per_perimeter.get(access["perimeter_id"], frozenset()).union(granted_rights)
+        return UserRightsSnapshot(
+            user_id=user_id,
+            accesses_ids=frozenset(accesses_ids),
+            roles_ids=frozenset(roles_ids),
+            rights_per_perimeter=rights_per_perimeter,
+            expires_at=min(transitions, default=None),
+        )
+
+    @staticmethod
+    def get_cache_key(user_id: str) -> str:
+        version = cache.get(USER_RIGHTS_VERSION_CACHE_KEY, 0)
+        return f"accesses.user_rights.{version}.{user_id}"
+
+    @staticmethod
+    def get_request_memo() -> Optional[dict]:
+        request = context_request.get()
+        if request is None:
+            return None
+        if not hasattr(request, REQUEST_MEMO_ATTRIBUTE):
+            setattr(request, REQUEST_MEMO_ATTRIBUTE, {})
+        return getattr(request, REQUEST_MEMO_ATTRIBUTE)
+
+    def get_snapshot(self, user: Optional[User]) -> UserRightsSnapshot:
+        if user is None:
+            return UserRightsSnapshot(user_id=None)
+        return self.get_snapshot_by_id(user_id=user.pk)
+
+    def get_snapshot_by_id(self, user_id: str) -> UserRightsSnapshot:
+        """same as `get_snapshot()` when only the user's id is known, without loading the user"""
+        memo = self.get_request_memo()
+        snapshot = memo.get(user_id) if memo is not None else None
+        if snapshot is None or snapshot.is_expired:
+            cache_key = self.get_cache_key(user_id)
+            snapshot = cache.get(cache_key)
+            if snapshot is None or snapshot.is_expired:
+                snapshot = self.build_snapshot(user_id)
+                timeout = USER_RIGHTS_CACHE_TIMEOUT
+                if snapshot.expires_at is not None:
+                    timeout = min(timeout, max(int((snapshot.expires_at - timezone.now()).total_seconds()), 1))
+                cache.set(cache_key, snapshot, timeout=timeout)
+            if memo is not None:
+                memo[user_id] = snapshot
+        return snapshot
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """drop the snapshot of the given user, or of all users if no user is given (ex: a role's rights changed)"""
+        memo = self.get_request_memo()
+        if user_id is None:
+            try:
+                cache.incr(USER_RIGHTS_VERSION_CACHE_KEY)
+            except ValueError:
+                cache.set(USER_RIGHTS_VERSION_CACHE_KEY, 1, timeout=None)
+            if memo is not None:
+                memo.clear()
+            return
+        cache.delete(self.get_cache_key(user_id))
+        if memo is not None:
+            memo.pop(user_id, None)
+
+
+user_rights_service = UserRightsService()
@@ -0,0 +1,58 @@
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from accesses.models import Perimeter
+from accesses.services.perimeters import perimeters_service
+from accesses.services.perimeters_hierarchy import perimeters_hierarchy
+from accesses.tests.base import create_perimeters_hierarchy
+
+
+class PerimetersHierarchyTests(TestCase):
+    """
+    for the tests, we'll be using the perimeters hierarchy defined in the base.py file
+    """
+
+    def setUp(self):
+        _ = create_perimeters_hierarchy()
+
+    def test_get_ancestors_ids(self):
+        self.assertEqual(perimeters_hierarchy.get_ancestors_ids(11), {4, 0, 9999})
+        self.assertEqual(perimeters_hierarchy.get_ancestors_ids(9999), set())
+
+    def test_get_descendants_ids(self):
+        self.assertCountEqual(perimeters_hierarchy.get_descendants_ids(2), [8, 9, 10, 13])
+        self.assertCountEqual(perimeters_hierarchy.get_descendants_ids(11), [])
+
+    def test_get_all_child_perimeters_without_false_matches(self):
+        # P13 has `above_levels_ids="10,2,9999"` which contains the substring "1" but is not a child of P1
+        children_ids = perimeters_service.get_all_child_perimeters(perimeter_id=1).values_list("id", flat=True)
+        self.assertCountEqual(children_ids, [6, 7, 14])
+
+    def test_is_self_or_ancestor_in(self):
+        self.assertTrue(perimeters_hierarchy.is_self_or_ancestor_in(12, {0}))
+        self.assertTrue(perimeters_hierarchy.is_self_or_ancestor_in(12, {12}))
+        self.assertFalse(perimeters_hierarchy.is_self_or_ancestor_in(12, {1, 2, 3}))
+        self.assertTrue(perimeters_hierarchy.is_descendant_of(13, 2))
+        self.assertFalse(perimeters_hierarchy.is_descendant_of(13, 1))
+
+    def test_index_is_invalidated_on_perimeter_save(self):
+        self.assertCountEqual(perimeters_hierarchy.get_descendants_ids(3), [])
+        Perimeter.objects.create(id=15, name="P15", local_id="Local P15", parent_id=3, level=4, above_levels_ids="3,0,9999")
+        self.assertCountEqual(perimeters_hierarchy.get_descendants_ids(3), [15])
+        self.assertIn(15, perimeters_hierarchy.get_descendants_ids(9999))
+
+    def test_index_is_built_once_by_concurrent_threads(self):
+        perimeters_hierarchy.invalidate()
+        with patch.object(perimeters_hierarchy, "build_index", wraps=perimeters_hierarchy.build_index) as mock_build_index:
+            with perimeters_hierarchy._lock:
+                # the threads find the index stale and wait for the lock while it is being built
+                threads = [threading.Thread(target=perimeters_hierarchy.get_index) for _ in range(4)]
+                for thread in threads:
+                    thread.start()
+                index = perimeters_hierarchy.build_index()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(mock_build_index.call_count, 1)
+        self.assertIs(perimeters_hierarchy.get_index(), index)
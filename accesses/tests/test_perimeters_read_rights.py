@@ -0,0 +1,39 @@
+from django.test import TestCase
+
+from accesses.services.perimeters import perimeters_service
+from accesses.tests.base import create_perimeters_hierarchy
+
+
+class PerimetersReadRightsTests(TestCase):
+    """
+    for the tests, we'll be using the perimeters hierarchy defined in the base.py file
+    """
+
+    def setUp(self):
+        _ = create_perimeters_hierarchy()
+
+    def test_get_top_perimeters_with_read_nomi_right(self):
+        top_nomi_ids = perimeters_service.get_top_perimeters_with_read_nomi_right(read_nomi_perimeters_ids=[0, 4, 11, 2, 13])
+        self.assertEqual(top_nomi_ids, {0, 2})
+
+    def test_get_top_perimeters_with_read_pseudo_right(self):
+        top_pseudo_ids = perimeters_service.get_top_perimeters_with_read_pseudo_right(
+            top_read_nomi_perimeters_ids={0}, read_pseudo_perimeters_ids=[0, 3, 1, 7, 14, 2]
+        )
+        self.assertEqual(top_pseudo_ids, {1, 2})
+
+    def test_get_read_rights_per_perimeter(self):
+        read_rights = perimeters_service.get_read_rights_per_perimeter(
+            perimeters_ids=[0, 11, 1, 14, 2, 9999], top_read_nomi_perimeters_ids={0}, top_read_pseudo_perimeters_ids={1}
+        )
+        self.assertEqual(
+            read_rights,
+            {
+                0: (True, True),
+                11: (True, True),
+                1: (False, True),
+                14: (False, True),
+                2: (False, False),
+                9999: (False, False),
+            },
+        )
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accesses.models import Access, Role
+from accesses.services.accesses import accesses_service
+from accesses.services.user_rights import user_rights_service
+from accesses.tests.base import create_perimeters_hierarchy, data_reader_nomi_role_definition, full_admin_role_definition
+from admin_cohort.tests.tests_tools import new_user_and_profile, LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserRightsSnapshotTests(TestCase):
+    def setUp(self):
+        _ = create_perimeters_hierarchy()
+        self.user, self.profile = new_user_and_profile()
+        self.role_data_reader_nomi = Role.objects.create(**data_reader_nomi_role_definition)
+        self.access = Access.objects.create(
+            profile=self.profile,
+            role=self.role_data_reader_nomi,
+            perimeter_id=0,
+            start_datetime=timezone.now() - timedelta(days=1),
+            end_datetime=timezone.now() + timedelta(days=1),
+        )
+
+    def test_snapshot_compiles_rights_per_perimeter(self):
+        snapshot = user_rights_service.get_snapshot(self.user)
+        self.assertEqual(snapshot.accesses_ids, {self.access.id})
+        self.assertEqual(snapshot.get_perimeters_ids_with_right("right_read_patient_nominative"), {0})
+        self.assertTrue(snapshot.has_right("right_search_patients_by_ipp"))
+        self.assertFalse(snapshot.is_full_admin)
+        self.assertEqual(snapshot.expires_at, self.access.end_datetime)
+
+    def test_snapshot_is_served_from_cache(self):
+        _ = user_rights_service.get_snapshot(self.user)
+        with self.assertNumQueries(0):
+            self.assertFalse(accesses_service.user_is_full_admin(self.user))
+            self.assertFalse(accesses_service.can_user_manage_users(self.user))
+
+    def test_snapshot_is_invalidated_on_access_save(self):
+        self.assertFalse(accesses_service.user_is_full_admin(self.user))
+        Access.objects.create(
+            profile=self.profile,
+            role=Role.objects.create(**full_admin_role_definition),
+            perimeter_id=9999,
+            start_datetime=timezone.now() - timedelta(days=1),
+            end_datetime=timezone.now() + timedelta(days=1),
+        )
+        self.assertTrue(accesses_service.user_is_full_admin(self.user))
+
+    def test_snapshot_is_invalidated_on_role_save(self):
+        self.assertFalse(accesses_service.can_user_read_opposed_patient_data(self.user))
+        self.role_data_reader_nomi.right_search_opposed_patients = True
+        self.role_data_reader_nomi.save()
+        self.assertTrue(accesses_service.can_user_read_opposed_patient_data(self.user))
+
+    def test_expired_snapshot_is_recompiled(self):
+        snapshot = user_rights_service.get_snapshot(self.user)
+        Access.objects.filter(id=self.access.id).update(end_datetime=timezone.now() - timedelta(seconds=1))
+        snapshot.expires_at = timezone.now() - timedelta(seconds=1)
+        cache.set(user_rights_service.get_cache_key(self.user.pk), snapshot)
+        self.assertEqual(user_rights_service.get_snapshot(self.user).get_perimeters_ids_with_right("right_read_patient_nominative"), set())
+
+    def test_read_mode_on_source_population(self):
+        username = self.user.pk
+        self.assertFalse(accesses_service.is_user_read_pseudo_only(username=username, cohorts_ids=["12", "9999"]))
+        self.assertTrue(accesses_service.is_user_read_pseudo_only(username=username, cohorts_ids=["9999"]))
+        self.assertTrue(accesses_service.is_user_read_pseudo_only(username=username, cohorts_ids=[]))
+        self.assertTrue(accesses_service.is_user_read_pseudo_only(username=None, cohorts_ids=["0"]))
+        with self.assertNumQueries(0):
+            self.assertFalse(accesses_service.is_user_read_pseudo_only(username=username, cohorts_ids=[0]))
@@ -1,13 +1,17 @@
 import time
 from datetime import timedelta
 
+from django.db import connection
 from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.conf import settings
 
 from rest_framework import status
 
 from accesses.models import Access
+from accesses.services.accesses import accesses_service
+from accesses.services.perimeters_hierarchy import perimeters_hierarchy
 from accesses.tests.base import AccessesAppTestsBase
 from accesses.views import AccessViewSet
 from admin_cohort.tests.tests_tools import CaseRetrieveFilter, CreateCase, new_user_and_profile, PatchCase, ListCase, DeleteCase
@@ -521,3 +525,33 @@ class AccessViewTests(AccessesAppTestsBase):
                     if item.get("perimeter_id") == resp_item.get("perimeter_id"):
                         for k, v in resp_item.items():
                             self.assertEqual(item.get(k), v)
+
+    def test_get_my_data_reading_rights_makes_constant_number_of_queries(self):
+        def count_queries() -> int:
+            with CaptureQueriesContext(connection) as context:
+                accesses_service.get_data_reading_rights(user=self.user_y, target_perimeters_ids=[self.p11.id, self.p13.id])
+            return len(context.captured_queries)
+
+        perimeters_hierarchy.get_index()
+        self.create_new_access_for_user(profile=self.profile_y, role=self.role_data_reader_nomi_pseudo, perimeter=self.p0)
+        queries_with_one_access = count_queries()
+        for perimeter in (self.p2, self.p4, self.p10, self.p12, self.p13, self.p14):
+            self.create_new_access_for_user(profile=self.profile_y, role=self.role_data_reader_pseudo, perimeter=perimeter, close_existing=False)
+        self.assertEqual(count_queries(), queries_with_one_access)
+
+    def test_editable_annotation_matches_can_user_manage_access(self):
+        self.create_accesses_on_all_perimeters()
+        _, admin_profile = new_user_and_profile()
+        Access.objects.create(profile=admin_profile, role=self.role_admin_accesses_manager, perimeter=self.aphp)
+        managers = [self.user_data_accesses_manager_on_aphp, self.user_non_accesses_manager, admin_profile.user]
+        for role, perimeter in (
+            (self.role_admin_accesses_manager_inferior_levels, self.p1),
+            (self.role_data_accesses_manager_same_level, self.p2),
+            (self.role_data_accesses_manager_inf_levels, self.p0),
+        ):
+            user, profile = new_user_and_profile()
+            self.create_new_access_for_user(profile=profile, role=role, perimeter=perimeter)
+            managers.append(user)
+        for user in managers:
+            for access in accesses_service.filter_accesses_for_user(user=user, accesses=Access.objects.all()):
+                self.assertEqual(access.editable, accesses_service.can_user_manage_access(user=user, target_access=access))
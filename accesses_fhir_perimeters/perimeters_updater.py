@@ -12,6 +12,7 @@ from fhirpy import SyncFHIRClient
 
 from accesses.models import Perimeter, Access
 from accesses.services.accesses import AccessesService
+from accesses.services.perimeters_hierarchy import perimeters_hierarchy
 from accesses_fhir_perimeters.apps import AccessesFhirAuxConfig
 from admin_cohort.tools.cache import invalidate_cache
 
@@ -209,5 +210,6 @@ def perimeters_data_model_objects_update():
     _logger.info("8. Closing linked accesses")
     AccessesService.close_accesses(perimeters_to_delete)
     _logger.info("End of perimeters updating. Invalidating cache for Perimeters and Accesses")
+    perimeters_hierarchy.invalidate()
     invalidate_cache(model_name=Perimeter.__name__)
     invalidate_cache(model_name=Access.__name__)
@@ -1,7 +1,8 @@
 import logging
+from typing import Iterator, NamedTuple, Optional
 
 from django.conf import settings
-from django.db import models
+from django.db import connections, models
 
 from accesses_perimeters.apps import AccessesPerimetersConfig
 
@@ -10,6 +11,8 @@ DB_ALIAS = AccessesPerimetersConfig.DB_ALIAS
 
 _logger = logging.getLogger("django.request")
 
+CARE_SITES_CHUNK_SIZE = 2000
+
 
 class ModelManager(models.Manager):
     def get_queryset(self):
@@ -32,6 +35,17 @@ class ConceptFhir(models.Model):
         db_table = "concept_fhir"
 
 
+class CareSiteRow(NamedTuple):
+    care_site_id: int
+    care_site_name: Optional[str] = None
+    care_site_short_name: Optional[str] = None
+    care_site_type_source_value: Optional[str] = None
+    care_site_source_value: Optional[str] = None
+    care_site_parent_id: Optional[int] = None
+    cohort_id: Optional[int] = None
+    cohort_size: Optional[int] = None
+
+
 class CareSite(models.Model):
     care_site_id = models.BigIntegerField(primary_key=True)
     care_site_source_value = models.TextField(blank=True, null=True)
@@ -49,6 +63,19 @@ class CareSite(models.Model):
         managed = False
         db_table = "care_site"
 
+    @staticmethod
+    def stream_rows(sql: str, chunk_size: int = CARE_SITES_CHUNK_SIZE) -> Iterator[CareSiteRow]:
+        """
+        Read care sites through a server-side cursor, `chunk_size` rows at a time,
+        as lightweight rows instead of model instances
+        """
+        with connections[DB_ALIAS].chunked_cursor() as cursor:
+            cursor.execute(sql.strip().rstrip(";"))
+            columns = [column.name for column in cursor.description]
+            while rows := cursor.fetchmany(chunk_size):
+                for row in rows:
+                    yield CareSiteRow(**{c: v for c, v in zip(columns, row) if c in CareSiteRow._fields})
+
     @staticmethod
     def sql_get_deleted_care_sites() -> str:
         return """SELECT DISTINCT care_site_id, delete_datetime
@@ -1,18 +1,25 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Union
+import os
+import resource
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Union
 
 from django.conf import settings
-from django.db.models import Q, QuerySet
-from django.db.models.query import RawQuerySet
+from django.db import transaction
 from django.utils import timezone
 
 from accesses.models import Perimeter, Access
 from accesses.services.accesses import AccessesService
-from accesses_perimeters.models import ConceptFhir, CareSite
+from accesses.services.perimeters_hierarchy import perimeters_hierarchy
+from accesses_perimeters.models import CARE_SITES_CHUNK_SIZE, CareSite, CareSiteRow, ConceptFhir
 from admin_cohort.tools.cache import invalidate_cache
 from cohort.models import RequestQuerySnapshot
+from cohort.models.request_query_snapshot import get_query_hash
 from cohort.services.request_query_snapshot import RequestQuerySnapshotService
 
 """
@@ -32,9 +39,9 @@ New Data Models:
 Care site Hierarchy: each care site must have a type, which correspond to the "level" of this care site in the hierarchy
 It is a mono-hierarchy => one parent maximum for 1.n children
 
-1) With build PSQL Query with Concept result filter, and fetch care_site and relation between them in CareSite objects
+1) With build PSQL Query with Concept result filter, and stream care_site and relation between them through a server-side cursor
 2) We generate Perimeters objects ordering by desc in hierarchy logic (from the top level to leafs)
-3) We save all perimeters objects in that order
+3) We save the perimeters objects that changed with bulk statements
 """
 
 _logger = logging.getLogger("info")
@@ -42,6 +49,54 @@ _logger_err = logging.getLogger("django.request")
 
 CARE_SITE_DOMAIN_CONCEPT_NAME = "Care site"
 IS_PART_OF_RELATIONSHIP_NAME = "Care Site is part of Care Site"
+BULK_BATCH_SIZE = 1000
+
+PERIMETER_COMPARED_FIELDS = [
+    "parent_id",
+    "type_source_value",
+    "name",
+    "short_name",
+    "delete_datetime",
+    "cohort_id",
+    "cohort_size",
+    "above_levels_ids",
+    "full_path",
+    "inferior_levels_ids",
+]
+PERIMETER_UPDATED_FIELDS = [
+    "source_value",
+    "name",
+    "short_name",
+    "type_source_value",
+    "parent_id",
+    "above_levels_ids",
+    "full_path",
+    "inferior_levels_ids",
+    "delete_datetime",
+    "cohort_id",
+    "cohort_size",
+]
+
+
+def get_current_memory() -> Optional[float]:
+    """resident memory of the process in MB, if available (Linux)"""
+    try:
+        with open("/proc/self/statm") as fh:
+            resident_pages = int(fh.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def get_resources_usage(start: float) -> str:
+    """
+    elapsed time since `start`, current and peak memory of the process (`ru_maxrss` is in KB on Linux).
+    The peak never goes down: the current memory tells whether a step released what the previous ones used.
+    """
+    current_memory_mb = get_current_memory()
+    peak_memory_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    memory = current_memory_mb is not None and f"memory={current_memory_mb:.0f}MB " or ""
+    return f"[duration={time.monotonic() - start:.1f}s {memory}peak_memory={peak_memory_mb:.0f}MB]"
 
 
 def log(message: str, is_error: bool = False):
@@ -125,7 +180,7 @@ def psql_query_care_site_relationship(top_care_site_id: int) -> str:
             SELECT DISTINCT * FROM care_sites;"""
 
 
-def map_care_site_to_perimeter(care_site: CareSite, relation_perimeter: RelationPerimeter):
+def map_care_site_to_perimeter(care_site: CareSiteRow, relation_perimeter: RelationPerimeter):
     return Perimeter(
         id=care_site.care_site_id,
         local_id=str(care_site.care_site_id),
@@ -143,235 +198,154 @@ def map_care_site_to_perimeter(care_site: CareSite, relation_perimeter: Relation
     )
 
 
-def is_care_site_different_from_perimeter(care_site: CareSite, perimeter: Perimeter, relation_perimeter: RelationPerimeter):
-    return any(
-        (
-            care_site.care_site_parent_id != perimeter.parent_id,
-            care_site.care_site_type_source_value != perimeter.type_source_value,
-            care_site.care_site_name != perimeter.name,
-            care_site.care_site_short_name != perimeter.short_name,
-            care_site.delete_datetime != perimeter.delete_datetime,
-            str(care_site.cohort_id) != str(perimeter.cohort_id),
-            str(care_site.cohort_size) != str(perimeter.cohort_size),
-            relation_perimeter.above_levels_ids != perimeter.above_levels_ids,
-            relation_perimeter.full_path != perimeter.full_path,
-            relation_perimeter.inferior_levels_ids != perimeter.inferior_levels_ids,
-        )
-    )
+def get_perimeter_signature(perimeter: Perimeter) -> tuple:
+    """values compared to tell whether an existing perimeter must be updated"""
+    return tuple(str(getattr(perimeter, f)) for f in PERIMETER_COMPARED_FIELDS)
 
 
-def set_perimeters_to_create_and_update(
-    perimeters_to_create: List[Perimeter],
-    perimeters_to_update: List[Perimeter],
-    all_perimeters: QuerySet,
-    care_site: CareSite,
-    relation_perimeter: RelationPerimeter,
-    previous_level_perimeters: List[Perimeter],
-):
-    try:
-        perimeter = all_perimeters.get(id=care_site.care_site_id)
-        if is_care_site_different_from_perimeter(care_site, perimeter, relation_perimeter):
-            perimeters_to_update.append(map_care_site_to_perimeter(care_site, relation_perimeter))
-        else:
-            previous_level_perimeters.append(perimeter)
-    except Perimeter.DoesNotExist:
-        perimeters_to_create.append(map_care_site_to_perimeter(care_site, relation_perimeter))
+@dataclass
+class PerimetersDiff:
+    to_create: List[Perimeter] = field(default_factory=list)
+    to_update: List[Perimeter] = field(default_factory=list)
+    to_delete: List[Perimeter] = field(default_factory=list)
+    unchanged_count: int = 0
 
+    def __str__(self):
+        return f"{len(self.to_create)} to create, {len(self.to_update)} to update, {len(self.to_delete)} to delete, {self.unchanged_count} unchanged"
 
-def get_parent_perimeter_from_perimeters(perimeters: List[Perimeter], care_site_parent_id: int) -> Perimeter:
-    for perimeter in perimeters:
-        if perimeter.id == care_site_parent_id:
-            return perimeter
-    raise ValueError(f"{care_site_parent_id} has no previous perimeters with the same id")
 
+@dataclass
+class CareSitesTree:
+    """care sites indexed by parent, filled incrementally while streaming the care sites rows"""
 
-def create_top_perimeter(top_care_site: CareSite, all_care_sites: QuerySet, all_perimeters: QuerySet) -> List[Perimeter]:
-    if not all_perimeters:
-        all_perimeters = Perimeter.objects.none()
+    top_care_site_id: int
+    top_care_site: Optional[CareSiteRow] = None
+    children_per_parent: Dict[int, List[CareSiteRow]] = field(default_factory=lambda: defaultdict(list))
+    cohort_id_per_care_site: Dict[int, str] = field(default_factory=dict)
 
-    perimeters_to_create = []
-    perimeters_to_update = []
-    current_perimeters = []
+    def add(self, care_site: CareSiteRow):
+        if care_site.care_site_id == self.top_care_site_id:
+            self.top_care_site = care_site
+        elif care_site.care_site_parent_id is not None:
+            self.children_per_parent[care_site.care_site_parent_id].append(care_site)
+        self.cohort_id_per_care_site[care_site.care_site_id] = str(care_site.cohort_id)
 
-    path = f"{top_care_site.care_site_source_value}-{top_care_site.care_site_name}"
-    log(f"Top perimeter path: {path}")
+    @classmethod
+    def build(cls, top_care_site_id: int, care_sites: Iterable[CareSiteRow]) -> CareSitesTree:
+        start = time.monotonic()
+        tree = cls(top_care_site_id=top_care_site_id)
+        for i, care_site in enumerate(care_sites, start=1):
+            tree.add(care_site)
+            if i % CARE_SITES_CHUNK_SIZE == 0:
+                log(f"{i} care sites read {get_resources_usage(start)}")
+        return tree
 
-    children = get_child_care_sites(care_site=top_care_site, all_care_sites=all_care_sites)
-    top_level = 1
-    relation_perimeters = RelationPerimeter(above_levels_ids=None, inferior_levels_ids=children, full_path=path, level=top_level)
-    set_perimeters_to_create_and_update(
-        perimeters_to_create=perimeters_to_create,
-        perimeters_to_update=perimeters_to_update,
-        all_perimeters=all_perimeters,
-        care_site=top_care_site,
-        relation_perimeter=relation_perimeters,
-        previous_level_perimeters=current_perimeters,
-    )
-    top_care_site_level = top_care_site.care_site_type_source_value
+    @property
+    def care_sites_ids(self) -> Set[int]:
+        return set(self.cohort_id_per_care_site)
 
-    log(
-        f"Process at level: {top_care_site_level} "
-        f"-Current Perimeters: {len(current_perimeters)} "
-        f"-Perimeters to create: {len(perimeters_to_create)} "
-        f"-Perimeters to update: {len(perimeters_to_update)}"
-    )
 
-    insert_perimeters(perimeters_to_create)
-    update_perimeters(perimeters_to_update)
-    return current_perimeters + perimeters_to_create + perimeters_to_update
-
-
-def recursively_create_child_perimeters(
-    parents_ids: List[int], care_sites: List[CareSite], all_perimeters: QuerySet, previous_level_perimeters: List[Perimeter], level: int
-):
-    if not all_perimeters:
-        all_perimeters = Perimeter.objects.none()
-
-    children_care_site_objects = []
-    perimeters_to_create = []
-    perimeters_to_update = []
-    current_parents_ids = []
-    care_site_levels = []
-    new_previous_level_list = []
-    # for every care_site where id is in current parent id list we map to perimeter and add it to a list
-    for care_site in care_sites:
-        if care_site.care_site_parent_id in parents_ids:
-            if care_site.care_site_id in current_parents_ids:
-                _logger.warning(f"Care site {care_site.care_site_id} has 2 or more parents !")
-                continue
+def build_perimeters_from_care_sites(tree: CareSitesTree) -> List[Perimeter]:
+    """
+    Map care sites to perimeters walking the care sites tree breadth-first from the top care site,
+    so that each perimeter's above levels and full path derive from its parent's in a single pass.
+    """
+    top_care_site, children_per_parent = tree.top_care_site, tree.children_per_parent
 
-            # We get the previous above_levels_ids value from parent perimeter and add current id
-            parent_perimeter = get_parent_perimeter_from_perimeters(
-                perimeters=previous_level_perimeters, care_site_parent_id=care_site.care_site_parent_id
-            )
+    def get_children_ids(care_site_id: int) -> str:
+        return ",".join(str(cs.care_site_id) for cs in children_per_parent.get(care_site_id, []))
 
+    path = f"{top_care_site.care_site_source_value}-{top_care_site.care_site_name}"
+    log(f"Top perimeter path: {path}")
+    top_perimeter = map_care_site_to_perimeter(
+        top_care_site,
+        RelationPerimeter(above_levels_ids=None, inferior_levels_ids=get_children_ids(top_care_site.care_site_id), full_path=path, level=1),
+    )
+    perimeters = [top_perimeter]
+    visited_ids = {top_perimeter.id}
+    queue = deque([top_perimeter])
+    while queue:
+        parent_perimeter = queue.popleft()
+        for care_site in children_per_parent.get(parent_perimeter.id, []):
+            if care_site.care_site_id in visited_ids:
+                _logger.warning(f"Care site {care_site.care_site_id} has 2 or more parents !")
+                continue
+            visited_ids.add(care_site.care_site_id)
             if parent_perimeter.above_levels_ids:
                 above_levels_ids = ",".join([parent_perimeter.above_levels_ids, str(parent_perimeter.id)])
             else:
                 above_levels_ids = str(parent_perimeter.id)
-            children = get_child_care_sites(care_site=care_site, all_care_sites=care_sites)
-            full_path = f"{parent_perimeter.full_path}/{care_site.care_site_source_value}-{care_site.care_site_name}"
-
-            relation_perimeter = RelationPerimeter(above_levels_ids=above_levels_ids, inferior_levels_ids=children, full_path=full_path, level=level)
-
-            set_perimeters_to_create_and_update(
-                perimeters_to_create=perimeters_to_create,
-                perimeters_to_update=perimeters_to_update,
-                all_perimeters=all_perimeters,
-                care_site=care_site,
-                relation_perimeter=relation_perimeter,
-                previous_level_perimeters=new_previous_level_list,
+            relation_perimeter = RelationPerimeter(
+                above_levels_ids=above_levels_ids,
+                inferior_levels_ids=get_children_ids(care_site.care_site_id),
+                full_path=f"{parent_perimeter.full_path}/{care_site.care_site_source_value}-{care_site.care_site_name}",
+                level=parent_perimeter.level + 1,
             )
-
-            current_parents_ids.append(care_site.care_site_id)
-            care_site_levels.append(care_site.care_site_type_source_value)
+            perimeter = map_care_site_to_perimeter(care_site, relation_perimeter)
+            perimeters.append(perimeter)
+            queue.append(perimeter)
+    return perimeters
+
+
+def compute_perimeters_diff(
+    perimeters: List[Perimeter],
+    existing_perimeters: Dict[int, Perimeter],
+    valid_care_sites_ids: Set[int],
+    deleted_care_sites: Dict[int, datetime],
+) -> PerimetersDiff:
+    diff = PerimetersDiff()
+    for perimeter in perimeters:
+        existing_perimeter = existing_perimeters.get(perimeter.id)
+        if existing_perimeter is None:
+            diff.to_create.append(perimeter)
+        elif get_perimeter_signature(perimeter) != get_perimeter_signature(existing_perimeter):
+            diff.to_update.append(perimeter)
         else:
-            children_care_site_objects.append(care_site)
-
-    log(f"Children care_site objects found: {len(children_care_site_objects)}")
-
-    if perimeters_to_create or perimeters_to_update or new_previous_level_list:
-        log(
-            f"Process at levels: {set(care_site_levels)}\n"
-            f"- Perimeters already existing: {len(new_previous_level_list)}\n"
-            f"- Perimeters to Create: {len(perimeters_to_create)}\n"
-            f"- Perimeters to update: {len(perimeters_to_update)}"
-        )
-        insert_perimeters(perimeters_to_create)
-        update_perimeters(perimeters_to_update)
-        new_previous_level_list = new_previous_level_list + perimeters_to_create + perimeters_to_update
-        recursively_create_child_perimeters(
-            parents_ids=current_parents_ids,
-            care_sites=children_care_site_objects,
-            all_perimeters=all_perimeters,
-            previous_level_perimeters=new_previous_level_list,
-            level=level + 1,
-        )
-
-
-def update_perimeters(perimeters_to_update: List[Perimeter]):
-    Perimeter.objects.bulk_update(
-        perimeters_to_update,
-        [
-            "source_value",
-            "name",
-            "short_name",
-            "type_source_value",
-            "parent_id",
-            "above_levels_ids",
-            "full_path",
-            "inferior_levels_ids",
-            "delete_datetime",
-            "cohort_id",
-            "cohort_size",
-        ],
-    )
-
-
-def insert_perimeters(perimeters_to_create: List[Perimeter]):
-    Perimeter.objects.bulk_create(perimeters_to_create)
-
-
-def delete_perimeters(perimeters: QuerySet, care_sites: RawQuerySet):
-    perimeters_to_delete = get_perimeters_to_delete(all_perimeters=perimeters, all_valid_care_sites=care_sites)
-    if perimeters_to_delete:
-        update_perimeters(perimeters_to_delete)
-        log(f"{len(perimeters_to_delete)} perimeters have been deleted - {perimeters_to_delete}")
-    else:
-        log("No perimeters have been deleted")
-    return perimeters_to_delete
-
+            diff.unchanged_count += 1
 
-def get_perimeters_to_delete(all_perimeters: QuerySet, all_valid_care_sites: RawQuerySet):
-    deleted_care_sites = CareSite.objects.raw(CareSite.sql_get_deleted_care_sites())
-    deleted_care_sites_ids = (cs.care_site_id for cs in deleted_care_sites)
-    care_sites_delete_dt = {cs.care_site_id: cs.delete_datetime for cs in deleted_care_sites}
-    valid_care_sites_ids = (cs.care_site_id for cs in all_valid_care_sites)
+    now = timezone.now()
+    for perimeter in existing_perimeters.values():
+        if perimeter.id in valid_care_sites_ids:
+            continue
+        delete_datetime = deleted_care_sites.get(perimeter.id) or perimeter.delete_datetime or now
+        if delete_datetime != perimeter.delete_datetime:
+            perimeter.delete_datetime = delete_datetime
+            diff.to_delete.append(perimeter)
+    return diff
 
-    perimeters_to_delete_1 = all_perimeters.exclude(id__in=valid_care_sites_ids)
-    perimeters_to_delete_2 = all_perimeters.filter(Q(id__in=deleted_care_sites_ids))
 
-    perimeters_to_delete_1.update(delete_datetime=timezone.now())
-    log(f"Perimeters are no longer present in care_site hierarchy: {perimeters_to_delete_1}")
+def apply_perimeters_diff(diff: PerimetersDiff):
+    with transaction.atomic():
+        Perimeter.objects.bulk_create(diff.to_create, batch_size=BULK_BATCH_SIZE)
+        Perimeter.objects.bulk_update(diff.to_update, PERIMETER_UPDATED_FIELDS, batch_size=BULK_BATCH_SIZE)
+        Perimeter.objects.bulk_update(diff.to_delete, ["delete_datetime"], batch_size=BULK_BATCH_SIZE)
+    if diff.to_delete:
+        log(f"{len(diff.to_delete)} perimeters have been deleted - {[p.id for p in diff.to_delete]}")
 
-    for perimeter in perimeters_to_delete_2:
-        perimeter.delete_datetime = care_sites_delete_dt.get(perimeter.id)
-        log(f"Perimeter {perimeter.id} was referencing a deleted care_site")
-    return perimeters_to_delete_1.union(perimeters_to_delete_2)
 
-
-def get_child_care_sites(care_site: CareSite, all_care_sites: Union[List[CareSite], QuerySet]) -> str:
-    children_ids = (str(cs.care_site_id) for cs in all_care_sites if cs.care_site_parent_id == care_site.care_site_id)
-    return ",".join(children_ids)
-
-
-def get_updated_cohort_id_mapping(all_perimeters: QuerySet, all_valid_care_sites: List[CareSite]):
+def get_updated_cohort_id_mapping(existing_perimeters: Iterable[Perimeter], cohort_id_per_care_site: Dict[int, str]):
     """
     Get the updated cohort id mapping for all perimeters
     """
-
-    def find_matching_care_site_cohort_id(perimeter: Perimeter):
-        matching_care_site = [cs for cs in all_valid_care_sites if cs.care_site_id == perimeter.id]
-        if matching_care_site:
-            return str(matching_care_site[0].cohort_id)
-        return None
-
-    return {perimeter.cohort_id: find_matching_care_site_cohort_id(perimeter) for perimeter in all_perimeters}
+    return {perimeter.cohort_id: cohort_id_per_care_site.get(perimeter.id) for perimeter in existing_perimeters}
 
 
-def update_query_snapshots_cohort_id(all_perimeters: QuerySet, all_valid_care_sites: List[CareSite]):
+def update_query_snapshots_cohort_id(existing_perimeters: Iterable[Perimeter], cohort_id_per_care_site: Dict[int, str]):
     """
     Update the cohort id in query snapshots if the cohort id for the perimeters has changed
     """
-    matching = get_updated_cohort_id_mapping(all_perimeters, all_valid_care_sites)
+    matching = get_updated_cohort_id_mapping(existing_perimeters, cohort_id_per_care_site)
     differing_matching = {k: v for k, v in matching.items() if v is not None and k != v}
+    if not differing_matching:
+        return
     rqs_to_update = []
     for rqs in RequestQuerySnapshot.objects.filter(perimeters_ids__overlap=list(differing_matching.keys())):
         log(f"Updating perimeters for request snapshot {rqs.uuid} with original perimeters {rqs.perimeters_ids}")
         rqs.serialized_query = RequestQuerySnapshotService.update_query_perimeter(rqs.serialized_query, differing_matching)
         rqs.perimeters_ids = sorted(list(set(differing_matching.get(pid) or pid for pid in rqs.perimeters_ids)))
+        rqs.query_hash = get_query_hash(rqs.serialized_query)
         rqs_to_update.append(rqs)
-    RequestQuerySnapshot.objects.bulk_update(rqs_to_update, ["serialized_query", "perimeters_ids"])
+    RequestQuerySnapshot.objects.bulk_update(rqs_to_update, ["serialized_query", "perimeters_ids", "query_hash"], batch_size=BULK_BATCH_SIZE)
 
 
 """
@@ -382,43 +356,50 @@ process steps:
 1) Get list of top care site hierarchy
 2) Fetch from OMOP PG tables all needed data to build CareSite object tree
 3) Get all existing perimeters
-4) Insert or update perimeters with refreshed data
-5) Add delete timestamp to deleted perimeters and close accesses with no valid perimeter
+4) Compute the diff between the care sites tree and the existing perimeters
+5) Apply the diff with bulk statements, add delete timestamp to deleted perimeters and close accesses with no valid perimeter
+With `dry_run=True`, the diff is only computed and returned.
 """
 
 
-def perimeters_data_model_objects_update():
+def perimeters_data_model_objects_update(dry_run: bool = False) -> Optional[PerimetersDiff]:
+    start = time.monotonic()
     top_perimeter_id = settings.ROOT_PERIMETER_ID
     log("1. Get root perimeter id")
 
-    all_valid_care_sites = CareSite.objects.raw(psql_query_care_site_relationship(top_care_site_id=top_perimeter_id))
-    try:
-        top_care_site = [cs for cs in all_valid_care_sites if cs.care_site_id == top_perimeter_id][0]
-    except IndexError:
+    care_sites = CareSite.stream_rows(psql_query_care_site_relationship(top_care_site_id=top_perimeter_id))
+    tree = CareSitesTree.build(top_care_site_id=top_perimeter_id, care_sites=care_sites)
+    if tree.top_care_site is None:
         log("Perimeters daily update: missing top care site", is_error=True)
-        return
-    log(f"2. Fetch {len(all_valid_care_sites)} care sites from OMOP DB")
-
-    all_perimeters = Perimeter.objects.all(even_deleted=True)
-    log(f"3. All perimeters: {len(all_perimeters)}")
-
-    log("4. Create top hierarchy perimeter")
-    top_perimeters = create_top_perimeter(top_care_site=top_care_site, all_care_sites=all_valid_care_sites, all_perimeters=all_perimeters)
-    log("5. Start recursive Perimeter objects creation")
-    second_level = 2
-    recursively_create_child_perimeters(
-        parents_ids=[top_perimeter_id],
-        care_sites=all_valid_care_sites,
-        all_perimeters=all_perimeters,
-        previous_level_perimeters=top_perimeters,
-        level=second_level,
+        return None
+    log(f"2. Fetch {len(tree.cohort_id_per_care_site)} care sites from OMOP DB {get_resources_usage(start)}")
+
+    existing_perimeters = {p.id: p for p in Perimeter.objects.all(even_deleted=True).iterator(chunk_size=CARE_SITES_CHUNK_SIZE)}
+    log(f"3. All perimeters: {len(existing_perimeters)} {get_resources_usage(start)}")
+
+    log("4. Compute perimeters diff")
+    perimeters = build_perimeters_from_care_sites(tree)
+    deleted_care_sites = {cs.care_site_id: cs.delete_datetime for cs in CareSite.objects.raw(CareSite.sql_get_deleted_care_sites())}
+    diff = compute_perimeters_diff(
+        perimeters=perimeters,
+        existing_perimeters=existing_perimeters,
+        valid_care_sites_ids=tree.care_sites_ids,
+        deleted_care_sites=deleted_care_sites,
     )
+    log(f"Perimeters diff: {diff} {get_resources_usage(start)}")
+    if dry_run:
+        log("Dry run: no changes applied")
+        return diff
+
+    log("5. Apply perimeters diff")
+    apply_perimeters_diff(diff)
     log("6. Update cohort id in query snapshots")
-    update_query_snapshots_cohort_id(all_perimeters, all_valid_care_sites)
-    log("7. Deleting removed perimeters")
-    perimeters_to_delete = delete_perimeters(perimeters=all_perimeters, care_sites=all_valid_care_sites)
-    log("8. Closing linked accesses")
-    AccessesService.close_accesses(perimeters_to_delete)
+    update_query_snapshots_cohort_id(existing_perimeters.values(), tree.cohort_id_per_care_site)
+    log("7. Closing linked accesses")
+    AccessesService.close_accesses(Perimeter.objects.all(even_deleted=True).filter(id__in=[p.id for p in diff.to_delete]))
     log("End of perimeters updating. Invalidating cache for Perimeters and Accesses")
+    perimeters_hierarchy.invalidate()
     invalidate_cache(model_name=Perimeter.__name__)
     invalidate_cache(model_name=Access.__name__)
+    log(f"Perimeters updated {get_resources_usage(start)}")
+    return diff
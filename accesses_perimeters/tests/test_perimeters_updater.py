@@ -124,3 +124,29 @@ class PerimetersUpdaterTests(TestCaseWithDBs):
         self.assertEqual(updated_query.serialized_query, '{"sourcePopulation": {"caresiteCohortList": ["5", "6"]}}')
         count_created_perimeters = Perimeter.objects.count()
         self.assertEqual(count_created_perimeters, len(care_sites_data[1]))
+
+    def run_perimeters_update(self, dry_run: bool = False):
+        with (
+            patch.object(CareSite, "sql_get_deleted_care_sites", return_value=self.edited_sql_care_site),
+            patch("accesses_perimeters.perimeters_updater.psql_query_care_site_relationship", return_value=self.edited_sql_query),
+            patch(target="accesses_perimeters.models.DB_ALIAS", new=DEFAULT_DB_ALIAS),
+            patch("accesses_perimeters.perimeters_updater.settings") as mock_settings,
+        ):
+            mock_settings.ROOT_PERIMETER_ID = ROOT_PERIMETER_ID
+            return perimeters_data_model_objects_update(dry_run=dry_run)
+
+    def test_dry_run_reports_diff_without_applying_it(self):
+        diff = self.run_perimeters_update(dry_run=True)
+        self.assertEqual(len(diff.to_create), len(care_sites_data[1]) - 2)
+        self.assertCountEqual([p.id for p in diff.to_update], [3, 4])
+        self.assertEqual(Perimeter.objects.count(), 2)
+
+    def test_perimeters_hierarchy_and_idempotent_refresh(self):
+        self.run_perimeters_update()
+        p7 = Perimeter.objects.get(id=7)
+        self.assertEqual((p7.parent_id, p7.above_levels_ids, p7.level), (4, f"{ROOT_PERIMETER_ID},1,4", 4))
+        self.assertEqual(p7.full_path, "APHP-APHP/P1-P1/P5-P5/P12-P12")
+        self.assertEqual(Perimeter.objects.get(id=0).inferior_levels_ids, "2,3")
+        diff = self.run_perimeters_update()
+        self.assertEqual((len(diff.to_create), len(diff.to_update), len(diff.to_delete)), (0, 0, 0))
+        self.assertEqual(diff.unchanged_count, len(care_sites_data[1]))
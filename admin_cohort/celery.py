@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "admin_cohort.settings")
 
@@ -10,3 +11,9 @@ celery_app = Celery("admin_cohort")
 celery_app.config_from_object("django.conf:settings", namespace="CELERY")
 
 celery_app.autodiscover_tasks()
+
+# imported once the app is set up, as it depends on Django
+from admin_cohort.tools.task_metrics import on_task_prerun, on_task_published  # noqa: E402
+
+before_task_publish.connect(on_task_published)
+task_prerun.connect(on_task_prerun)
@@ -0,0 +1,69 @@
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+DEFAULT_QUEUE = "celery"
+INTERACTIVE_QUEUE = "interactive"
+LONG_PENDING_QUEUE = "long_pending"
+BATCH_QUEUE = "batch"
+EXPORTS_QUEUE = "exports"
+NOTIFICATIONS_QUEUE = "notifications"
+
+QUEUES = (DEFAULT_QUEUE, INTERACTIVE_QUEUE, LONG_PENDING_QUEUE, BATCH_QUEUE, EXPORTS_QUEUE, NOTIFICATIONS_QUEUE)
+
+# with the Redis broker, 0 is the highest priority and 9 the lowest
+HIGH_PRIORITY = 0
+MEDIUM_PRIORITY = 3
+LOW_PRIORITY = 6
+LOWEST_PRIORITY = 9
+
+# task name: (queue, priority). Tasks not listed here go to the default queue
+TASKS_ROUTING: Dict[str, Tuple[str, int]] = {
+    # users are waiting for these ones over the websocket
+    "cohort.tasks.count_cohort": (INTERACTIVE_QUEUE, HIGH_PRIORITY),
+    "cohort.tasks.cancel_previous_count_jobs": (INTERACTIVE_QUEUE, HIGH_PRIORITY),
+    "cohort.tasks.create_cohort": (INTERACTIVE_QUEUE, MEDIUM_PRIORITY),
+    "exports.tasks.get_logs": (INTERACTIVE_QUEUE, MEDIUM_PRIORITY),
+    "cohort.tasks.feasibility_study_count": (INTERACTIVE_QUEUE, LOW_PRIORITY),
+    # scheduled and bulk jobs
+    "cohort.tasks.refresh_due_count_requests": (BATCH_QUEUE, MEDIUM_PRIORITY),
+    "cohort.tasks.refresh_count_requests": (BATCH_QUEUE, LOW_PRIORITY),
+    "accesses.tasks.sync_orbis_accesses": (BATCH_QUEUE, LOW_PRIORITY),
+    "accesses.tasks.count_users_on_perimeters": (BATCH_QUEUE, LOWEST_PRIORITY),
+    "accesses_perimeters.tasks.perimeters_daily_update": (BATCH_QUEUE, LOW_PRIORITY),
+    "accesses_fhir_perimeters.tasks.perimeters_daily_update": (BATCH_QUEUE, LOW_PRIORITY),
+    "accesses_fhir_perimeters.tasks.create_virtual_cohort": (BATCH_QUEUE, LOWEST_PRIORITY),
+    # exports
+    "exports.tasks.launch_export_task": (EXPORTS_QUEUE, MEDIUM_PRIORITY),
+    "exports.tasks.check_cohort_subsets_created": (EXPORTS_QUEUE, MEDIUM_PRIORITY),
+    "exporters.tasks.track_export_job": (EXPORTS_QUEUE, LOW_PRIORITY),
+    "exports.tasks.delete_exported_files": (EXPORTS_QUEUE, LOWEST_PRIORITY),
+    # notifications
+    "admin_cohort.tasks.maintenance_notifier_checker": (NOTIFICATIONS_QUEUE, HIGH_PRIORITY),
+    "admin_cohort.tasks.maintenance_notifier": (NOTIFICATIONS_QUEUE, HIGH_PRIORITY),
+    "cohort.tasks.send_feasibility_study_notification": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "cohort.tasks.send_email_feasibility_report_ready": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "cohort.tasks.send_email_feasibility_report_error": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "cohort.tasks.send_email_count_request_refreshed": (NOTIFICATIONS_QUEUE, LOW_PRIORITY),
+    "cohort_job_server.tasks.notify_large_cohort_ready": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "exporters.tasks.notify_export_received": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "exporters.tasks.notify_export_succeeded": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "exporters.tasks.notify_export_failed": (NOTIFICATIONS_QUEUE, MEDIUM_PRIORITY),
+    "accesses.tasks.check_expiring_accesses": (NOTIFICATIONS_QUEUE, LOW_PRIORITY),
+}
+
+
+def route_task(name: str, args, kwargs, options: dict, task=None, **kw) -> Optional[dict]:
+    """Celery router: queue and priority of the task, as configured in `TASKS_ROUTING` and `CELERY_TASKS_QUEUES`"""
+    queue, priority = TASKS_ROUTING.get(name, (None, None))
+    queue = settings.CELERY_TASKS_QUEUES.get(name, queue)
+    if queue is None:
+        return None
+    return priority is None and {"queue": queue} or {"queue": queue, "priority": priority}
+
+
+def get_long_pending_options() -> dict:
+    """apply_async() options of a cohort creation expected to be long (over `COHORT_SIZE_LIMIT`)"""
+    if not settings.CELERY_ROUTING_ENABLED:
+        return {}
+    return {"queue": LONG_PENDING_QUEUE, "priority": LOW_PRIORITY}
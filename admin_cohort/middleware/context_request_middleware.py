@@ -2,7 +2,6 @@ import uuid
 from contextvars import ContextVar, Token
 from typing import Optional, Any, Type
 
-import jwt
 from django.conf import settings
 from django.http import HttpRequest
 
@@ -20,16 +19,9 @@ def get_trace_id() -> str:
 
 
 def get_request_user_id(request) -> str:
-    user_id = "Anonymous"
-    bearer_token = request.META.get("HTTP_AUTHORIZATION")
-    auth_token = bearer_token and bearer_token.split("Bearer ")[1] or None
-    if auth_token is not None:
-        try:
-            decoded = jwt.decode(jwt=auth_token, options={"verify_signature": True})
-            user_id = decoded.get("preferred_username", decoded.get("username"))
-        except jwt.PyJWTError:
-            pass
-    return user_id
+    from admin_cohort.services.auth import auth_service
+
+    return auth_service.get_request_username(request) or "Anonymous"
 
 
 class ContextRequestHolder:
@@ -53,13 +45,14 @@ class ContextRequestMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        request.environ.update(
-            {
-                "user_id": get_request_user_id(request),
-                "trace_id": request.headers.get(settings.TRACE_ID_HEADER, str(uuid.uuid4())),
-                "impersonating": request.headers.get(settings.IMPERSONATING_HEADER, "-"),
-            }
-        )
         with ContextRequestHolder(request):
+            # the token verification is memoized on the context request and reused to authenticate it
+            request.environ.update(
+                {
+                    "user_id": get_request_user_id(request),
+                    "trace_id": request.headers.get(settings.TRACE_ID_HEADER, str(uuid.uuid4())),
+                    "impersonating": request.headers.get(settings.IMPERSONATING_HEADER, "-"),
+                }
+            )
             response = self.get_response(request)
         return response
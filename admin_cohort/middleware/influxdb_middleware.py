@@ -1,31 +1,99 @@
-from time import time
-from influxdb_client import InfluxDBClient
-from influxdb_client.client.write_api import ASYNCHRONOUS
+import time
+from typing import Any, Dict, List
 
 from django.conf import settings
+from django.db import connection
+
+from admin_cohort.services.auth import jwks_store
+from admin_cohort.tools.cache import RESPONSE_CACHE_HIT_ATTRIBUTE, GenerationalCache
+from admin_cohort.tools.http_client import LATENCY_BUCKETS, http_metrics
+from admin_cohort.tools.metrics_emitter import Point, metrics_emitter
+
+
+class DBQueriesMetrics:
+    """`connection.execute_wrapper()` counting the queries of a request and the time spent running them"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def get_fields(stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in stats.items() if value is not None}
+
+
+def collect_http_client_metrics() -> List[Point]:
+    return [
+        {
+            "measurement": "django_http_client",
+            "tags": {"service": metrics["service"], "method": metrics["method"], "endpoint": metrics["endpoint"]},
+            "fields": {
+                "count": metrics["count"],
+                "errors": metrics["errors"],
+                "total_duration": metrics["total_duration"],
+                **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS + ("inf",), metrics["buckets"])},
+            },
+        }
+        for metrics in http_metrics.get_snapshot()
+    ]
+
+
+def collect_caches_metrics() -> List[Point]:
+    return [
+        {"measurement": "django_cache", "tags": {"namespace": generational_cache.namespace}, "fields": get_fields(generational_cache.get_stats())}
+        for generational_cache in GenerationalCache.instances
+    ]
+
+
+def collect_jwks_metrics() -> List[Point]:
+    return [
+        {
+            "measurement": "django_oidc_jwks",
+            "tags": {"issuer": stats.pop("issuer")},
+            "fields": get_fields(stats),
+        }
+        for stats in jwks_store.get_snapshot()
+    ]
+
+
+metrics_emitter.register_collector(collect_http_client_metrics)
+metrics_emitter.register_collector(collect_caches_metrics)
+metrics_emitter.register_collector(collect_jwks_metrics)
 
 
 class InfluxDBMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
-        self.client = InfluxDBClient(url=settings.INFLUXDB_URL, token=settings.INFLUXDB_TOKEN)
 
     def __call__(self, request):
         if not settings.INFLUXDB_ENABLED:
             return self.get_response(request)
 
-        start_time = time()
+        db_metrics = DBQueriesMetrics()
+        start_time = time.perf_counter()
+        response = None
         try:
-            response = self.get_response(request)
+            with connection.execute_wrapper(db_metrics):
+                response = self.get_response(request)
         finally:
-            end_time = time()
+            response_time = time.perf_counter() - start_time
+            resolver_match = request.resolver_match
             tags = {
                 "method": request.method,
-                "path": request.path_info,
-                "env": not settings.DEBUG and "prod" or "dev_qua",
+                "view": resolver_match and (resolver_match.view_name or resolver_match.route) or "unresolved",
+                "status": response is not None and response.status_code or 500,
             }
-            fields = {"response_time": (end_time - start_time) * 10**3}
-            point = {"measurement": "django_requests", "tags": tags, "fields": fields, "time": int(end_time * 10**9)}
-            write_api = self.client.write_api(write_options=ASYNCHRONOUS)
-            write_api.write(settings.INFLUXDB_BUCKET, settings.INFLUXDB_ORG, point)
+            fields = {"response_time": response_time * 10**3, "db_queries": db_metrics.count, "db_time": db_metrics.duration * 10**3}
+            cache_hit = getattr(request, RESPONSE_CACHE_HIT_ATTRIBUTE, None)
+            if cache_hit is not None:
+                fields["cache_hit"] = cache_hit
+            metrics_emitter.emit({"measurement": "django_requests", "tags": tags, "fields": fields, "time": time.time_ns()})
         return response
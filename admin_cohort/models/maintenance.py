@@ -28,3 +28,9 @@ class MaintenancePhase(BaseModel):
     @property
     def active(self):
         return self.start_datetime < timezone.now() < self.end_datetime
+
+    def save(self, *args, **kwargs):
+        from admin_cohort.services.maintenance import maintenance_service
+
+        super().save(*args, **kwargs)
+        maintenance_service.on_maintenance_phase_saved()
@@ -1,18 +1,19 @@
 import hashlib
 import json
 import logging
+import threading
+import time
 from abc import ABC
 from dataclasses import dataclass
 from datetime import timedelta
-from functools import lru_cache
 from typing import Any, Tuple, Optional, Callable, Dict, List
 
 import environ
 import jwt
-import requests
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
 from django.utils import timezone
 from django.utils.module_loading import import_string
 from jwt import InvalidTokenError
@@ -25,16 +26,22 @@ from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 
 from accesses.models import Profile, Role, Perimeter, Access
 from admin_cohort.apps import AdminCohortConfig
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
 from admin_cohort.models import User
 from admin_cohort.types import OIDCAuthTokens, JWTAuthTokens, AuthTokens
 from admin_cohort.exceptions import ServerError, NoAuthenticationHookDefined
+from admin_cohort.middleware.context_request_middleware import context_request
+from admin_cohort.tools.http_client import HttpClient
 
 
 env = environ.Env()
 _logger = logging.getLogger("info")
 _logger_err = logging.getLogger("django.request")
 
+oidc_http_client = HttpClient(service="oidc")
+
+VERIFIED_TOKENS_MEMO_ATTRIBUTE = "_verified_tokens"
+AUTHENTICATION_MEMO_ATTRIBUTE = "_authentication"
+
 extra_applicative_users = {}
 
 if apps.is_installed("cohort_job_server"):
@@ -111,18 +118,146 @@ def build_oidc_configs() -> List[OIDCAuthConfig]:
     return configs
 
 
-@lru_cache
-def get_issuer_certs(issuer: str) -> dict:
-    issuer_certs_url = f"{issuer}/protocol/openid-connect/certs"
-    response = requests.get(url=issuer_certs_url, timeout=HTTP_REQUEST_TIMEOUT)
-    if response.status_code != status.HTTP_200_OK:
-        raise ServerError(f"Error {response.status_code} from OIDC Auth Server ({issuer_certs_url}): {response.text}")
-    jwks = response.json()
-    certs = {}
-    for jwk in jwks["keys"]:
-        kid = jwk["kid"]
-        certs[kid] = RSAAlgorithm.from_jwk(json.dumps(jwk))
-    return certs
+class JWKSStore:
+    """
+    Signing keys of the OIDC issuers, shared by the processes through the cache and parsed once per process.
+    Each process checks the shared keys every `JWKS_LOCAL_CHECK_INTERVAL` seconds. Keys older than
+    `JWKS_REFRESH_AHEAD_RATIO` of `JWKS_CACHE_TIMEOUT` are re-fetched by a background thread, requests going on with
+    the current ones: only the very first call blocks on the fetch.
+    A token signed with an unknown key (keys rotation) triggers a re-fetch, at most once every
+    `JWKS_MIN_REFETCH_INTERVAL` seconds. Fetches are single-flight: concurrent callers wait for the one in progress.
+    """
+
+    JWKS_LOCAL_CHECK_INTERVAL = 60
+    JWKS_REFRESH_AHEAD_RATIO = 0.8
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        # issuer: (fetched_at, checked_at, certs)
+        self._certs: Dict[str, Tuple[float, float, dict]] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._background_refreshes: Dict[str, float] = {}
+
+    @staticmethod
+    def get_cache_key(issuer: str) -> str:
+        return f"auth.jwks.{issuer}"
+
+    def get_fetch_lock(self, issuer: str) -> threading.Lock:
+        with self._lock:
+            return self._fetch_locks.setdefault(issuer, threading.Lock())
+
+    def get_stats(self, issuer: str) -> Dict[str, Any]:
+        return self._stats.setdefault(issuer, {"fetches": 0, "fetch_errors": 0, "unknown_kid_refetches": 0, "last_fetch_duration": None})
+
+    def record_fetch(self, issuer: str, duration: float, failed: bool) -> None:
+        with self._lock:
+            stats = self.get_stats(issuer)
+            stats["fetches"] += 1
+            stats["fetch_errors"] += failed
+            stats["last_fetch_duration"] = duration
+
+    def load(self, issuer: str, fetched_at: float, keys: List[dict]) -> dict:
+        current = self._certs.get(issuer)
+        if current is not None and current[0] == fetched_at:
+            certs = current[2]
+        else:
+            certs = {jwk["kid"]: RSAAlgorithm.from_jwk(json.dumps(jwk)) for jwk in keys}
+        self._certs[issuer] = (fetched_at, time.time(), certs)
+        return certs
+
+    def fetch(self, issuer: str) -> dict:
+        issuer_certs_url = f"{issuer}/protocol/openid-connect/certs"
+        start = time.perf_counter()
+        response = oidc_http_client.get(url=issuer_certs_url)
+        failed = response.status_code != status.HTTP_200_OK
+        self.record_fetch(issuer=issuer, duration=time.perf_counter() - start, failed=failed)
+        if failed:
+            raise ServerError(f"Error {response.status_code} from OIDC Auth Server ({issuer_certs_url}): {response.text}")
+        jwks = {"fetched_at": time.time(), "keys": response.json()["keys"]}
+        cache.set(self.get_cache_key(issuer), jwks, timeout=settings.JWKS_CACHE_TIMEOUT)
+        return self.load(issuer=issuer, fetched_at=jwks["fetched_at"], keys=jwks["keys"])
+
+    def refresh(self, issuer: str, stale_fetched_at: Optional[float]) -> dict:
+        """fetch the keys, unless another thread or process replaced the stale ones in the meantime"""
+        with self.get_fetch_lock(issuer):
+            shared_jwks = cache.get(self.get_cache_key(issuer))
+            if shared_jwks is not None and shared_jwks["fetched_at"] != stale_fetched_at:
+                return self.load(issuer=issuer, fetched_at=shared_jwks["fetched_at"], keys=shared_jwks["keys"])
+            current = self._certs.get(issuer)
+            if current is not None and current[0] != stale_fetched_at:
+                return current[2]
+            return self.fetch(issuer)
+
+    def refresh_in_background(self, issuer: str, stale_fetched_at: float) -> None:
+        """one background refresh at a time, retried every `JWKS_MIN_REFETCH_INTERVAL` seconds if it fails"""
+        with self._lock:
+            now = time.time()
+            if now - self._background_refreshes.get(issuer, 0) < settings.JWKS_MIN_REFETCH_INTERVAL:
+                return
+            self._background_refreshes[issuer] = now
+
+        def refresh():
+            try:
+                self.refresh(issuer=issuer, stale_fetched_at=stale_fetched_at)
+            except Exception as e:
+                _logger.warning(f"Could not refresh the keys of OIDC issuer `{issuer}`: {e}")
+
+        threading.Thread(target=refresh, name=f"jwks-refresh-{issuer}", daemon=True).start()
+
+    def get_certs(self, issuer: str) -> dict:
+        now = time.time()
+        current = self._certs.get(issuer)
+        fetched_at: Optional[float] = current[0] if current is not None else None
+        if current is not None and now - current[1] <= self.JWKS_LOCAL_CHECK_INTERVAL:
+            certs = current[2]
+        else:
+            shared_jwks = cache.get(self.get_cache_key(issuer))
+            if shared_jwks is not None:
+                certs = self.load(issuer=issuer, fetched_at=shared_jwks["fetched_at"], keys=shared_jwks["keys"])
+                fetched_at = shared_jwks["fetched_at"]
+            elif current is not None and fetched_at is not None and now - fetched_at < settings.JWKS_CACHE_TIMEOUT:
+                # the shared keys are missing (no shared cache or evicted) but the local ones are still valid
+                certs = current[2]
+                self._certs[issuer] = (fetched_at, now, certs)
+            else:
+                return self.refresh(issuer=issuer, stale_fetched_at=fetched_at)
+        if fetched_at is not None and now - fetched_at > settings.JWKS_CACHE_TIMEOUT * self.JWKS_REFRESH_AHEAD_RATIO:
+            self.refresh_in_background(issuer=issuer, stale_fetched_at=fetched_at)
+        return certs
+
+    def get_certs_with_kid(self, issuer: str, kid: str) -> dict:
+        """the issuer's keys, re-fetched once if `kid` is unknown (the issuer may have rotated its keys)"""
+        certs = self.get_certs(issuer)
+        fetched_at = self._certs[issuer][0]
+        if kid not in certs and time.time() - fetched_at > settings.JWKS_MIN_REFETCH_INTERVAL:
+            with self._lock:
+                self.get_stats(issuer)["unknown_kid_refetches"] += 1
+            certs = self.refresh(issuer=issuer, stale_fetched_at=fetched_at)
+        return certs
+
+    def get_snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [
+                {"issuer": issuer, **self.get_stats(issuer), "keys": len(certs), "age": now - fetched_at}
+                for issuer, (fetched_at, _, certs) in self._certs.items()
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._certs.clear()
+            self._stats.clear()
+            self._background_refreshes.clear()
+
+
+jwks_store = JWKSStore()
+
+
+def get_issuer_certs(issuer: str, kid: Optional[str] = None) -> dict:
+    if kid is None:
+        return jwks_store.get_certs(issuer=issuer)
+    return jwks_store.get_certs_with_kid(issuer=issuer, kid=kid)
 
 
 class OIDCAuth(Auth):
@@ -156,7 +291,7 @@ class OIDCAuth(Auth):
         oidc_conf = self.get_oidc_config(redirect_uri=redirect_uri)
         data = {**oidc_conf.client_identity, "redirect_uri": oidc_conf.redirect_uri, "grant_type": oidc_conf.grant_type, "code": code}
         try:
-            response = requests.post(url=oidc_conf.token_url, data=data, timeout=HTTP_REQUEST_TIMEOUT)
+            response = oidc_http_client.post(url=oidc_conf.token_url, data=data)
             if response.status_code == status.HTTP_200_OK:
                 return OIDCAuthTokens(**response.json())
             return None
@@ -170,7 +305,7 @@ class OIDCAuth(Auth):
         oidc_conf = self.get_oidc_config(client_id=client_id)
         data = {**oidc_conf.client_identity, "grant_type": "refresh_token", "refresh_token": token}
         try:
-            response = requests.post(url=oidc_conf.token_url, data=data, timeout=HTTP_REQUEST_TIMEOUT)
+            response = oidc_http_client.post(url=oidc_conf.token_url, data=data)
             if response.status_code == status.HTTP_200_OK:
                 return OIDCAuthTokens(**response.json())
             raise InvalidToken("Token is invalid or expired")
@@ -183,9 +318,11 @@ class OIDCAuth(Auth):
         decoded_token = self.decode_token(token=token, verify_signature=False)
         issuer = decoded_token.get("iss")
         assert issuer in self.recognised_issuers, f"Unrecognised issuer: `{issuer}`"
-        certs = get_issuer_certs(issuer=issuer)
         kid = jwt.get_unverified_header(token)["kid"]
+        certs = get_issuer_certs(issuer=issuer, kid=kid)
         key = certs.get(kid)
+        if key is None:
+            raise InvalidToken(f"Unknown signing key `{kid}` for issuer `{issuer}`")
         decoded = self.decode_token(token=token, key=key, issuer=issuer, audience=self.audience)
         return decoded.get(self.USERNAME_LOOKUP)
 
@@ -216,11 +353,10 @@ class OIDCAuth(Auth):
         if not client_id or not isinstance(client_id, str):
             raise RequestException("Invalid token: missing azp")
         oidc_conf = self.get_oidc_config(client_id=client_id)
-        response = requests.post(
+        response = oidc_http_client.post(
             url=oidc_conf.logout_url,
             data={**oidc_conf.client_identity, "refresh_token": refresh_token},
             headers={"Authorization": f"Bearer {access_token}"},
-            timeout=HTTP_REQUEST_TIMEOUT,
         )
         if response.status_code != status.HTTP_204_NO_CONTENT:
             raise RequestException(f"Error during logout: {response.text}")
@@ -381,13 +517,63 @@ class AuthService:
             return
         authenticator = self._get_authenticator(auth_method)
         authenticator.logout(request.data, access_token or "")
+        if access_token:
+            cache.delete(self.get_verified_token_cache_key(token=access_token, auth_method=auth_method))
+
+    @staticmethod
+    def get_verified_token_cache_key(token: str, auth_method: str) -> str:
+        return f"auth.verified_token.{auth_method}.{hashlib.sha256(token.encode()).hexdigest()}"
+
+    @staticmethod
+    def get_request_memo() -> Optional[dict]:
+        request = context_request.get()
+        if request is None:
+            return None
+        if not hasattr(request, VERIFIED_TOKENS_MEMO_ATTRIBUTE):
+            setattr(request, VERIFIED_TOKENS_MEMO_ATTRIBUTE, {})
+        return getattr(request, VERIFIED_TOKENS_MEMO_ATTRIBUTE)
+
+    def get_verified_username(self, token: str, auth_method: str) -> Optional[str]:
+        """
+        Username of a token whose signature was verified.
+        The verification is done once per token: the result is kept for the current request, and shared with the
+        other requests (and processes) through the cache until the token expires, within `VERIFIED_TOKENS_CACHE_TIMEOUT`.
+        """
+        cache_key = self.get_verified_token_cache_key(token=token, auth_method=auth_method)
+        request_memo = self.get_request_memo()
+        if request_memo is not None and cache_key in request_memo:
+            return request_memo[cache_key]
+        username = cache.get(cache_key)
+        if username is None:
+            authenticator = self._get_authenticator(auth_method)
+            username = authenticator.authenticate(token=token)
+            expires_at = username is not None and authenticator.decode_token(token=token, verify_signature=False).get("exp")
+            timeout = expires_at and min(int(expires_at - time.time()), settings.VERIFIED_TOKENS_CACHE_TIMEOUT)
+            if timeout and timeout > 0:
+                cache.set(cache_key, username, timeout=timeout)
+        if request_memo is not None:
+            request_memo[cache_key] = username
+        return username
+
+    def get_request_username(self, request) -> Optional[str]:
+        """username of the request's token if it is valid, verified only once for the whole request"""
+        try:
+            token, auth_method = self.get_token_from_headers(request)
+            if token is not None and token in self.applicative_users:
+                return self.applicative_users[token]
+            if token is None or auth_method is None:
+                return None
+            return self.get_verified_username(token=token, auth_method=auth_method)
+        except Exception as e:
+            # only used to log the user id: the authentication answers the request on its own
+            _logger.info(f"Could not get username from request: {e!r}")
+            return None
 
     def authenticate_request(self, token: str, auth_method: str, headers: Dict[str, str]) -> Optional[Tuple[User, str]]:
         if token is None:
             return None
         try:
-            authenticator = self._get_authenticator(auth_method)
-            username = authenticator.authenticate(token=token)
+            username = self.get_verified_username(token=token, auth_method=auth_method)
             if username is None:
                 return None
             user = User.objects.get(username=username)
@@ -399,6 +585,13 @@ class AuthService:
             return None
 
     def authenticate_http_request(self, request) -> Optional[Tuple[User, str]]:
+        # DRF wraps the HttpRequest, keep the result on the latter so that every authentication of the request reuses it
+        http_request = getattr(request, "_request", request)
+        if not hasattr(http_request, AUTHENTICATION_MEMO_ATTRIBUTE):
+            setattr(http_request, AUTHENTICATION_MEMO_ATTRIBUTE, self._authenticate_http_request(request))
+        return getattr(http_request, AUTHENTICATION_MEMO_ATTRIBUTE)
+
+    def _authenticate_http_request(self, request) -> Optional[Tuple[User, str]]:
         token, auth_method = self.get_token_from_headers(request)
         if token is not None and token in self.applicative_users:
             applicative_user = User.objects.get(username=self.applicative_users[token])
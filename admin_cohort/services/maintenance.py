@@ -1,9 +1,10 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Union, Optional
+from typing import List, Union, Optional
 
 import dateutil.parser
 from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, transaction
 from django.utils import timezone
 from pydantic import BaseModel
 from rest_framework.permissions import SAFE_METHODS
@@ -11,9 +12,23 @@ from rest_framework.permissions import SAFE_METHODS
 from admin_cohort import settings
 from admin_cohort.models import MaintenancePhase
 from admin_cohort.services.ws_event_manager import WebSocketMessage, WebsocketManager, WebSocketMessageType
+from admin_cohort.tools.cache import GenerationalCache
 
 _logger = logging.getLogger("info")
 
+MAINTENANCE_STATE_KEY = "phases"
+MAINTENANCE_STATE_FIELDS = [field.attname for field in MaintenancePhase._meta.concrete_fields]
+
+# field values of the phases that are not over yet. Whether one of them is active is decided on each request, they
+# are reloaded when a phase is saved, and by the periodic maintenance task if they changed otherwise (when the shared
+# cache is disabled, on timeout only)
+maintenance_state_cache = GenerationalCache(
+    namespace="admin_cohort.maintenance",
+    generation_key="admin_cohort.maintenance.version",
+    maxsize=1,
+    timeout=settings.MAINTENANCE_PERIODIC_SCHEDULING_MINUTES * 60,
+)
+
 
 class WSMaintenanceInfo(BaseModel):
     id: int
@@ -80,14 +95,45 @@ class MaintenanceService:
         ref_now = now or timezone.now()
         return MaintenancePhase.objects.filter(start_datetime__lte=ref_now, end_datetime__gte=ref_now).order_by("-end_datetime").first()
 
+    @staticmethod
+    def load_maintenance_state() -> List[tuple]:
+        return list(
+            MaintenancePhase.objects.filter(end_datetime__gte=timezone.now()).order_by("start_datetime").values_list(*MAINTENANCE_STATE_FIELDS)
+        )
+
+    @staticmethod
+    def get_maintenance_state() -> List[MaintenancePhase]:
+        rows = maintenance_state_cache.get_or_set(MAINTENANCE_STATE_KEY, MaintenanceService.load_maintenance_state)
+        return [MaintenancePhase.from_db(DEFAULT_DB_ALIAS, MAINTENANCE_STATE_FIELDS, row) for row in rows]
+
+    @staticmethod
+    def refresh_maintenance_state() -> None:
+        maintenance_state_cache.bump_generation()
+
+    @staticmethod
+    def sync_maintenance_state() -> None:
+        """refresh the maintenance state if the phases changed without being saved (ex: bulk updates) or one ended"""
+        if MaintenanceService.load_maintenance_state() != maintenance_state_cache.get_or_set(
+            MAINTENANCE_STATE_KEY, MaintenanceService.load_maintenance_state
+        ):
+            maintenance_service.refresh_maintenance_state()
+
+    @staticmethod
+    def on_maintenance_phase_saved() -> None:
+        # refreshed right away for the current process, and again on commit in case other processes reloaded
+        # the state before the transaction ended
+        maintenance_service.refresh_maintenance_state()
+        transaction.on_commit(maintenance_service.refresh_maintenance_state)
+
     @staticmethod
     def get_next_maintenance() -> Union[MaintenancePhase, None]:
+        """the current maintenance, or else the next one. Served from the maintenance state without DB queries"""
         now = timezone.now()
-        current = MaintenanceService.get_current_maintenance(now)
+        phases = MaintenanceService.get_maintenance_state()
+        current = [phase for phase in phases if phase.start_datetime <= now <= phase.end_datetime]
         if current:
-            return current
-        next_maintenance = MaintenancePhase.objects.filter(start_datetime__gte=now).order_by("start_datetime").first()
-        return next_maintenance
+            return max(current, key=lambda phase: phase.end_datetime)
+        return next((phase for phase in phases if phase.start_datetime >= now), None)
 
     @staticmethod
     def is_allowed_request(request):
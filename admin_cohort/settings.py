@@ -200,6 +200,10 @@ ENABLE_OIDC_AUTH = env.bool("ENABLE_OIDC_AUTH", default=False)
 AUTHENTICATION_BACKENDS = ["admin_cohort.auth.auth_backends.JWTAuthBackend"]
 if ENABLE_OIDC_AUTH:
     AUTHENTICATION_BACKENDS.append("admin_cohort.auth.auth_backends.OIDCAuthBackend")
+# signing keys of the OIDC issuers are cached for this time (in seconds) and refreshed in the background before it ends
+JWKS_CACHE_TIMEOUT = env.int("JWKS_CACHE_TIMEOUT", default=60 * 60)
+# min time (in seconds) between two fetches of an issuer's keys triggered by tokens signed with an unknown key
+JWKS_MIN_REFETCH_INTERVAL = env.int("JWKS_MIN_REFETCH_INTERVAL", default=30)
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
@@ -243,6 +247,9 @@ USERNAME_REGEX = env.str("USERNAME_REGEX", default=r"[0-9]")
 EMAIL_REGEX = env.str("EMAIL_REGEX", default=r"^[\w.+-]+@[\w-]+\.[\w]+$")
 
 MAINTENANCE_PERIODIC_SCHEDULING_MINUTES = 1
+REFRESH_SCHEDULING_MINUTES = env.int("REFRESH_SCHEDULING_MINUTES", default=5)
+REFRESH_BATCH_SIZE = env.int("REFRESH_BATCH_SIZE", default=20)
+REFRESH_BATCH_INTERVAL = env.int("REFRESH_BATCH_INTERVAL", default=60)  # in seconds
 
 # Celery
 CELERY_BROKER_URL = env.str("CELERY_BROKER_URL", default="redis://localhost:6379")
@@ -251,12 +258,30 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_TASK_ALWAYS_EAGER = False
+# interactive, batch, exports and notifications tasks get dedicated queues (see `admin_cohort.celery_routing`)
+CELERY_ROUTING_ENABLED = env.bool("CELERY_ROUTING_ENABLED", default=True)
+CELERY_TASKS_QUEUES = env.json("CELERY_TASKS_QUEUES", default={})  # {task name: queue} overriding the default routing
+if CELERY_ROUTING_ENABLED:
+    CELERY_TASK_ROUTES = ("admin_cohort.celery_routing.route_task",)
+CELERY_TASK_DEFAULT_PRIORITY = 3
+CELERY_BROKER_TRANSPORT_OPTIONS = {"priority_steps": list(range(10)), "sep": ":", "queue_order_strategy": "priority"}
+# workers only reserve the task they run, so that queued high priority tasks are not held behind low priority ones
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+QUEUES_METRICS_SCHEDULING_MINUTES = env.int("QUEUES_METRICS_SCHEDULING_MINUTES", default=1)
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_BEAT_SCHEDULE = {
     "maintenance_notifier": {
         "task": "admin_cohort.tasks.maintenance_notifier_checker",
         "schedule": crontab(minute=f"*/{MAINTENANCE_PERIODIC_SCHEDULING_MINUTES}"),
-    }
+    },
+    "count_requests_refresher": {
+        "task": "cohort.tasks.refresh_due_count_requests",
+        "schedule": crontab(minute=f"*/{REFRESH_SCHEDULING_MINUTES}"),
+    },
+    "queues_metrics_reporter": {
+        "task": "admin_cohort.tasks.report_queues_metrics",
+        "schedule": crontab(minute=f"*/{QUEUES_METRICS_SCHEDULING_MINUTES}"),
+    },
 }
 
 SCHEDULED_TASKS = env("SCHEDULED_TASKS", default="")
@@ -295,6 +320,8 @@ OIDC_AUTH_MODE = "OIDC"
 AUTHORIZATION_METHOD_HEADER = "AUTHORIZATIONMETHOD"
 TRACE_ID_HEADER = "X-Trace-Id"
 IMPERSONATING_HEADER = "X-Impersonate"
+# verified tokens are cached until they expire, within this limit (in seconds)
+VERIFIED_TOKENS_CACHE_TIMEOUT = env.int("VERIFIED_TOKENS_CACHE_TIMEOUT", default=5 * 60)
 
 # CUSTOM EXCEPTION REPORTER
 DEFAULT_EXCEPTION_REPORTER_FILTER = "admin_cohort.tools.except_report_filter.CustomExceptionReporterFilter"
@@ -302,12 +329,15 @@ DEFAULT_EXCEPTION_REPORTER_FILTER = "admin_cohort.tools.except_report_filter.Cus
 # COHORTS +20k
 LAST_COUNT_VALIDITY = env.int("LAST_COUNT_VALIDITY", default=24)  # in hours
 COHORT_SIZE_LIMIT = env.int("COHORT_SIZE_LIMIT", default=20_000)
+COUNT_RESULT_REUSE_TIMEOUT = env.int("COUNT_RESULT_REUSE_TIMEOUT", default=10 * 60)  # in seconds, 0 to disable the reuse
 
 # InfluxDB
 INFLUXDB_TOKEN = env("INFLUXDB_DJANGO_TOKEN", default=NOTSET if INFLUXDB_ENABLED else "")
 INFLUXDB_URL = env("INFLUXDB_URL", default=NOTSET if INFLUXDB_ENABLED else "")
 INFLUXDB_ORG = env("INFLUXDB_ORG", default=NOTSET if INFLUXDB_ENABLED else "")
 INFLUXDB_BUCKET = env("INFLUXDB_BUCKET", default=NOTSET if INFLUXDB_ENABLED else "")
+INFLUXDB_FLUSH_INTERVAL = env.int("INFLUXDB_FLUSH_INTERVAL", default=10)  # in seconds
+INFLUXDB_BUFFER_SIZE = env.int("INFLUXDB_BUFFER_SIZE", default=10_000)
 
 # CACHE
 CACHES = {"default": {"BACKEND": "django_redis.cache.RedisCache", "LOCATION": CELERY_BROKER_URL}}
@@ -1,12 +1,20 @@
+import logging
+
 from celery import shared_task
 
 from admin_cohort import celery_app
+from admin_cohort.celery_routing import QUEUES
 from admin_cohort.services.maintenance import MaintenanceService, maintenance_phase_to_info, WSMaintenanceInfo
+from admin_cohort.tools.http_client import LATENCY_BUCKETS
+from admin_cohort.tools.task_metrics import get_queues_depths, task_metrics
+
+_logger = logging.getLogger("info")
 
 
 @celery_app.task()
 def maintenance_notifier_checker():
     # /!\ CAUTION: in case of renaming this function, update  the `CELERY_BEAT_SCHEDULE` in setting.py as well
+    MaintenanceService.sync_maintenance_state()
     event_to_start, event_to_end = MaintenanceService.get_maintenance_with_event()
     for event in event_to_start:
         maintenance_notifier.s(maintenance_phase_to_info(event).model_dump()).apply_async(eta=event.start_datetime)
@@ -21,3 +29,15 @@ def maintenance_notifier_checker():
 def maintenance_notifier(info: dict):
     maintenance_info = WSMaintenanceInfo.model_validate(info)
     MaintenanceService.send_maintenance_notification(maintenance_info)
+
+
+@celery_app.task()
+def report_queues_metrics():
+    """queues depths, and the wait times of the tasks run by all the workers since the last report"""
+    _logger.info(f"Celery queues depths: {get_queues_depths(app=celery_app, queues=QUEUES)}")
+    for metrics in task_metrics.get_snapshot(window=task_metrics.reset()):
+        buckets = " ".join(f"le_{bound}={count}" for bound, count in zip(LATENCY_BUCKETS + ("inf",), metrics["buckets"]))
+        _logger.info(
+            f"Celery tasks wait time: queue={metrics['queue']} task={metrics['task']} count={metrics['count']} "
+            f"avg={metrics['total_wait'] / metrics['count']:.2f}s {buckets}"
+        )
@@ -0,0 +1,74 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from admin_cohort.celery_routing import (
+    BATCH_QUEUE,
+    EXPORTS_QUEUE,
+    HIGH_PRIORITY,
+    INTERACTIVE_QUEUE,
+    LONG_PENDING_QUEUE,
+    get_long_pending_options,
+    route_task,
+)
+from admin_cohort.tasks import report_queues_metrics
+from admin_cohort.tests.tests_tools import LOCMEM_CACHES
+from admin_cohort.tools.task_metrics import get_wait_time, on_task_prerun, task_metrics
+
+
+class TestCeleryRouting(TestCase):
+    def test_tasks_are_routed_per_family(self):
+        self.assertEqual(route_task("cohort.tasks.count_cohort", (), {}, {}), {"queue": INTERACTIVE_QUEUE, "priority": HIGH_PRIORITY})
+        self.assertEqual(route_task("cohort.tasks.refresh_count_requests", (), {}, {})["queue"], BATCH_QUEUE)
+        self.assertIsNone(route_task("celery.chord_unlock", (), {}, {}))
+
+    @override_settings(CELERY_TASKS_QUEUES={"cohort.tasks.feasibility_study_count": BATCH_QUEUE, "app.tasks.other": "other"})
+    def test_queues_can_be_overridden(self):
+        self.assertEqual(route_task("cohort.tasks.feasibility_study_count", (), {}, {})["queue"], BATCH_QUEUE)
+        self.assertEqual(route_task("app.tasks.other", (), {}, {}), {"queue": "other"})
+
+    def test_long_pending_options(self):
+        self.assertEqual(get_long_pending_options()["queue"], LONG_PENDING_QUEUE)
+        with override_settings(CELERY_ROUTING_ENABLED=False):
+            self.assertEqual(get_long_pending_options(), {})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestTaskMetrics(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_wait_time_starts_at_eta(self):
+        published_at = datetime(2025, 1, 1, 10, tzinfo=timezone.utc).timestamp()
+        self.assertEqual(get_wait_time(published_at=published_at, eta=None, now=published_at + 2), 2)
+        self.assertEqual(get_wait_time(published_at=published_at, eta="2025-01-01T10:01:00+00:00", now=published_at + 65), 5)
+        self.assertIsNone(get_wait_time(published_at=None, eta=None, now=published_at))
+
+    def run_task(self, name: str, queue: str, wait: float):
+        task = MagicMock()
+        task.name = name
+        task.request.published_at = time.time() - wait
+        task.request.eta = None
+        task.request.delivery_info = {"routing_key": queue}
+        on_task_prerun(task=task)
+
+    def test_wait_time_is_recorded_per_queue(self):
+        self.run_task(name="cohort.tasks.count_cohort", queue=INTERACTIVE_QUEUE, wait=100)
+        [metrics] = task_metrics.get_snapshot()
+        self.assertEqual((metrics["queue"], metrics["task"], metrics["count"]), (INTERACTIVE_QUEUE, "cohort.tasks.count_cohort", 1))
+        self.assertEqual(metrics["buckets"][-1], 1)
+
+    @patch("admin_cohort.tasks.get_queues_depths", return_value={})
+    def test_report_reads_the_waits_of_all_workers_and_closes_the_window(self, mock_get_queues_depths):
+        # each prefork child records in its own process, the counters are shared through the cache
+        for wait in (0.5, 1.5):
+            self.run_task(name="exports.tasks.launch_export_task", queue=EXPORTS_QUEUE, wait=wait)
+        with self.assertLogs("info") as logs:
+            report_queues_metrics()
+        self.assertIn("queue=exports task=exports.tasks.launch_export_task count=2 avg=1.00s", "\n".join(logs.output))
+        self.assertEqual(task_metrics.get_snapshot(), [])
+        self.run_task(name="exports.tasks.launch_export_task", queue=EXPORTS_QUEUE, wait=1)
+        self.assertEqual(task_metrics.get_snapshot()[0]["count"], 1)
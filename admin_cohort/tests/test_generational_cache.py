@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from admin_cohort.tests.tests_tools import LOCMEM_CACHES
+from admin_cohort.tools.cache import GenerationalCache, construct_cache_key, get_generation_key, invalidate_cache
+from cohort.views import CohortResultViewSet
+from cohort.views.request import NestedRequestViewSet
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestGenerationalCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = GenerationalCache(namespace="tests", generation_key="tests.generation", maxsize=2)
+        self.other_worker_cache = GenerationalCache(namespace="tests", generation_key="tests.generation", maxsize=2)
+
+    def test_value_is_computed_once_and_shared(self):
+        compute = MagicMock(return_value=[1, 2])
+        self.assertEqual(self.cache.get_or_set("key", compute), [1, 2])
+        self.assertEqual(self.cache.get_or_set("key", compute), [1, 2])
+        self.assertEqual(self.other_worker_cache.get_or_set("key", compute), [1, 2])
+        compute.assert_called_once()
+        self.assertEqual(self.cache.get_stats()["local_hits"], 1)
+        self.assertEqual(self.cache.get_stats()["hit_rate"], 0.5)
+        self.assertEqual(self.other_worker_cache.get_stats()["shared_hits"], 1)
+
+    def test_bump_generation_invalidates_all_workers(self):
+        self.cache.get_or_set("key", lambda: "old")
+        self.assertEqual(self.other_worker_cache.get_or_set("key", lambda: "new"), "old")
+        self.cache.bump_generation()
+        self.other_worker_cache.generation_check_interval = 0
+        self.assertEqual(self.other_worker_cache.get_or_set("key", lambda: "new"), "new")
+        self.assertEqual(self.cache.get_or_set("key", lambda: "newer"), "new")
+
+    def test_local_cache_is_bounded(self):
+        for key in ("a", "b", "c"):
+            self.cache.get_or_set(key, lambda: key)
+        self.assertEqual(self.cache.get_stats()["size"], 2)
+        self.assertEqual(self.cache.get_stats()["evictions"], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestCacheInvalidation(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_cache_key(self, username: str, view_class=CohortResultViewSet) -> str:
+        request = MagicMock(query_params={})
+        request.user.username = username
+        request._request.path = "/cohort/cohorts/"
+        del request.session
+        return construct_cache_key(view_instance=view_class(), view_method=view_class.list, request=request)
+
+    def test_invalidation_changes_the_cache_keys(self):
+        key_1, key_2 = self.get_cache_key("user1"), self.get_cache_key("user2")
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_cache(model_name="CohortResult", user="user1")
+        self.assertNotEqual(self.get_cache_key("user1"), key_1)
+        self.assertEqual(self.get_cache_key("user2"), key_2)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_cache(model_name="CohortResult")
+        self.assertNotEqual(self.get_cache_key("user2"), key_2)
+
+    def test_nested_views_share_the_model_generation(self):
+        key = self.get_cache_key("user1", view_class=NestedRequestViewSet)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_cache(model_name="Request")
+        self.assertNotEqual(self.get_cache_key("user1", view_class=NestedRequestViewSet), key)
+
+    def test_invalidations_are_coalesced_until_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for _ in range(3):
+                invalidate_cache(model_name="CohortResult")
+                invalidate_cache(model_name="Folder", user="user1")
+            self.assertIsNone(cache.get(get_generation_key("CohortResult")))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(cache.get(get_generation_key("CohortResult")), 1)
+        self.assertEqual(cache.get(get_generation_key("Folder", "user1")), 1)
+
+    def test_invalidations_of_a_rolled_back_transaction_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    invalidate_cache(model_name="CohortResult")
+                    raise ValueError()
+            except ValueError:
+                pass
+            invalidate_cache(model_name="Folder")
+        self.assertEqual(cache.get(get_generation_key("Folder")), 1)
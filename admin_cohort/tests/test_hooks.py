@@ -9,7 +9,7 @@ from admin_cohort.tools.hooks import check_user_identity
 
 
 class HooksTests(TestCase):
-    @patch("admin_cohort.tools.hooks.requests.post")
+    @patch("admin_cohort.tools.hooks.identity_server_http_client.post")
     def test_check_user_identity_success(self, mock_post):
         test_username = "1234567"
         mock_response = Mock()
@@ -25,7 +25,7 @@ class HooksTests(TestCase):
         self.assertTrue("lastname" in res)
         self.assertTrue("email" in res)
 
-    @patch("admin_cohort.tools.hooks.requests.post")
+    @patch("admin_cohort.tools.hooks.identity_server_http_client.post")
     def test_check_user_identity_not_found(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = status.HTTP_404_NOT_FOUND
@@ -33,7 +33,7 @@ class HooksTests(TestCase):
         res = check_user_identity(username="1234567")
         self.assertIsNone(res)
 
-    @patch("admin_cohort.tools.hooks.requests.post")
+    @patch("admin_cohort.tools.hooks.identity_server_http_client.post")
     def test_check_user_identity_error(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -41,7 +41,7 @@ class HooksTests(TestCase):
         with self.assertRaises(APIException):
             _ = check_user_identity(username="1234567")
 
-    @patch("admin_cohort.tools.hooks.requests.post")
+    @patch("admin_cohort.tools.hooks.identity_server_http_client.post")
     def test_check_user_identity_json_error(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = status.HTTP_200_OK
@@ -50,7 +50,7 @@ class HooksTests(TestCase):
         with self.assertRaises(APIException):
             _ = check_user_identity(username="1234567")
 
-    @patch("admin_cohort.tools.hooks.requests.post")
+    @patch("admin_cohort.tools.hooks.identity_server_http_client.post")
     def test_check_user_identity_key_error(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = status.HTTP_200_OK
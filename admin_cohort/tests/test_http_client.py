@@ -0,0 +1,46 @@
+from unittest import mock
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+from requests import ConnectionError
+
+from admin_cohort.tools.http_client import HttpClient, get_endpoint, http_metrics
+
+
+class TestHttpClient(TestCase):
+    def setUp(self):
+        http_metrics.reset()
+        self.client = HttpClient(service="test")
+
+    def test_get_endpoint(self):
+        self.assertEqual(get_endpoint("https://qe.fr/jobs/1234?sync=false"), "qe.fr/jobs/{id}")
+        self.assertEqual(get_endpoint("https://fhir.fr/fhir/Patient/$query"), "fhir.fr/fhir/Patient/$query")
+        self.assertEqual(get_endpoint("https://api.fr/exports/8b6d2a3e-5f0c-4d1e-9a7b-1c2d3e4f5a6b/logs"), "api.fr/exports/{id}/logs")
+
+    def test_session_is_shared_and_rebuilt_after_fork(self):
+        session = self.client.session
+        self.assertIs(self.client.session, session)
+        with mock.patch("admin_cohort.tools.http_client.os.getpid", return_value=-1):
+            self.assertIsNot(self.client.session, session)
+
+    def test_only_idempotent_methods_are_retried_on_error_statuses(self):
+        retry = self.client.session.get_adapter("https://host.fr").max_retries
+        self.assertTrue(retry.is_retry("GET", status_code=503))
+        self.assertFalse(retry.is_retry("POST", status_code=503))
+        self.assertEqual((retry.connect, retry.read), (3, 1))
+
+    def test_cookies_are_not_stored(self):
+        self.assertTrue(self.client.session.cookies.get_policy().is_not_allowed("host.fr"))
+
+    def test_calls_are_recorded_in_metrics(self):
+        with mock.patch.object(self.client.session, "request", return_value=MagicMock(status_code=200)) as mock_request:
+            self.client.get("https://host.fr/jobs/12", params={"a": 1})
+            mock_request.assert_called_once_with(method="GET", url="https://host.fr/jobs/12", params={"a": 1}, timeout=self.client.timeout)
+        with mock.patch.object(self.client.session, "request", side_effect=ConnectionError()):
+            with self.assertRaises(ConnectionError):
+                self.client.get("https://host.fr/jobs/13")
+        [metrics] = http_metrics.get_snapshot()
+        self.assertEqual((metrics["service"], metrics["method"], metrics["endpoint"]), ("test", "GET", "host.fr/jobs/{id}"))
+        self.assertEqual(metrics["count"], 2)
+        self.assertEqual(metrics["errors"], 1)
+        self.assertEqual(sum(metrics["buckets"]), 2)
@@ -3,15 +3,21 @@ import jwt
 from unittest.mock import patch, MagicMock
 
 from django.conf import settings
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-from admin_cohort.exceptions import NoAuthenticationHookDefined
+from admin_cohort.exceptions import NoAuthenticationHookDefined, ServerError
 
 from accesses.models import Perimeter, Role, Access, Profile
+from admin_cohort.middleware.context_request_middleware import ContextRequestMiddleware
 from admin_cohort.models import User
-from admin_cohort.services.auth import JWTAuth
+from admin_cohort.services.auth import JWTAuth, auth_service
+from admin_cohort.tests.tests_tools import LOCMEM_CACHES
 
 
 class JWTAuthTestCase(TestCase):
@@ -38,7 +44,7 @@ class JWTAuthTestCase(TestCase):
         mock_check_against_server.assert_called()
 
     def test_jwt_authenticate_with_external_services(self):
-        with patch(target="requests.post", return_value=MagicMock(status_code=status.HTTP_200_OK)):
+        with patch(target="admin_cohort.tools.hooks.identity_server_http_client.post", return_value=MagicMock(status_code=status.HTTP_200_OK)):
             res = self.jwt_auth.check_credentials(username=self.test_user.username, password=self.test_password)
             self.assertTrue(res)
 
@@ -110,3 +116,47 @@ class JWTAuthTestCase(TestCase):
         mock_get_token.side_effect = Exception("Token error")
         with self.assertRaises(Exception):
             self.jwt_auth.generate_system_token()
+
+
+class VerifiedTokensTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user", email="test.user@backend.fr", firstname="Test", lastname="User")
+        self.token = str(TokenObtainPairSerializer.get_token(self.user).access_token)
+        self.factory = APIRequestFactory()
+
+    def new_request(self):
+        request = self.factory.get(
+            "/users/", HTTP_AUTHORIZATION=f"Bearer {self.token}", **{f"HTTP_{settings.AUTHORIZATION_METHOD_HEADER}": settings.JWT_AUTH_MODE}
+        )
+        request.user = AnonymousUser()
+        return request
+
+    def test_token_is_verified_once_per_request(self):
+        request = self.new_request()
+        middleware = ContextRequestMiddleware(get_response=lambda r: auth_service.authenticate_http_request(r))
+        with patch.object(JWTAuth, "authenticate", autospec=True, side_effect=JWTAuth.authenticate) as mock_authenticate:
+            user, token = middleware(request)
+            self.assertEqual(auth_service.authenticate_http_request(request), (user, token))
+        self.assertEqual(mock_authenticate.call_count, 1)
+        self.assertEqual((user, request.environ["user_id"]), (self.user, "test_user"))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_verified_token_is_shared_between_requests(self):
+        cache.clear()
+        with patch.object(JWTAuth, "authenticate", autospec=True, side_effect=JWTAuth.authenticate) as mock_authenticate:
+            for _ in range(3):
+                self.assertEqual(auth_service.authenticate_http_request(self.new_request())[0], self.user)
+        self.assertEqual(mock_authenticate.call_count, 1)
+
+    def test_invalid_token_is_anonymous(self):
+        self.token = "invalid_token"
+        request = self.new_request()
+        ContextRequestMiddleware(get_response=lambda r: None)(request)
+        self.assertEqual(request.environ["user_id"], "Anonymous")
+        self.assertIsNone(auth_service.authenticate_http_request(request))
+
+    def test_authentication_error_is_anonymous(self):
+        request = self.new_request()
+        with patch.object(JWTAuth, "authenticate", side_effect=ServerError("Auth server is down")):
+            ContextRequestMiddleware(get_response=lambda r: None)(request)
+        self.assertEqual(request.environ["user_id"], "Anonymous")
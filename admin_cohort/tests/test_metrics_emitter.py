@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from admin_cohort.middleware.influxdb_middleware import InfluxDBMiddleware
+from admin_cohort.models import User
+from admin_cohort.tools.cache import RESPONSE_CACHE_HIT_ATTRIBUTE
+from admin_cohort.tools.metrics_emitter import MetricsEmitter
+
+
+class TestMetricsEmitter(TestCase):
+    def setUp(self):
+        self.emitter = MetricsEmitter(max_buffer_size=2, flush_interval=60)
+        self.write_api = MagicMock()
+        get_write_api = patch.object(self.emitter, "get_write_api", return_value=self.write_api)
+        get_write_api.start()
+        self.addCleanup(get_write_api.stop)
+        self.addCleanup(self.emitter.shutdown)
+
+    def test_points_beyond_the_buffer_size_are_dropped(self):
+        for i in range(3):
+            self.emitter.emit({"measurement": "tests", "fields": {"i": i}})
+        self.assertEqual(self.emitter.get_stats(), {"emitted": 2, "dropped": 1, "written": 0, "write_errors": 0, "buffer_size": 2})
+
+    def test_flush_writes_buffered_and_collected_points_in_one_batch(self):
+        self.emitter.register_collector(lambda: [{"measurement": "collected", "fields": {"value": 1}}])
+        self.emitter.emit({"measurement": "tests", "fields": {"i": 0}})
+        self.emitter.flush()
+        self.write_api.write.assert_called_once()
+        points = self.write_api.write.call_args.kwargs["record"]
+        self.assertEqual([point["measurement"] for point in points], ["tests", "collected", "django_metrics_emitter"])
+        self.assertEqual(self.emitter.get_stats()["buffer_size"], 0)
+
+    def test_write_errors_are_counted(self):
+        self.write_api.write.side_effect = Exception("InfluxDB is down")
+        self.emitter.emit({"measurement": "tests", "fields": {"i": 0}})
+        self.emitter.flush()
+        self.assertEqual(self.emitter.get_stats()["write_errors"], 2)
+
+
+@override_settings(INFLUXDB_ENABLED=True)
+class TestInfluxDBMiddleware(TestCase):
+    def get_response(self, request):
+        request.resolver_match = MagicMock(view_name="users-list")
+        setattr(request, RESPONSE_CACHE_HIT_ATTRIBUTE, False)
+        User.objects.count()
+        return MagicMock(status_code=200)
+
+    @patch("admin_cohort.middleware.influxdb_middleware.metrics_emitter")
+    def test_request_metrics(self, mock_emitter):
+        InfluxDBMiddleware(get_response=self.get_response)(APIRequestFactory().get("/users/"))
+        [point] = mock_emitter.emit.call_args.args
+        self.assertEqual(point["tags"], {"method": "GET", "view": "users-list", "status": 200})
+        self.assertEqual((point["fields"]["db_queries"], point["fields"]["cache_hit"]), (1, False))
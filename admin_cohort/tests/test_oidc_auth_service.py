@@ -1,8 +1,15 @@
+import json
+
 import jwt
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
-from admin_cohort.services.auth import OIDCAuth, OIDCAuthConfig, get_issuer_certs, build_oidc_configs
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from jwt.algorithms import RSAAlgorithm
+from admin_cohort.services.auth import OIDCAuth, OIDCAuthConfig, JWKSStore, get_issuer_certs, build_oidc_configs, jwks_store
+from admin_cohort.tests.tests_tools import LOCMEM_CACHES
 from requests.exceptions import RequestException
+from rest_framework_simplejwt.exceptions import InvalidToken
 
 
 class OIDCAuthTestCase(TestCase):
@@ -42,6 +49,14 @@ class OIDCAuthTestCase(TestCase):
                     username = self.oidc_auth.authenticate(token)
                     self.assertEqual(username, "test_user")
 
+    def test_oidc_authenticate_unknown_kid(self):
+        token = jwt.encode({"iss": "https://example.com"}, "secret", algorithm="HS256")
+        with patch(target="admin_cohort.services.auth.get_issuer_certs", return_value={"test_kid": "public_key"}):
+            with patch.object(target=OIDCAuth, attribute="decode_token", return_value={"iss": self.oidc_config.issuer}):
+                with patch(target="admin_cohort.services.auth.jwt.get_unverified_header", return_value={"kid": "unknown_kid"}):
+                    with self.assertRaises(InvalidToken):
+                        self.oidc_auth.authenticate(token)
+
     def test_build_oidc_configs(self):
         with patch(
             target="admin_cohort.services.auth.env",
@@ -52,31 +67,33 @@ class OIDCAuthTestCase(TestCase):
             self.assertEqual(configs[0].issuer, "https://example.com")
 
     def test_get_issuer_certs(self):
+        jwks_store.clear()
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"keys": [{"kid": "test_kid", "kty": "RSA", "n": "nnnn", "e": "eee"}]}
 
-        with patch(target="requests.get", return_value=mock_response):
+        with patch(target="admin_cohort.services.auth.oidc_http_client.get", return_value=mock_response):
             certs = get_issuer_certs("https://example.com")
             self.assertIn("test_kid", certs)
 
     def test_oidc_auth_logout(self):
         with patch.object(target=OIDCAuth, attribute="decode_token", return_value={"azp": self.oidc_config.client_id}):
             with patch.object(target=OIDCAuth, attribute="get_oidc_config", return_value=self.oidc_config):
-                with patch(target="requests.post", return_value=MagicMock(status_code=204)) as mock_post:
+                with patch(target="admin_cohort.services.auth.oidc_http_client.post", return_value=MagicMock(status_code=204)) as mock_post:
                     self.oidc_auth.logout({"refresh_token": "test_refresh"}, "access_token")
                     mock_post.assert_called()
 
     def test_oidc_auth_logout_fail(self):
         with patch.object(target=OIDCAuth, attribute="decode_token", return_value={"azp": self.oidc_config.client_id}):
             with patch.object(target=OIDCAuth, attribute="get_oidc_config", return_value=self.oidc_config):
-                with patch(target="requests.post", return_value=MagicMock(status_code=400, text="Error")):
+                with patch(target="admin_cohort.services.auth.oidc_http_client.post", return_value=MagicMock(status_code=400, text="Error")):
                     with self.assertRaises(RequestException):
                         self.oidc_auth.logout({"refresh_token": "test_refresh"}, "access_token")
 
     def test_get_tokens_success(self):
         with patch(
-            "requests.post", return_value=MagicMock(status_code=200, json=lambda: {"access_token": "test_access", "refresh_token": "test_refresh"})
+            "admin_cohort.services.auth.oidc_http_client.post",
+            return_value=MagicMock(status_code=200, json=lambda: {"access_token": "test_access", "refresh_token": "test_refresh"}),
         ) as mock_post:
             tokens = self.oidc_auth.get_tokens(code="test_code", redirect_uri="https://app.com/callback")
             self.assertIsNotNone(tokens)
@@ -85,14 +102,15 @@ class OIDCAuthTestCase(TestCase):
             mock_post.assert_called()
 
     def test_get_tokens_failure(self):
-        with patch("requests.post", return_value=MagicMock(status_code=400, text="Error")):
+        with patch("admin_cohort.services.auth.oidc_http_client.post", return_value=MagicMock(status_code=400, text="Error")):
             tokens = self.oidc_auth.get_tokens(code="test_code", redirect_uri="https://app.com/callback")
             self.assertIsNone(tokens)
 
     def test_refresh_token_success(self):
         with patch.object(OIDCAuth, "decode_token", return_value={"azp": "client123"}):
             with patch(
-                "requests.post", return_value=MagicMock(status_code=200, json=lambda: {"access_token": "new_access", "refresh_token": "new_refresh"})
+                "admin_cohort.services.auth.oidc_http_client.post",
+                return_value=MagicMock(status_code=200, json=lambda: {"access_token": "new_access", "refresh_token": "new_refresh"}),
             ) as mock_post:
                 tokens = self.oidc_auth.refresh_token(token="old_refresh_token")
                 self.assertIsNotNone(tokens)
@@ -102,7 +120,7 @@ class OIDCAuthTestCase(TestCase):
 
     def test_refresh_token_failure(self):
         with patch.object(OIDCAuth, "decode_token", return_value={"azp": "client123"}):
-            with patch("requests.post", return_value=MagicMock(status_code=400, text="Error")):
+            with patch("admin_cohort.services.auth.oidc_http_client.post", return_value=MagicMock(status_code=400, text="Error")):
                 with self.assertRaises(Exception):
                     self.oidc_auth.refresh_token(token="old_refresh_token")
 
@@ -110,3 +128,62 @@ class OIDCAuthTestCase(TestCase):
         with patch.object(OIDCAuth, "decode_token", return_value={"preferred_username": "test_user"}):
             username = self.oidc_auth.retrieve_username(token="some_token")
             self.assertEqual(username, "test_user")
+
+
+def new_jwk(kid: str) -> dict:
+    public_key = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+    return {**json.loads(RSAAlgorithm.to_jwk(public_key)), "kid": kid}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, JWKS_CACHE_TIMEOUT=3600, JWKS_MIN_REFETCH_INTERVAL=30)
+class JWKSStoreTestCase(TestCase):
+    issuer = "https://example.com"
+
+    def setUp(self):
+        cache.clear()
+        self.store = JWKSStore()
+        self.jwks = {"keys": [new_jwk("kid_1")]}
+
+    def mock_get(self):
+        return patch(
+            target="admin_cohort.services.auth.oidc_http_client.get",
+            side_effect=lambda url: MagicMock(status_code=200, json=MagicMock(return_value=self.jwks)),
+        )
+
+    def age_keys(self, seconds: int) -> None:
+        jwks = cache.get(self.store.get_cache_key(self.issuer))
+        cache.set(self.store.get_cache_key(self.issuer), {**jwks, "fetched_at": jwks["fetched_at"] - seconds})
+        fetched_at, checked_at, certs = self.store._certs[self.issuer]
+        self.store._certs[self.issuer] = (fetched_at - seconds, checked_at, certs)
+
+    def test_keys_are_shared_between_processes(self):
+        with self.mock_get() as mock_get:
+            self.assertIn("kid_1", self.store.get_certs(self.issuer))
+            self.assertIn("kid_1", JWKSStore().get_certs(self.issuer))
+            self.assertIn("kid_1", self.store.get_certs(self.issuer))
+        self.assertEqual(mock_get.call_count, 1)
+        [snapshot] = self.store.get_snapshot()
+        self.assertEqual((snapshot["issuer"], snapshot["fetches"], snapshot["keys"]), (self.issuer, 1, 1))
+
+    def test_unknown_kid_is_refetched_once(self):
+        with self.mock_get() as mock_get:
+            self.store.get_certs(self.issuer)
+            self.jwks = {"keys": [new_jwk("kid_2")]}
+            self.assertNotIn("kid_2", self.store.get_certs_with_kid(self.issuer, kid="kid_2"))
+            self.age_keys(60)
+            self.assertIn("kid_2", self.store.get_certs_with_kid(self.issuer, kid="kid_2"))
+            self.assertNotIn("kid_3", self.store.get_certs_with_kid(self.issuer, kid="kid_3"))
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(self.store.get_snapshot()[0]["unknown_kid_refetches"], 1)
+
+    def test_keys_are_refreshed_in_background_before_expiry(self):
+        with self.mock_get() as mock_get:
+            certs = self.store.get_certs(self.issuer)
+            self.age_keys(3000)
+            with patch(target="admin_cohort.services.auth.threading.Thread") as mock_thread:
+                self.assertIs(self.store.get_certs(self.issuer), certs)
+                self.store.get_certs(self.issuer)
+            mock_thread.assert_called_once()
+            mock_thread.call_args.kwargs["target"]()
+            self.assertEqual(mock_get.call_count, 2)
+            self.assertIsNot(self.store.get_certs(self.issuer), certs)
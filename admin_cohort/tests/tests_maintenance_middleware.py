@@ -1,12 +1,13 @@
 import json
 import os
 from datetime import datetime as dt, timedelta, UTC
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from rest_framework import status
 from rest_framework.test import APIRequestFactory
 
 from admin_cohort.middleware.maintenance_middleware import MaintenanceModeMiddleware
+from admin_cohort.services.maintenance import maintenance_service
 from .tests_tools import TestCaseWithDBs
 from ..models import MaintenancePhase
 
@@ -31,6 +32,7 @@ class MaintenanceModeMiddlewareTests(TestCaseWithDBs):
         self.auth_url = "/auth/"
 
         enable_maintenance(5)
+        self.addCleanup(maintenance_service.refresh_maintenance_state)
 
     def test_safe_method_request(self):
         request = self.factory.get(path=self.safe_method_url)
@@ -62,3 +64,27 @@ class MaintenanceModeMiddlewareTests(TestCaseWithDBs):
         request = self.factory.post(path=self.auth_url, data={})
         response = self.middleware(request)
         self.assertNotEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_maintenance_state_is_cached(self):
+        request = self.factory.post(self.non_safe_method_url, data={})
+        self.middleware(request)
+        with self.assertNumQueries(0):
+            response = self.middleware(request)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        maintenance = MaintenancePhase.objects.get()
+        maintenance.end_datetime = dt.now(UTC) - timedelta(minutes=1)
+        maintenance.save()
+        self.middleware(request)
+        self.middleware.get_response.assert_called_once()
+
+    def test_maintenance_state_is_synced_only_if_changed(self):
+        request = self.factory.post(self.non_safe_method_url, data={})
+        self.middleware(request)
+        with patch.object(maintenance_service, "refresh_maintenance_state") as mock_refresh:
+            maintenance_service.sync_maintenance_state()
+            mock_refresh.assert_not_called()
+        # update() does not call save()
+        MaintenancePhase.objects.update(end_datetime=dt.now(UTC) - timedelta(minutes=1))
+        maintenance_service.sync_maintenance_state()
+        self.middleware(request)
+        self.middleware.get_response.assert_called_once()
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import fnmatch
 import json
 import random
 import string
 from typing import Tuple, List, Any
 
 from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
 from django.db.models import Manager, Field, Model
 from django.db.utils import DEFAULT_DB_ALIAS
 from django.test import TestCase
@@ -19,6 +21,21 @@ from admin_cohort.exceptions import MissingDataError
 from cohort.models import CohortBaseModel
 
 
+class LocMemCacheWithPatterns(LocMemCache):
+    """in-memory cache exposing the `delete_pattern` interface of django_redis, to test cached code paths"""
+
+    def delete_pattern(self, pattern, version=None):
+        _ = version
+        with self._lock:
+            keys = [k for k in self._cache if fnmatch.fnmatchcase(k.split(":", 2)[-1], pattern)]
+            for key in keys:
+                self._delete(key)
+        return len(keys)
+
+
+LOCMEM_CACHES = {"default": {"BACKEND": "admin_cohort.tests.tests_tools.LocMemCacheWithPatterns"}}
+
+
 class ObjectView(object):
     def __init__(self, d):
         self.__dict__ = d
@@ -8,6 +8,7 @@ from rest_framework import status
 
 from accesses.models import Access, Role
 from admin_cohort.models import MaintenancePhase
+from admin_cohort.services.maintenance import maintenance_service
 from admin_cohort.tests.tests_tools import (
     new_user_and_profile,
     CaseRetrieveFilter,
@@ -142,6 +143,7 @@ class MaintenanceGetNextTests(MaintenanceGetTests):
 
     def setUp(self):
         super(MaintenanceGetNextTests, self).setUp()
+        self.addCleanup(maintenance_service.refresh_maintenance_state)
         self.base_case = RetrieveCase(
             user=self.user_with_no_right,
             status=status.HTTP_200_OK,
@@ -150,12 +152,15 @@ class MaintenanceGetNextTests(MaintenanceGetTests):
 
     @staticmethod
     def prepare_maintenances(nb_days: List[Tuple[int, int]]) -> List[MaintenancePhase]:
-        return MaintenancePhase.objects.bulk_create(
+        maintenances = MaintenancePhase.objects.bulk_create(
             [
                 MaintenancePhase(start_datetime=timezone.now() + timedelta(days=m), end_datetime=timezone.now() + timedelta(days=n))
                 for (m, n) in nb_days
             ]
         )
+        # bulk_create() does not call save(), the state would only be refreshed by the periodic maintenance task
+        maintenance_service.refresh_maintenance_state()
+        return maintenances
 
     def test_get_earlier_next_1(self):
         # if there are no phase with start_datetime < now < end_datetime,
@@ -1,29 +1,58 @@
 import logging
-from typing import Any, cast
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, cast
 
 from django.core.cache import cache
 from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction
 from rest_framework_extensions.cache.decorators import CacheResponse
 
 
 _logger = logging.getLogger("info")
 
 
+RESPONSE_CACHE_HIT_ATTRIBUTE = "_response_cache_hit"
+
+
 class CustomCacheResponse(CacheResponse):
     def process_cache_response(self, view_instance, view_method, request, args, kwargs):
-        response = super(CustomCacheResponse, self).process_cache_response(view_instance, view_method, request, args, kwargs)
+        computed = []
+
+        def compute_response(*view_args, **view_kwargs):
+            computed.append(True)
+            return view_method(*view_args, **view_kwargs)
+
+        response = super(CustomCacheResponse, self).process_cache_response(view_instance, compute_response, request, args, kwargs)
+        # kept on the HttpRequest for the metrics of the InfluxDB middleware
+        setattr(getattr(request, "_request", request), RESPONSE_CACHE_HIT_ATTRIBUTE, not computed)
         return response
 
 
 cache_response = CustomCacheResponse
 
 
+CACHE_GENERATION_KEY_PREFIX = "cache_generation"
+ALL_USERS = "*"
+VIEW_MODEL_NAME_PATTERN = re.compile(r"^Nested|ViewSet$")
+
+
+def get_generation_key(model_name: str, user: str = ALL_USERS) -> str:
+    if user == ALL_USERS:
+        return f"{CACHE_GENERATION_KEY_PREFIX}.{model_name}"
+    return f"{CACHE_GENERATION_KEY_PREFIX}.{model_name}.{user}"
+
+
 def construct_cache_key(view_instance=None, view_method=None, request=None, args=None, kwargs=None):
     """
     Constructs a unique cache key based on the user, view, and request path.
     The `args` and `kwargs` parameters are required by the `key_constructor`
     interface of the rest_framework_extensions library but are intentionally
     not used in this implementation to ensure consistent caching for the view.
+    The key ends with the generations of the view's model, for all users and for the user: bumping either of them
+    (see `invalidate_cache`) makes the cached responses unreachable, they then expire.
     """
     _ = args, kwargs
     session_id = None
@@ -39,13 +68,45 @@ def construct_cache_key(view_instance=None, view_method=None, request=None, args
 
     if request.query_params:
         key = f"{key}." + ".".join(map(str, (f"{k}={v}" for k, v in request.query_params.items())))
-    return key
 
+    model_name = VIEW_MODEL_NAME_PATTERN.sub("", view_class)
+    generation_keys = (get_generation_key(model_name), get_generation_key(model_name, username))
+    generations = cache.get_many(generation_keys)
+    return f"{key}.g{'.'.join(str(generations.get(k, 0)) for k in generation_keys)}"
+
+
+def bump_cache_generations(invalidations: Iterable[Tuple[str, str]]) -> None:
+    for model_name, user in invalidations:
+        generation_key = get_generation_key(model_name, user)
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            cache.set(generation_key, 1, timeout=None)
 
-def invalidate_cache(model_name: str, user: str = "*"):
-    view_name = f"*{model_name}ViewSet"
-    key = f"*{user}.{view_name}.*"
-    cast(Any, cache).delete_pattern(key)
+
+def flush_cache_invalidations() -> None:
+    connection = transaction.get_connection()
+    invalidations: Optional[Set[Tuple[str, str]]] = getattr(connection, "_cache_invalidations", None)
+    connection._cache_invalidations = None
+    bump_cache_generations(invalidations or ())
+
+
+def invalidate_cache(model_name: str, user: str = ALL_USERS):
+    """
+    Invalidate the cached responses of the model's views, for all users or for the given one, by bumping a generation
+    counter (a single INCR). Within a transaction, the invalidations are deduplicated and applied once it is committed.
+    """
+    user = user or ALL_USERS
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        bump_cache_generations([(model_name, user)])
+        return
+    pending = getattr(connection, "_cache_invalidations", None)
+    # the flush may have been dropped along with a rolled back transaction
+    if pending is None or not any(func is flush_cache_invalidations for _, func, _ in connection.run_on_commit):
+        pending = connection._cache_invalidations = set()
+        transaction.on_commit(flush_cache_invalidations)
+    pending.add((model_name, user))
 
 
 class CustomDummyCache(DummyCache):
@@ -57,3 +118,79 @@ class CustomDummyCache(DummyCache):
         """
         _ = key, version
         return False
+
+
+class GenerationalCache:
+    """
+    Cache for lookups derived from slowly changing data (ex: the perimeters tree).
+    Values are kept in a bounded, TTL-limited in-process LRU in front of the shared cache backend.
+    Shared keys embed a generation counter stored in the cache backend: `bump_generation()` invalidates the entries
+    of all workers at once. The local LRU still expires entries after `timeout` if the shared cache is disabled.
+    Values must be picklable, prefer storing ids over querysets or model instances.
+    """
+
+    _MISSING = object()
+    instances: List["GenerationalCache"] = []
+
+    def __init__(self, namespace: str, generation_key: str, maxsize: int = 1024, timeout: int = 10 * 60, generation_check_interval: int = 5):
+        self.namespace = namespace
+        self.generation_key = generation_key
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.generation_check_interval = generation_check_interval
+        self._local: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._generation_checked_at: float = 0
+        self._stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0}
+        GenerationalCache.instances.append(self)
+
+    def get_generation(self) -> int:
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_checked_at > self.generation_check_interval:
+            generation = cache.get(self.generation_key, 0)
+            if generation != self._generation:
+                with self._lock:
+                    self._local.clear()
+            self._generation, self._generation_checked_at = generation, now
+        return cast(int, self._generation)
+
+    def get_or_set(self, key: str, compute: Callable[[], Any]) -> Any:
+        generation = self.get_generation()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(key)
+                self._stats["local_hits"] += 1
+                return entry[1]
+        shared_key = f"{self.namespace}.{generation}.{key}"
+        value = cache.get(shared_key, self._MISSING)
+        if value is self._MISSING:
+            self._stats["misses"] += 1
+            value = compute()
+            cache.set(shared_key, value, timeout=self.timeout)
+        else:
+            self._stats["shared_hits"] += 1
+        with self._lock:
+            self._local[key] = (now + self.timeout, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def bump_generation(self) -> None:
+        _logger.info(f"Cache `{self.namespace}` invalidated, stats: {self.get_stats()}")
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.set(self.generation_key, 1, timeout=None)
+        with self._lock:
+            self._local.clear()
+            self._generation = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["local_hits"] + self._stats["shared_hits"] + self._stats["misses"]
+        hit_rate = lookups and round((lookups - self._stats["misses"]) / lookups, 3) or 0
+        return {**self._stats, "hit_rate": hit_rate, "size": len(self._local), "generation": self._generation}
@@ -3,11 +3,10 @@ import os
 from json import JSONDecodeError
 from typing import Optional
 
-import requests
 from rest_framework import status
 from rest_framework.exceptions import APIException
 
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
+from admin_cohort.tools.http_client import HttpClient
 
 env = os.environ
 
@@ -18,14 +17,13 @@ IDENTITY_SERVER_HEADERS = {"Key-auth": env.get("IDENTITY_SERVER_AUTH_TOKEN", "")
 
 _logger = logging.getLogger("django.request")
 
+identity_server_http_client = HttpClient(service="identity_server")
+
 
 def authenticate_user(username: str, password: str) -> Optional[bool]:
     try:
-        response = requests.post(
-            url=IDENTITY_SERVER_AUTH_ENDPOINT,
-            data={"username": username, "password": password},
-            headers=IDENTITY_SERVER_HEADERS,
-            timeout=HTTP_REQUEST_TIMEOUT,
+        response = identity_server_http_client.post(
+            url=IDENTITY_SERVER_AUTH_ENDPOINT, data={"username": username, "password": password}, headers=IDENTITY_SERVER_HEADERS
         )
         return response.status_code == status.HTTP_200_OK
     except Exception as e:
@@ -34,12 +32,7 @@ def authenticate_user(username: str, password: str) -> Optional[bool]:
 
 
 def check_user_identity(username: str) -> Optional[dict]:
-    response = requests.post(
-        url=IDENTITY_SERVER_USER_INFO_ENDPOINT,
-        data={"username": username},
-        headers=IDENTITY_SERVER_HEADERS,
-        timeout=HTTP_REQUEST_TIMEOUT,
-    )
+    response = identity_server_http_client.post(url=IDENTITY_SERVER_USER_INFO_ENDPOINT, data={"username": username}, headers=IDENTITY_SERVER_HEADERS)
     if response.status_code == status.HTTP_200_OK:
         try:
             user_attrs = response.json().get("data", {}).get("attributes", {})
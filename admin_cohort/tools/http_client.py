@@ -0,0 +1,141 @@
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
+
+_logger = logging.getLogger("info")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ID_IN_PATH_PATTERN = re.compile(r"/(?:\d+|[0-9a-fA-F-]{32,36})(?=/|$)")
+
+
+def get_endpoint(url: str) -> str:
+    """`host/path` of the url, ids in the path being replaced to group the calls to the same endpoint"""
+    parsed = urlparse(url)
+    return f"{parsed.netloc}{ID_IN_PATH_PATTERN.sub('/{id}', parsed.path)}"
+
+
+class HttpMetrics:
+    """In-process latency histograms and error counts of the outbound HTTP calls, per service and endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def record(self, service: str, method: str, endpoint: str, duration: float, failed: bool) -> None:
+        with self._lock:
+            metrics = self._metrics.setdefault(
+                (service, method, endpoint), {"count": 0, "errors": 0, "total_duration": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            )
+            metrics["count"] += 1
+            metrics["errors"] += failed
+            metrics["total_duration"] += duration
+            metrics["buckets"][bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def get_snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"service": service, "method": method, "endpoint": endpoint, **metrics, "buckets": list(metrics["buckets"])}
+                for (service, method, endpoint), metrics in self._metrics.items()
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+
+http_metrics = HttpMetrics()
+
+
+class HttpClient:
+    """
+    Outbound HTTP client of a third-party service, to be instantiated once per service at module level.
+    Calls go through a keep-alive session holding a connection pool per host. The session is created lazily in each
+    process (web and Celery workers fork) and shared by its threads. Cookies are never stored, as the session is
+    shared between users.
+    Connection errors are retried with backoff for all methods (the request was not sent). Failed responses
+    (`retry_statuses`) are retried only for idempotent methods, as are read errors (a dropped keep-alive connection),
+    but once.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        retry_statuses: Tuple[int, ...] = (502, 503, 504),
+        pool_maxsize: int = 10,
+        timeout: float = HTTP_REQUEST_TIMEOUT,
+    ):
+        self.service = service
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = retry_statuses
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=1,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.retry_statuses,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=self.pool_maxsize)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session, self._session_pid = self.build_session(), pid
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = get_endpoint(url)
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method=method, url=url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            duration = time.perf_counter() - start
+            http_metrics.record(service=self.service, method=method, endpoint=endpoint, duration=duration, failed=failed)
+            if failed:
+                _logger.warning(f"[{self.service}] {method} {endpoint} failed after {duration * 1000:.0f}ms")
+
+    def get(self, url: str, **kwargs) -> Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> Response:
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> Response:
+        return self.request("DELETE", url, **kwargs)
@@ -0,0 +1,122 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from django.conf import settings
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS, PointSettings, WriteApi
+
+_logger = logging.getLogger("info")
+
+Point = Dict[str, Any]
+
+
+class MetricsEmitter:
+    """
+    Process-level, non-blocking emitter of InfluxDB points.
+    Points are appended to a bounded in-memory buffer, and dropped (and counted) when it is full. A background thread
+    writes them in batches every `flush_interval` seconds, along with the points of the registered collectors
+    (aggregated metrics of the process: outbound HTTP calls, caches...).
+    The thread and the InfluxDB client are created lazily in each process (web workers fork), and the buffer is
+    flushed when the process exits.
+    """
+
+    def __init__(self, max_buffer_size: int, flush_interval: float):
+        self.max_buffer_size = max_buffer_size
+        self.flush_interval = flush_interval
+        self._buffer: Deque[Point] = deque()
+        self._collectors: List[Callable[[], List[Point]]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._client: Optional[InfluxDBClient] = None
+        self._write_api: Optional[WriteApi] = None
+        self._stats = {"emitted": 0, "dropped": 0, "written": 0, "write_errors": 0}
+
+    def register_collector(self, collector: Callable[[], List[Point]]) -> None:
+        self._collectors.append(collector)
+
+    def ensure_started(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # the buffer, client and thread of the parent process are not usable after a fork
+            self._buffer.clear()
+            self._client, self._write_api = None, None
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self.run, name="metrics-emitter", daemon=True)
+            self._thread.start()
+            self._pid = pid
+        atexit.register(self.shutdown)
+
+    def emit(self, point: Point) -> None:
+        self.ensure_started()
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer_size:
+                self._stats["dropped"] += 1
+                return
+            self._buffer.append(point)
+            self._stats["emitted"] += 1
+
+    def run(self) -> None:
+        stop = self._stop
+        while not stop.wait(self.flush_interval):
+            self.flush()
+
+    def get_write_api(self) -> WriteApi:
+        if self._write_api is None:
+            self._client = InfluxDBClient(url=settings.INFLUXDB_URL, token=settings.INFLUXDB_TOKEN, org=settings.INFLUXDB_ORG)
+            env = not settings.DEBUG and "prod" or "dev_qua"
+            self._write_api = self._client.write_api(write_options=SYNCHRONOUS, point_settings=PointSettings(env=env))
+        return self._write_api
+
+    def collect(self) -> List[Point]:
+        now = time.time_ns()
+        points: List[Point] = []
+        for collector in self._collectors:
+            try:
+                points.extend({"time": now, **point} for point in collector())
+            except Exception as e:
+                _logger.warning(f"Metrics collector `{collector.__name__}` failed: {e}")
+        points.append({"measurement": "django_metrics_emitter", "tags": {}, "fields": self.get_stats(), "time": now})
+        return points
+
+    def flush(self) -> None:
+        with self._lock:
+            points, self._buffer = list(self._buffer), deque()
+        points.extend(self.collect())
+        try:
+            self.get_write_api().write(bucket=settings.INFLUXDB_BUCKET, org=settings.INFLUXDB_ORG, record=points)
+            written, failed = len(points), 0
+        except Exception as e:
+            _logger.warning(f"Could not write {len(points)} metrics points to InfluxDB: {e}")
+            written, failed = 0, len(points)
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["write_errors"] += failed
+
+    def shutdown(self) -> None:
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval)
+        self.flush()
+        if self._client is not None:
+            self._client.close()
+        self._client, self._write_api, self._pid = None, None, None
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "buffer_size": len(self._buffer)}
+
+
+metrics_emitter = MetricsEmitter(max_buffer_size=settings.INFLUXDB_BUFFER_SIZE, flush_interval=settings.INFLUXDB_FLUSH_INTERVAL)
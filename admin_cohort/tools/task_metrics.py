@@ -0,0 +1,110 @@
+import bisect
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+
+from admin_cohort.tools.http_client import LATENCY_BUCKETS
+
+_logger = logging.getLogger("info")
+
+PUBLISHED_AT_HEADER = "published_at"
+
+
+class TaskMetrics:
+    """
+    Histograms of the time Celery tasks wait in their queue before being run, per queue and task.
+    The counters live in the cache backend, shared by all the workers and their prefork children. They are kept per
+    reporting window: `reset()` closes the current window, and the following waits are counted in a new one.
+    """
+
+    KEY_PREFIX = "celery.task_wait"
+    WINDOW_TIMEOUT = 24 * 60 * 60
+
+    def get_key(self, *parts) -> str:
+        return ".".join((self.KEY_PREFIX, *map(str, parts)))
+
+    def incr(self, key: str, delta: int = 1, timeout: Optional[int] = WINDOW_TIMEOUT) -> int:
+        cache.add(key, 0, timeout=timeout)
+        return cache.incr(key, delta)
+
+    def get_window(self) -> int:
+        return cache.get(self.get_key("window")) or 0
+
+    def get_counters_keys(self, window: int, queue: str, task: str) -> List[str]:
+        """keys of the count, the total wait (in ms) and the buckets counts"""
+        counters_key = self.get_key(window, queue, task)
+        return [f"{counters_key}.{name}" for name in ("count", "total_wait_ms", *(f"bucket_{i}" for i in range(len(LATENCY_BUCKETS) + 1)))]
+
+    def record(self, queue: str, task: str, wait: float) -> None:
+        window = self.get_window()
+        count_key, total_wait_key, *buckets_keys = self.get_counters_keys(window=window, queue=queue, task=task)
+        if cache.add(count_key, 0, timeout=self.WINDOW_TIMEOUT):
+            # first wait of this queue and task in the window: register them for the report
+            index = self.incr(self.get_key(window, "pairs"))
+            cache.set(self.get_key(window, "pair", index), (queue, task), timeout=self.WINDOW_TIMEOUT)
+        self.incr(count_key)
+        self.incr(total_wait_key, round(wait * 10**3))
+        self.incr(buckets_keys[bisect.bisect_left(LATENCY_BUCKETS, wait)])
+
+    def get_snapshot(self, window: Optional[int] = None) -> List[Dict[str, Any]]:
+        window = self.get_window() if window is None else window
+        pairs_count = cache.get(self.get_key(window, "pairs")) or 0
+        pairs = cache.get_many([self.get_key(window, "pair", index) for index in range(1, pairs_count + 1)]).values()
+        counters_keys = {(queue, task): self.get_counters_keys(window=window, queue=queue, task=task) for queue, task in pairs}
+        counters = cache.get_many([key for keys in counters_keys.values() for key in keys])
+        snapshot = []
+        for (queue, task), keys in counters_keys.items():
+            count, total_wait_ms, *buckets = (counters.get(key, 0) for key in keys)
+            if count:
+                snapshot.append({"queue": queue, "task": task, "count": count, "total_wait": total_wait_ms / 10**3, "buckets": buckets})
+        return snapshot
+
+    def reset(self) -> int:
+        """close the current window and return it, to be read with `get_snapshot()`"""
+        return self.incr(self.get_key("window"), timeout=None) - 1
+
+
+task_metrics = TaskMetrics()
+
+
+def get_wait_time(published_at: Optional[float], eta: Optional[str], now: float) -> Optional[float]:
+    """time spent in the queue since the task was published, or since its ETA for delayed tasks"""
+    if published_at is None:
+        return None
+    ready_at = published_at
+    eta_datetime = eta and parse_datetime(eta)
+    if eta_datetime:
+        ready_at = max(ready_at, eta_datetime.timestamp())
+    return max(now - ready_at, 0.0)
+
+
+def on_task_published(headers: dict, **kwargs) -> None:
+    headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def on_task_prerun(task, **kwargs) -> None:
+    request = task.request
+    wait = get_wait_time(published_at=getattr(request, PUBLISHED_AT_HEADER, None), eta=request.eta, now=time.time())
+    if wait is None:
+        return
+    queue = (request.delivery_info or {}).get("routing_key") or "unknown"
+    try:
+        task_metrics.record(queue=queue, task=task.name, wait=wait)
+    except Exception as e:
+        _logger.warning(f"Could not record the wait time of task `{task.name}`: {e}")
+
+
+def get_queues_depths(app, queues: Iterable[str]) -> Dict[str, int]:
+    """number of messages waiting in each queue (all priorities included)"""
+    depths = {}
+    with app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for queue in queues:
+            try:
+                depths[queue] = channel.queue_declare(queue=queue, passive=True).message_count
+            except Exception as e:
+                _logger.warning(f"Could not get the depth of queue `{queue}`: {e}")
+    return depths
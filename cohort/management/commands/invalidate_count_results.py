@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cohort.services.dated_measure import dm_service
+
+
+class Command(BaseCommand):
+    help = "Prevent the reuse of past count results, to be run once new data is loaded in the warehouse"
+
+    def handle(self, *args, **options):
+        dm_service.invalidate_count_results()
+        self.stdout.write("Count results invalidated")
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-18 07:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cohort', '0025_alter_fhirfilter_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datedmeasure',
+            name='coalesced_into',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coalesced_dms', to='cohort.datedmeasure'),
+        ),
+        migrations.AddField(
+            model_name='datedmeasure',
+            name='result_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
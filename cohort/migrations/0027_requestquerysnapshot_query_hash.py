@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 07:16
+
+from django.db import migrations, models
+
+from cohort.models.request_query_snapshot import get_query_hash
+
+
+def set_query_hash_for_old_query_snapshots(apps, schema_editor):
+    rqs_model = apps.get_model('cohort', 'RequestQuerySnapshot')
+    db_alias = schema_editor.connection.alias
+
+    to_update = []
+    for rqs in rqs_model.objects.using(db_alias).only("uuid", "serialized_query").iterator(chunk_size=2000):
+        rqs.query_hash = get_query_hash(rqs.serialized_query)
+        to_update.append(rqs)
+        if len(to_update) == 2000:
+            rqs_model.objects.using(db_alias).bulk_update(to_update, ["query_hash"])
+            to_update = []
+    rqs_model.objects.using(db_alias).bulk_update(to_update, ["query_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cohort', '0026_datedmeasure_result_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestquerysnapshot',
+            name='query_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(set_query_hash_for_old_query_snapshots, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.14 on 2026-10-18 07:19
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+from cohort.services.utils import get_next_refresh
+
+UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def move_refresh_periodic_tasks_to_schedules(apps, schema_editor):
+    """the DM refreshed by the periodic task of a schedule is the first argument of the task"""
+    schedule_model = apps.get_model('cohort', 'RequestRefreshSchedule')
+    periodic_task_model = apps.get_model('django_celery_beat', 'PeriodicTask')
+    db_alias = schema_editor.connection.alias
+
+    periodic_tasks = periodic_task_model.objects.using(db_alias).filter(task="cohort.tasks.refresh_count_request")
+    dm_id_per_snapshot = {task.name: UUID_PATTERN.search(task.args or "") for task in periodic_tasks}
+    for schedule in schedule_model.objects.using(db_alias).filter(deleted__isnull=True):
+        dm_id = dm_id_per_snapshot.get(str(schedule.request_snapshot_id))
+        schedule.dated_measure_id = dm_id and dm_id.group() or None
+        schedule.next_refresh = get_next_refresh(
+            refresh_time=schedule.refresh_time, refresh_frequency=schedule.refresh_frequency, after=timezone.now()
+        )
+        schedule.save(update_fields=["dated_measure", "next_refresh"])
+    crontabs_ids = [task.crontab_id for task in periodic_tasks]
+    periodic_tasks.delete()
+    apps.get_model('django_celery_beat', 'CrontabSchedule').objects.using(db_alias).filter(
+        id__in=crontabs_ids, periodictask__isnull=True
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cohort', '0027_requestquerysnapshot_query_hash'),
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestrefreshschedule',
+            name='dated_measure',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='refresh_schedules', to='cohort.datedmeasure'),
+        ),
+        migrations.AddField(
+            model_name='requestrefreshschedule',
+            name='next_refresh',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.RunPython(move_refresh_periodic_tasks_to_schedules, reverse_code=migrations.RunPython.noop),
+    ]
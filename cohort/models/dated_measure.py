@@ -25,6 +25,14 @@ class DatedMeasure(CohortBaseModel, JobModel):
     extra = models.JSONField(null=True, blank=True)
     count_task_id = models.TextField(blank=True)
     mode = models.CharField(max_length=20, choices=DATED_MEASURE_MODE_CHOICES, default=SNAPSHOT_DM_MODE, null=True)
+    result_key = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    coalesced_into = models.ForeignKey("self", related_name="coalesced_dms", on_delete=models.SET_NULL, null=True)
+
+    def save(self, *args, **kwargs):
+        from cohort.services.dated_measure import dm_service
+
+        super().save(*args, **kwargs)
+        dm_service.propagate_count_result(dm=self)
 
     @property
     def count_outdated(self) -> bool:
@@ -1,11 +1,47 @@
 from __future__ import annotations
 
+import hashlib
+import json
+from typing import Any
+
 from django.contrib.postgres.fields import ArrayField
 from django.db import models, transaction
 
 from admin_cohort.models import User
 from cohort.models import CohortBaseModel, Request
 
+COMMUTATIVE_GROUP_TYPES = ("andGroup", "orGroup")
+
+
+def canonicalize(node: Any) -> Any:
+    """
+    Criteria of AND/OR groups and perimeters of the source population are sets: they are sorted by their own canonical
+    form, so that reordering them does not change the query
+    """
+    if isinstance(node, list):
+        return [canonicalize(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    canonical = {key: canonicalize(value) for key, value in node.items()}
+    if canonical.get("_type") in COMMUTATIVE_GROUP_TYPES and isinstance(canonical.get("criteria"), list):
+        canonical["criteria"] = sorted(canonical["criteria"], key=lambda criteria: json.dumps(criteria, sort_keys=True))
+    if isinstance(canonical.get("caresiteCohortList"), list):
+        canonical["caresiteCohortList"] = sorted(canonical["caresiteCohortList"], key=str)
+    return canonical
+
+
+def get_canonical_query(serialized_query: str) -> str:
+    """raise ValueError if the query is not valid JSON"""
+    return json.dumps(canonicalize(json.loads(serialized_query)), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def get_query_hash(serialized_query: str) -> str:
+    try:
+        content = get_canonical_query(serialized_query)
+    except ValueError:
+        content = serialized_query.strip()
+    return hashlib.sha256(content.encode()).hexdigest()
+
 
 class RequestQuerySnapshotManager(models.Manager):
     def get_queryset(self):
@@ -23,6 +59,7 @@ class RequestQuerySnapshot(CohortBaseModel):
     perimeters_ids = ArrayField(models.CharField(max_length=15), null=True, blank=True)
     version = models.IntegerField(default=1)
     name = models.CharField(null=True, blank=True)
+    query_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
 
     # Default manager excludes some rows (e.g., subsets) from queries
     objects = RequestQuerySnapshotManager()  # type: ignore[misc, assignment]
@@ -31,19 +68,23 @@ class RequestQuerySnapshot(CohortBaseModel):
 
     def save(self, *args, **kwargs):
         """
-        On update, optionally create a backup patch when serialized_query changes.
+        Keep the query hash up to date and, on update, optionally create a backup patch when serialized_query changes.
         """
+        update_fields = kwargs.get("update_fields")
+        should_check_serialized = update_fields is None or (isinstance(update_fields, (list, set, tuple)) and "serialized_query" in update_fields)
+        if should_check_serialized:
+            self.query_hash = get_query_hash(self.serialized_query)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "query_hash"}
 
         ### Add backup for patched queries
         uuid = str(self.uuid)
-        update_fields = kwargs.get("update_fields")
-        should_check_serialized = update_fields is None or (isinstance(update_fields, (list, set, tuple)) and "serialized_query" in update_fields)
         with transaction.atomic():
-            # For updates, check if serialized_query has changed and create a patch
+            # For updates, check if serialized_query has changed (not only its formatting) and create a patch
             if self.pk is not None and uuid and should_check_serialized:
                 # Lock the current row to avoid race conditions on patch_version
                 old = type(self).all_objects.select_for_update().only("serialized_query").filter(pk=self.pk).first()
-                if old is not None and old.serialized_query != self.serialized_query:
+                if old is not None and get_query_hash(old.serialized_query) != self.query_hash:
                     RequestQuerySnapshotPatch.create_from_snapshot(
                         snapshot=self,
                         uuid=uuid,
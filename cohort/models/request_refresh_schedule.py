@@ -2,7 +2,7 @@ from django.db import models
 from django.db.models import UniqueConstraint, Q
 
 from admin_cohort.models import User
-from cohort.models import CohortBaseModel, RequestQuerySnapshot
+from cohort.models import CohortBaseModel, RequestQuerySnapshot, DatedMeasure
 from cohort.services.utils import RefreshFrequency
 
 
@@ -19,6 +19,8 @@ class RequestRefreshSchedule(CohortBaseModel):
     last_refresh_count = models.IntegerField(null=True)
     last_refresh_error_msg = models.CharField(null=True)
     notify_owner = models.BooleanField(default=False)
+    dated_measure = models.ForeignKey(DatedMeasure, on_delete=models.SET_NULL, related_name="refresh_schedules", null=True)
+    next_refresh = models.DateTimeField(null=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -1,26 +1,37 @@
+import difflib
 import json
 import logging
+import multiprocessing
+import os
 import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
 from functools import reduce
+from itertools import islice
 from pathlib import Path
-from typing import List, Tuple, TypeVar, Callable, Any, Optional, Dict, Union
+from typing import Iterable, Iterator, List, Tuple, TypeVar, Callable, Any, Optional, Dict, Union
 
+from django.db import connections, transaction
 from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Max, QuerySet
 
 from cohort.models import RequestQuerySnapshot, FhirFilter
+from cohort.models.fhir_filter import FilterFhirPatch
+from cohort.models.request_query_snapshot import RequestQuerySnapshotPatch, get_query_hash
 
 LOGGER = logging.getLogger("info")
 
 RESOURCE_DEFAULT = "_"
 MATCH_ALL_VALUES = "__MATCH_ALL_VALUES__"
+MAPPINGS_LOADED = "__MAPPINGS_LOADED__"
 
+MIGRATION_CHUNK_SIZE = 2000
+MIGRATION_WORKERS = min(4, os.cpu_count() or 1)
 
-def find_mapped_code(
-    code: str, src_system: str, target_system: str, default_value: Callable[[str], str], db: BaseDatabaseWrapper, code_mapping_cache: Dict[str, str]
-) -> str:
-    if code in code_mapping_cache:
-        return code_mapping_cache[code]
-    LOGGER.info(f"Searching for code {code}")
+
+def load_mapped_codes(src_system: str, target_system: str, db: BaseDatabaseWrapper) -> Dict[str, str]:
+    """All the codes of the source system mapped to a code of the target system, in one query"""
     cursor = db.cursor()
     q = """
         WITH src_codes AS (
@@ -33,23 +44,76 @@ def find_mapped_code(
             FROM omop.concept_fhir 
             WHERE source_vocabulary_reference = %s AND delete_datetime IS NULL
             )
-        SELECT target_code FROM omop.concept_relationship r
+        SELECT src_code, target_code FROM omop.concept_relationship r
         INNER JOIN src_codes o
         ON o.src_id = r.concept_id_1
         INNER JOIN target_codes a
         ON a.target_id = r.concept_id_2
-        WHERE relationship_id = 'Maps to' AND r.delete_datetime IS NULL AND o.src_code = %s;
+        WHERE relationship_id = 'Maps to' AND r.delete_datetime IS NULL;
         """
-    cursor.execute(q, (src_system, target_system, code))
-    res = cursor.fetchone()
-    if not res:
-        LOGGER.info(f"Failed to find related atc code {code}")
+    cursor.execute(q, (src_system, target_system))
+    mapped_codes: Dict[str, str] = {}
+    for src_code, target_code in cursor.fetchall():
+        mapped_codes.setdefault(src_code, target_system + "|" + target_code)
+    LOGGER.info(f"Loaded {len(mapped_codes)} codes mappings from {src_system} to {target_system}")
+    return mapped_codes
+
+
+def find_mapped_code(
+    code: str, src_system: str, target_system: str, default_value: Callable[[str], str], db: BaseDatabaseWrapper, code_mapping_cache: Dict[str, str]
+) -> str:
+    """The cache is filled with all the mappings on the first call, a code missing from it is not mapped"""
+    if MAPPINGS_LOADED not in code_mapping_cache:
+        code_mapping_cache.update(load_mapped_codes(src_system, target_system, db))
+        code_mapping_cache[MAPPINGS_LOADED] = ""
+    if code not in code_mapping_cache:
+        LOGGER.info(f"Failed to find related code {code}")
         code_mapping_cache[code] = default_value(code)
-        return code_mapping_cache[code]
-    code_mapping_cache[code] = target_system + "|" + res[0]
     return code_mapping_cache[code]
 
 
+@dataclass
+class ChunkResult:
+    # (pk, query before, query after) of the changed queries
+    updated: List[Tuple[Any, str, str]] = field(default_factory=list)
+    processed: int = 0
+    upgraded: int = 0
+    error_loading: int = 0
+    versions_recap: Dict[Optional[str], int] = field(default_factory=dict)
+
+    def merge(self, other: "ChunkResult") -> None:
+        self.processed += other.processed
+        self.upgraded += other.upgraded
+        self.error_loading += other.error_loading
+        for version, count in other.versions_recap.items():
+            self.versions_recap[version] = self.versions_recap.get(version, 0) + count
+
+
+# set before forking the worker processes, as the updater holds lambdas which cannot be pickled
+_worker_updater: Optional["QueryRequestUpdater"] = None
+_worker_debug_path: Optional[Path] = None
+
+
+def upgrade_chunk(rows: List[Tuple[Any, str]]) -> ChunkResult:
+    return _worker_updater.upgrade_rows(rows, _worker_debug_path)
+
+
+class MigrationCheckpoint:
+    """Last pk written by a migration, for an interrupted migration to resume after it"""
+
+    def __init__(self, name: str):
+        self.path = Path(tempfile.gettempdir()) / f"{name}.checkpoint"
+
+    def load(self) -> Optional[str]:
+        return self.path.exists() and self.path.read_text() or None
+
+    def save(self, pk: Any) -> None:
+        self.path.write_text(str(pk))
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
 class QueryRequestUpdater:
     def __init__(
         self,
@@ -220,77 +284,217 @@ class QueryRequestUpdater:
         # if the process failed then we don't want to save the changes
         return query.get("version", None) == self.version_name, was_upgraded
 
-    def do_update_old_query_snapshots(self, queries: List[Any], save_query: Callable[[Any], None], dry_run, debug):
-        error_loading = 0
-        processed = 0
-        upgraded = 0
-        changed_queries = []
-        debug_path: Optional[Path] = None
-        versions_recap = {}
-        if debug:
-            debug_path = Path(tempfile.mkdtemp(prefix=f"update_{self.version_name}_"))
-        for rqs in queries:
+    def upgrade_rows(self, rows: Iterable[Tuple[Any, str]], debug_path: Optional[Path] = None) -> ChunkResult:
+        """Upgrade (pk, serialized query) rows without saving anything, the changed ones being returned"""
+        result = ChunkResult()
+        for pk, serialized_query in rows:
             try:
-                query = json.loads(rqs.serialized_query)
+                query = json.loads(serialized_query)
                 query_version = query.get("version", None)
             except Exception as e:
-                error_loading += 1
-                LOGGER.error("Could not load query %s", rqs.serialized_query, exc_info=e)
+                result.error_loading += 1
+                LOGGER.error("Could not load query %s", serialized_query, exc_info=e)
                 continue
             has_changed, was_upgraded = self.process_query(query, debug_path)
-            updated_query = json.dumps(query)
             new_query_version = self.version_name if has_changed else query_version
-            versions_recap[new_query_version] = versions_recap.get(new_query_version, 0) + 1
+            result.versions_recap[new_query_version] = result.versions_recap.get(new_query_version, 0) + 1
             if has_changed:
-                processed += 1
-                if was_upgraded:
-                    upgraded += 1
-                    if debug:
-                        LOGGER.info(f"Updating query from {rqs.serialized_query} to {updated_query}")
-                        changed_queries.append({"before": rqs.serialized_query, "after": updated_query})
-                rqs.serialized_query = updated_query
-                if not dry_run:
-                    save_query(rqs)
-        LOGGER.info(f"Processed {processed} queries ({upgraded} upgraded)")
-        LOGGER.info(f"Versions recap : {versions_recap}")
-        if error_loading:
-            LOGGER.warning(f"{error_loading} failed to load")
+                result.processed += 1
+                result.upgraded += was_upgraded
+                result.updated.append((pk, serialized_query, json.dumps(query)))
+        return result
+
+    def upgrade_chunks(self, chunks: Iterator[List[Tuple[Any, str]]], debug_path: Optional[Path], workers: int) -> Iterator[Tuple[Any, ChunkResult]]:
+        """
+        Yield the last pk and the result of each chunk, in order. Chunks are processed in forked worker processes, at
+        most 2 chunks per worker being in flight.
+        """
+        if workers <= 1:
+            for chunk in chunks:
+                yield chunk[-1][0], self.upgrade_rows(chunk, debug_path)
+            return
+        global _worker_updater, _worker_debug_path
+        _worker_updater, _worker_debug_path = self, debug_path
+        # the workers are forked before any query is made, so that they never share the connections of this process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            executor.submit(upgrade_chunk, []).result()
+            pending: deque[Tuple[Any, Future]] = deque()
+            for chunk in chunks:
+                pending.append((chunk[-1][0], executor.submit(upgrade_chunk, chunk)))
+                if len(pending) >= 2 * workers:
+                    last_pk, future = pending.popleft()
+                    yield last_pk, future.result()
+            while pending:
+                last_pk, future = pending.popleft()
+                yield last_pk, future.result()
+
+    @staticmethod
+    def write_diff_report(report_path: Path, updated: List[Tuple[Any, str, str]]) -> None:
+        def pretty(serialized_query: str) -> List[str]:
+            return json.dumps(json.loads(serialized_query), indent=2).splitlines(keepends=True)
+
+        with open(report_path, "a") as fh:
+            for pk, before, after in updated:
+                fh.writelines(difflib.unified_diff(pretty(before), pretty(after), fromfile=f"{pk} (before)", tofile=f"{pk} (after)"))
+                fh.write("\n")
+
+    def log_result(self, result: ChunkResult) -> None:
+        LOGGER.info(f"Processed {result.processed} queries ({result.upgraded} upgraded)")
+        LOGGER.info(f"Versions recap : {result.versions_recap}")
+        if result.error_loading:
+            LOGGER.warning(f"{result.error_loading} failed to load")
+
+    def run_migration(
+        self,
+        name: str,
+        queryset: QuerySet,
+        to_row: Callable[[Any], Tuple[Any, str]],
+        write_chunk: Callable[[List[Tuple[Any, str, str]]], None],
+        dry_run: bool,
+        debug: bool,
+        chunk_size: int,
+        workers: int,
+        resume: bool,
+    ) -> ChunkResult:
+        """
+        Stream the queryset rows in pk order, upgrade them by chunks and write each chunk back before checkpointing its
+        last pk. An interrupted migration resumes after the checkpoint, queries already in the new version being
+        skipped anyway. On dry run or debug, a diff of the changes is written instead of (or along with) them.
+        """
+        checkpoint = MigrationCheckpoint(f"update_{self.version_name}_{name}")
+        last_pk = not dry_run and resume and checkpoint.load()
+        if last_pk:
+            LOGGER.info(f"Resuming the update of {name} after {last_pk}")
+            queryset = queryset.filter(pk__gt=last_pk)
+        report_path: Optional[Path] = None
+        debug_path: Optional[Path] = None
+        if dry_run or debug:
+            debug_path = Path(tempfile.mkdtemp(prefix=f"update_{self.version_name}_"))
+            report_path = debug_path / f"{name}.diff"
+        rows = (to_row(row) for row in queryset.order_by("pk").iterator(chunk_size=chunk_size))
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+        total = ChunkResult()
+        for last_pk, result in self.upgrade_chunks(chunks, debug_path, workers):
+            if report_path:
+                self.write_diff_report(report_path, result.updated)
+            if not dry_run:
+                write_chunk(result.updated)
+                checkpoint.save(last_pk)
+            total.merge(result)
+            LOGGER.info(f"Updating {name}: {total.processed} queries processed ({total.upgraded} upgraded) up to {last_pk}")
+        self.log_result(total)
+        if not dry_run:
+            checkpoint.clear()
+        if report_path:
+            LOGGER.info(f"Changes of {name} reported in {report_path}")
+        return total
+
+    def do_update_old_query_snapshots(self, queries: List[Any], save_query: Callable[[Any], None], dry_run, debug):
+        queries = list(queries)
+        debug_path: Optional[Path] = None
+        if debug:
+            debug_path = Path(tempfile.mkdtemp(prefix=f"update_{self.version_name}_"))
+        result = self.upgrade_rows(((i, rqs.serialized_query) for i, rqs in enumerate(queries)), debug_path)
+        for i, _, updated_query in result.updated:
+            queries[i].serialized_query = updated_query
+            if not dry_run:
+                save_query(queries[i])
+        self.log_result(result)
         if debug:
-            with open(debug_path / "before", "w") as fh:
-                json.dump([json.loads(c["before"]) for c in changed_queries], fh, indent=2)
-            with open(debug_path / "after", "w") as fh:
-                json.dump([json.loads(c["after"]) for c in changed_queries], fh, indent=2)
+            self.write_diff_report(debug_path / "queries.diff", result.updated)
 
-    def update_old_query_snapshots(self, dry_run: bool = True, debug: bool = True, with_filters: bool = True):
+    @staticmethod
+    def save_snapshots(updated: List[Tuple[Any, str, str]]) -> None:
+        """Bulk equivalent of `RequestQuerySnapshot.save()`: the previous queries are backed up as patches"""
+        pks = [pk for pk, _, _ in updated]
+        with transaction.atomic():
+            last_patch_versions = dict(
+                RequestQuerySnapshotPatch.objects.filter(snapshot_id__in=pks)
+                .order_by()
+                .values("snapshot_id")
+                .annotate(last_patch_version=Max("patch_version"))
+                .values_list("snapshot_id", "last_patch_version")
+            )
+            RequestQuerySnapshotPatch.objects.bulk_create(
+                [
+                    RequestQuerySnapshotPatch(snapshot_id=pk, uuid=str(pk), serialized_query=before, patch_version=last_patch_versions.get(pk, 0) + 1)
+                    for pk, before, _ in updated
+                ]
+            )
+            RequestQuerySnapshot.all_objects.bulk_update(
+                [RequestQuerySnapshot(pk=pk, serialized_query=after, query_hash=get_query_hash(after)) for pk, _, after in updated],
+                ["serialized_query", "query_hash"],
+            )
+
+    def update_old_query_snapshots(
+        self,
+        dry_run: bool = True,
+        debug: bool = True,
+        with_filters: bool = True,
+        chunk_size: int = MIGRATION_CHUNK_SIZE,
+        workers: int = MIGRATION_WORKERS,
+        resume: bool = True,
+    ):
         LOGGER.info(f"Will update requests to version {self.version_name}. Dry run : {dry_run}")
-        all_rqs: List[RequestQuerySnapshot] = RequestQuerySnapshot.objects.all()
-        self.do_update_old_query_snapshots(all_rqs, lambda r: r.save(), dry_run, debug)
+        self.run_migration(
+            name="snapshots",
+            queryset=RequestQuerySnapshot.objects.values_list("pk", "serialized_query"),
+            to_row=tuple,
+            write_chunk=self.save_snapshots,
+            dry_run=dry_run,
+            debug=debug,
+            chunk_size=chunk_size,
+            workers=workers,
+            resume=resume,
+        )
         if with_filters:
-            self.update_old_filters(dry_run, debug)
-
-    def save_filter(self, f: RequestQuerySnapshot, filters: List[FhirFilter]):
-        for resource_filter in filters:
-            if resource_filter.uuid == f.title:
-                query = json.loads(f.serialized_query)
-                resource_filter.query_version = query.get("version", self.version_name)
-                resource_filter.filter = query["fhirFilter"]
-                resource_filter.save()
-                return
-
-    def update_old_filters(self, dry_run: bool = True, debug: bool = True):
+            self.update_old_filters(dry_run, debug, chunk_size=chunk_size, workers=workers, resume=resume)
+
+    @staticmethod
+    def filter_to_row(row: Tuple[Any, str, str, str]) -> Tuple[Any, str]:
+        pk, query_version, fhir_resource, fhir_filter = row
+        return pk, json.dumps({"version": query_version, "_type": "resource", "resourceType": fhir_resource, "fhirFilter": fhir_filter})
+
+    def save_filters(self, updated: List[Tuple[Any, str, str]]) -> None:
+        """Bulk equivalent of `FhirFilter.save()`: the previous filters are backed up as patches"""
+        filters, patches = [], []
+        for pk, before, after in updated:
+            old_filter, query = json.loads(before)["fhirFilter"], json.loads(after)
+            new_filter = query["fhirFilter"].strip("&=")
+            filters.append(FhirFilter(pk=pk, filter=new_filter, query_version=query.get("version", self.version_name)))
+            if new_filter != old_filter:
+                patches.append(FilterFhirPatch(filter_fhir_id=pk, uuid=str(pk), filter=old_filter))
+        with transaction.atomic():
+            last_patch_versions = dict(
+                FilterFhirPatch.objects.filter(filter_fhir_id__in=[patch.filter_fhir_id for patch in patches])
+                .order_by()
+                .values("filter_fhir_id")
+                .annotate(last_patch_version=Max("patch_version"))
+                .values_list("filter_fhir_id", "last_patch_version")
+            )
+            for patch in patches:
+                patch.patch_version = last_patch_versions.get(patch.filter_fhir_id, 0) + 1
+            FilterFhirPatch.objects.bulk_create(patches)
+            FhirFilter.all_objects.bulk_update(filters, ["filter", "query_version"])
+
+    def update_old_filters(
+        self,
+        dry_run: bool = True,
+        debug: bool = True,
+        chunk_size: int = MIGRATION_CHUNK_SIZE,
+        workers: int = MIGRATION_WORKERS,
+        resume: bool = True,
+    ):
         LOGGER.info(f"Will update filters to version {self.version_name}. Dry run : {dry_run}")
-        all_filters: List[FhirFilter] = FhirFilter.objects.all()
-        self.do_update_old_query_snapshots(
-            [
-                RequestQuerySnapshot(
-                    title=f.uuid,
-                    serialized_query=json.dumps(
-                        {"version": f.query_version, "_type": "resource", "resourceType": f.fhir_resource, "fhirFilter": f.filter}
-                    ),
-                )
-                for f in all_filters
-            ],
-            lambda r: self.save_filter(r, all_filters),
-            dry_run,
-            debug,
+        self.run_migration(
+            name="filters",
+            queryset=FhirFilter.objects.values_list("pk", "query_version", "fhir_resource", "filter"),
+            to_row=self.filter_to_row,
+            write_chunk=self.save_filters,
+            dry_run=dry_run,
+            debug=debug,
+            chunk_size=chunk_size,
+            workers=workers,
+            resume=resume,
         )
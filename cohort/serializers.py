@@ -90,7 +90,7 @@ class DatedMeasureSerializer(serializers.ModelSerializer):
     class Meta:
         model = DatedMeasure
         fields = "__all__"
-        read_only_fields = ["count_task_id", "request_job_id", "mode", "request"]
+        read_only_fields = ["count_task_id", "request_job_id", "mode", "request", "result_key", "coalesced_into"]
 
 
 class SampledCohortResultSerializer(serializers.ModelSerializer):
@@ -390,7 +390,14 @@ class RequestRefreshScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = RequestRefreshSchedule
         fields = "__all__"
-        read_only_fields = ["last_refresh", "last_refresh_succeeded", "last_refresh_count", "last_refresh_error_msg"]
+        read_only_fields = [
+            "last_refresh",
+            "last_refresh_succeeded",
+            "last_refresh_count",
+            "last_refresh_error_msg",
+            "dated_measure",
+            "next_refresh",
+        ]
 
 
 class JobName(StrEnum):
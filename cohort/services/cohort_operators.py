@@ -32,6 +32,14 @@ class DefaultCohortCounter(DefaultCohortOperator):
         """
         raise NotImplementedError()
 
+    @staticmethod
+    def is_count_pseudo_read(*args, **kwargs) -> bool:
+        """
+        tell whether the count query would be run on pseudonymized data for its owner
+        @return: bool, part of the key under which the count result is reused
+        """
+        return False
+
     @staticmethod
     def refresh_dated_measure_count(*args, **kwargs) -> None:
         """
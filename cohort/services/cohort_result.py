@@ -1,35 +1,49 @@
 import json
 import logging
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, List, Optional
 
+from celery import chord, group
+from celery.canvas import Signature
 from django.conf import settings
 from django.db import transaction
 
+from admin_cohort.celery_routing import get_long_pending_options
 from admin_cohort.types import JobStatus
 from cohort.models import CohortResult, FhirFilter, DatedMeasure, RequestQuerySnapshot
+from cohort.models.request_query_snapshot import get_query_hash
 from cohort.serializers import WSJobStatus, JobName
 from cohort.services.base_service import CommonService
 from cohort.services.dated_measure import dm_service
 from cohort.services.utils import get_authorization_header, ServerError
 from admin_cohort.services.ws_event_manager import WebsocketManager, WebSocketMessageType
+from admin_cohort.tools.cache import invalidate_cache
 from cohort.tasks import create_cohort
 
 _logger = logging.getLogger("info")
 
 
+@dataclass
+class CohortSubset:
+    table_name: str
+    source_cohort: CohortResult
+    fhir_filter_id: str
+
+
 class CohortResultService(CommonService):
     job_type = "create"
 
     @staticmethod
-    def build_query(cohort_source_id: str, fhir_filter_id: str | None = None) -> str:
+    def build_query(cohort_source_id: str, fhir_filter_id: str | None = None, fhir_filter: FhirFilter | None = None) -> str:
         resource_type, f_filter = "Patient", ""
-        if fhir_filter_id is not None:
+        if fhir_filter is None and fhir_filter_id is not None:
             fhir_filter = FhirFilter.objects.get(pk=fhir_filter_id)
+        if fhir_filter is not None:
             resource_type = fhir_filter.fhir_resource
             f_filter = fhir_filter.filter
             _logger.info(
                 "Cohort subset build_query: using FHIR filter[id=%s, resource=%s]",
-                fhir_filter_id,
+                fhir_filter.pk,
                 resource_type,
             )
 
@@ -48,56 +62,97 @@ class CohortResultService(CommonService):
         return json.dumps(query)
 
     def create_cohort_subset(self, request, owner_id: str, table_name: str, source_cohort: CohortResult, fhir_filter_id: str) -> CohortResult:
-        def copy_query_snapshot(snapshot: RequestQuerySnapshot) -> RequestQuerySnapshot:
-            return RequestQuerySnapshot.objects.create(
-                owner=snapshot.owner, request=snapshot.request, perimeters_ids=snapshot.perimeters_ids, serialized_query=query
+        subset = CohortSubset(table_name=table_name, source_cohort=source_cohort, fhir_filter_id=fhir_filter_id)
+        return self.create_cohort_subsets(request=request, owner_id=owner_id, subsets=[subset])[0]
+
+    def create_cohort_subsets(self, request, owner_id: str, subsets: List[CohortSubset], callback: Optional[Signature] = None) -> List[CohortResult]:
+        """
+        Snapshots, dated measures and cohorts of all the subsets are bulk created in a single transaction.
+        Once committed, the creation jobs are dispatched as one Celery group, or as a chord if a `callback` is given.
+        """
+        fhir_filters = {str(pk): f for pk, f in FhirFilter.objects.in_bulk([s.fhir_filter_id for s in subsets]).items()}
+        snapshots, dated_measures, cohort_subsets = [], [], []
+        for subset in subsets:
+            source_cohort = subset.source_cohort
+            _logger.info(
+                "Creating cohort subset: table=%s, source_group_id=%s, owner_id=%s, fhir_filter_id=%s",
+                subset.table_name,
+                source_cohort.group_id,
+                owner_id,
+                subset.fhir_filter_id,
             )
-
-        def copy_dated_measure(dm: DatedMeasure) -> DatedMeasure:
-            return DatedMeasure.objects.create(
-                mode=dm.mode,
-                owner=dm.owner,
-                request_query_snapshot=new_rqs,
-                measure=dm.measure,
-                request_job_status=dm.request_job_status,
-                request_job_duration=dm.request_job_duration,
+            src_rqs = source_cohort.request_query_snapshot
+            src_dm = source_cohort.dated_measure
+            if src_rqs is None or src_dm is None:
+                raise ServerError("Source cohort is missing request_query_snapshot or dated_measure")
+            fhir_filter = fhir_filters.get(str(subset.fhir_filter_id))
+            if fhir_filter is None:
+                raise FhirFilter.DoesNotExist(f"FHIR filter {subset.fhir_filter_id} not found")
+            rqs = RequestQuerySnapshot(
+                owner=src_rqs.owner,
+                request=src_rqs.request,
+                perimeters_ids=src_rqs.perimeters_ids,
+                serialized_query=self.build_query(cohort_source_id=source_cohort.group_id, fhir_filter=fhir_filter),
+            )
+            rqs.query_hash = get_query_hash(rqs.serialized_query)
+            dm = DatedMeasure(
+                mode=src_dm.mode,
+                owner=src_dm.owner,
+                request_query_snapshot=rqs,
+                measure=src_dm.measure,
+                request_job_status=src_dm.request_job_status,
+                request_job_duration=src_dm.request_job_duration,
+            )
+            count = src_dm.measure or 0
+            snapshots.append(rqs)
+            dated_measures.append(dm)
+            cohort_subsets.append(
+                CohortResult(
+                    is_subset=True,
+                    name=f"{subset.table_name}_{source_cohort.group_id}",
+                    owner_id=owner_id,
+                    dated_measure=dm,
+                    request_query_snapshot=rqs,
+                    request_job_status=count >= settings.COHORT_SIZE_LIMIT and JobStatus.long_pending or JobStatus.pending,
+                )
             )
 
-        _logger.info(
-            "Creating cohort subset: table=%s, source_group_id=%s, owner_id=%s, fhir_filter_id=%s",
-            table_name,
-            source_cohort.group_id,
-            owner_id,
-            fhir_filter_id,
-        )
-
-        query = self.build_query(cohort_source_id=source_cohort.group_id, fhir_filter_id=fhir_filter_id)
-        src_rqs = source_cohort.request_query_snapshot
-        src_dm = source_cohort.dated_measure
-        if src_rqs is None or src_dm is None:
-            raise ServerError("Source cohort is missing request_query_snapshot or dated_measure")
-        new_rqs = copy_query_snapshot(src_rqs)
-        new_dm = copy_dated_measure(src_dm)
-        cohort_subset = CohortResult.objects.create(
-            is_subset=True, name=f"{table_name}_{source_cohort.group_id}", owner_id=owner_id, dated_measure=new_dm, request_query_snapshot=new_rqs
-        )
-        _logger.info(
-            "Cohort subset object created: id=%s, name=%s, group_id=%s",
-            cohort_subset.pk,
-            cohort_subset.name,
-            cohort_subset.group_id,
-        )
-
+        auth_headers = get_authorization_header(request)
+        json_queries = [rqs.serialized_query for rqs in snapshots]
         with transaction.atomic():
-            self.handle_cohort_creation(cohort_subset, request, False)
-        _logger.info(
-            "Cohort subset creation job launched: cohort_id=%s, group_id=%s, job_status=%s",
-            cohort_subset.pk,
-            cohort_subset.group_id,
-            cohort_subset.request_job_status,
-        )
+            RequestQuerySnapshot.objects.bulk_create(snapshots)
+            DatedMeasure.objects.bulk_create(dated_measures)
+            CohortResult.objects.bulk_create(cohort_subsets)
+            jobs = group(
+                create_cohort.si(
+                    cohort_id=cohort.pk,
+                    json_query=json_query,
+                    auth_headers=auth_headers,
+                    cohort_creator_cls=self.operator_cls,
+                ).set(**(cohort.request_job_status == JobStatus.long_pending and get_long_pending_options() or {}))
+                for cohort, json_query in zip(cohort_subsets, json_queries)
+            )
+            transaction.on_commit(lambda: self.dispatch_cohort_subsets_jobs(cohort_subsets=cohort_subsets, jobs=jobs, callback=callback))
+        for model in (RequestQuerySnapshot, DatedMeasure, CohortResult):
+            invalidate_cache(model_name=model.__name__, user=str(owner_id))
+        _logger.info(f"{len(cohort_subsets)} cohort subsets created: {[str(cohort.pk) for cohort in cohort_subsets]}")
+        return cohort_subsets
 
-        return cohort_subset
+    def dispatch_cohort_subsets_jobs(self, cohort_subsets: List[CohortResult], jobs: group, callback: Optional[Signature]) -> None:
+        try:
+            if callback is not None:
+                chord(jobs)(callback)
+            else:
+                jobs.apply_async()
+        except Exception as e:
+            _logger.error(f"Failed to launch cohort subsets creation jobs: {e}")
+            for cohort in cohort_subsets:
+                self.mark_cohort_as_failed(cohort=cohort, reason="Could not launch cohort creation")
+            if callback is not None:
+                # let the callback see the failed subsets, it would otherwise never run
+                callback.apply()
+            return
+        _logger.info(f"Cohort subsets creation jobs launched: {[str(cohort.pk) for cohort in cohort_subsets]}")
 
     @staticmethod
     def count_active_jobs():
@@ -136,7 +191,7 @@ class CohortResultService(CommonService):
                 auth_headers=get_authorization_header(request),
                 cohort_creator_cls=self.operator_cls,
                 sampling_ratio=cohort.sampling_ratio,
-            ).apply_async()
+            ).apply_async(**(job_status == JobStatus.long_pending and get_long_pending_options() or {}))
         except Exception as e:
             _logger.error(
                 "Failed to launch cohort creation job: cohort_id=%s, error=%s",
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Set
 
 from django.db import IntegrityError
 from django.db.models import QuerySet
@@ -14,6 +14,7 @@ from accesses.q_expressions import (
     q_allow_export_jupyter_pseudo,
 )
 from accesses.services.accesses import accesses_service
+from accesses.services.perimeters_hierarchy import HierarchyIndex, perimeters_hierarchy
 from admin_cohort.models import User
 from cohort.models import CohortResult
 
@@ -37,39 +38,41 @@ class CohortRights:
 
 class CohortRightsService:
     def get_user_rights_on_cohorts(self, group_ids: str, user: User) -> List[dict]:
+        """a fixed number of queries is run whatever the number of cohorts and perimeters"""
         group_id_list = [i.strip() for i in group_ids.split(",") if i]
         if not CohortResult.objects.filter(group_id__in=group_id_list).exists():
             raise Http404("No cohorts found. The provided `group_id`s are not valid")
         user_accesses = accesses_service.get_user_valid_accesses(user=user)
-        if not user_accesses:
+        if not user_accesses.exists():
             raise Http404(f"The user `{user}` has no valid accesses")
         cohort_perimeters = self.get_cohort_perimeters(cohorts_ids=group_id_list, owner=user)
-        accesses_per_right = self.get_accesses_per_right(user_accesses=user_accesses)
+        perimeters_ids_per_right = self.get_perimeters_ids_per_right(accesses_per_right=self.get_accesses_per_right(user_accesses=user_accesses))
+        index = perimeters_hierarchy.get_index()
         cohort_rights = []
 
-        for cohort_id, perimeters in cohort_perimeters.items():
-            rights = self.get_rights_on_perimeters(accesses_per_right=accesses_per_right, perimeters=perimeters)
+        for cohort_id, perimeters_ids in cohort_perimeters.items():
+            rights = self.get_rights_on_perimeters(perimeters_ids_per_right=perimeters_ids_per_right, perimeters_ids=perimeters_ids, index=index)
             cohort_rights.append(CohortRights(cohort_id, rights).__dict__)
         return cohort_rights
 
-    def get_cohort_perimeters(self, cohorts_ids: List[str], owner: User) -> dict[str, QuerySet[Perimeter]]:
-        cohorts_owners = CohortResult.objects.filter(group_id__in=cohorts_ids).values_list("owner_id", flat=True).distinct()
-        if cohorts_owners.count() != 1 or owner.username not in cohorts_owners:
+    def get_cohort_perimeters(self, cohorts_ids: List[str], owner: User) -> Dict[str, List[int]]:
+        cohorts_owners = list(CohortResult.objects.filter(group_id__in=cohorts_ids).values_list("owner_id", flat=True).distinct())
+        if len(cohorts_owners) != 1 or owner.username not in cohorts_owners:
             raise IntegrityError(f"One or multiple cohorts with given IDs do not belong to user '{owner.display_name}'")
         virtual_cohorts = self.retrieve_virtual_cohorts_ids_from_snapshot(cohorts_ids=cohorts_ids) or {}
-        return {cohort_id: Perimeter.objects.filter(cohort_id__in=virtual_cohort_ids) for cohort_id, virtual_cohort_ids in virtual_cohorts.items()}
+        perimeters_ids_per_virtual_cohort: Dict[str, List[int]] = {}
+        all_virtual_cohorts_ids = {i for virtual_cohort_ids in virtual_cohorts.values() for i in virtual_cohort_ids}
+        for perimeter_id, virtual_cohort_id in Perimeter.objects.filter(cohort_id__in=all_virtual_cohorts_ids).values_list("id", "cohort_id"):
+            perimeters_ids_per_virtual_cohort.setdefault(virtual_cohort_id, []).append(perimeter_id)
+        return {
+            cohort_id: [p_id for i in virtual_cohort_ids for p_id in perimeters_ids_per_virtual_cohort.get(i, [])]
+            for cohort_id, virtual_cohort_ids in virtual_cohorts.items()
+        }
 
     @staticmethod
     def retrieve_virtual_cohorts_ids_from_snapshot(cohorts_ids: List[str]) -> dict[str, List[str]]:
-        cohorts = CohortResult.objects.filter(group_id__in=cohorts_ids)
-        out: dict[str, list[str]] = {}
-        for c in cohorts:
-            snap = c.request_query_snapshot
-            pids: list[str] = []
-            if snap is not None and snap.perimeters_ids is not None:
-                pids = list(snap.perimeters_ids)
-            out[c.group_id] = pids
-        return out
+        cohorts = CohortResult.objects.filter(group_id__in=cohorts_ids).values_list("group_id", "request_query_snapshot__perimeters_ids")
+        return {group_id: list(perimeters_ids or []) for group_id, perimeters_ids in cohorts}
 
     @staticmethod
     def get_accesses_per_right(user_accesses: QuerySet) -> dict[str, QuerySet]:
@@ -82,13 +85,18 @@ class CohortRightsService:
         }
 
     @staticmethod
-    def get_rights_on_perimeters(accesses_per_right: dict, perimeters: QuerySet[Perimeter]) -> dict[str, bool]:
+    def get_perimeters_ids_per_right(accesses_per_right: dict[str, QuerySet]) -> dict[str, Set[int]]:
+        return {right: set(accesses.values_list("perimeter_id", flat=True)) for right, accesses in accesses_per_right.items()}
+
+    @staticmethod
+    def get_rights_on_perimeters(perimeters_ids_per_right: dict[str, Set[int]], perimeters_ids: List[int], index: HierarchyIndex) -> dict[str, bool]:
+        """a right is granted on the perimeters if granted on each of them or on one of its parents"""
         rights = all_true_rights()
-        for perimeter in perimeters:
-            perimeter_and_above = [perimeter.id] + perimeter.above_levels
+        for perimeter_id in perimeters_ids:
+            ancestors_ids = index.ancestors.get(perimeter_id, frozenset())
             for r in rights:
-                accesses = accesses_per_right[r]
-                is_valid_right = accesses.filter(perimeter_id__in=perimeter_and_above).exists()
+                right_perimeters_ids = perimeters_ids_per_right[r]
+                is_valid_right = perimeter_id in right_perimeters_ids or not ancestors_ids.isdisjoint(right_perimeters_ids)
                 rights[r] = rights[r] and is_valid_right
         return rights
 
@@ -1,31 +1,155 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from admin_cohort.services.auth import jwt_auth_service
 from admin_cohort.types import JobStatus
 from cohort.models import DatedMeasure, CohortResult
 from cohort.models.dated_measure import GLOBAL_DM_MODE
+from cohort.models.request_query_snapshot import get_query_hash
 from cohort.serializers import WSJobStatus, JobName
 from cohort.services.base_service import CommonService
+from cohort.services.request_refresh_schedule import requests_refresher_service
 from cohort.services.utils import get_authorization_header, ServerError
 from admin_cohort.services.ws_event_manager import WebsocketManager, WebSocketMessageType
 from cohort.tasks import cancel_previous_count_jobs, count_cohort
 
+_logger = logging.getLogger("info")
+
+COUNT_RESULTS_EPOCH_KEY = "cohort.count_results.epoch"
+RUNNING_COUNT_STATUSES = (JobStatus.new, JobStatus.pending, JobStatus.started)
+
 
 class DatedMeasureService(CommonService):
     job_type = "count"
 
     def handle_count(self, dm: DatedMeasure, request) -> None:
         stage_details = request.data.get("stageDetails", None)
+        # the DM is coalesced before cancelling the previous counts, so that the job it waits for is not cancelled
+        reused = self.reuse_count_result(dm=dm, stage_details=stage_details)
         cancel_previous_count_jobs.s(dm_id=dm.uuid, cohort_counter_cls=self.operator_cls).apply_async()
+        if reused:
+            return
         try:
-            count_cohort.s(
-                dm_id=dm.uuid,
-                json_query=dm.request_query_snapshot.serialized_query,
-                auth_headers=get_authorization_header(request),
-                cohort_counter_cls=self.operator_cls,
-                stage_details=stage_details,
-            ).apply_async()
+            self.launch_count(dm=dm, auth_headers=get_authorization_header(request), stage_details=stage_details)
         except Exception as e:
             dm.delete()
             raise ServerError("Could not launch count request") from e
 
+    def launch_count(self, dm: DatedMeasure, auth_headers: dict, stage_details: Optional[str] = None) -> None:
+        count_cohort.s(
+            dm_id=dm.uuid,
+            json_query=dm.request_query_snapshot.serialized_query,
+            auth_headers=auth_headers,
+            cohort_counter_cls=self.operator_cls,
+            stage_details=stage_details,
+        ).apply_async()
+
+    def get_count_result_key(self, dm: DatedMeasure, stage_details: Optional[str] = None) -> str:
+        """
+        The count result only depends on the query (including its source population), on whether the owner reads
+        pseudonymized data and on the data loaded in the warehouse (epoch)
+        """
+        rqs = dm.request_query_snapshot
+        is_pseudo = self.operator.is_count_pseudo_read(json_query=rqs.serialized_query, owner_username=dm.owner_id)
+        content = [rqs.query_hash or get_query_hash(rqs.serialized_query), is_pseudo, stage_details, cache.get(COUNT_RESULTS_EPOCH_KEY, 0)]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    def reuse_count_result(self, dm: DatedMeasure, stage_details: Optional[str] = None) -> bool:
+        """
+        Answer the count with the result of a recent identical one if any. If an identical count is still running,
+        the DM is coalesced into it and gets its result on its callback.
+        @return: True if no count job needs to be launched for the DM
+        """
+        if not settings.COUNT_RESULT_REUSE_TIMEOUT:
+            return False
+        try:
+            dm.result_key = self.get_count_result_key(dm=dm, stage_details=stage_details)
+        except ValueError as e:
+            _logger.warning(f"DatedMeasure[{dm.uuid}] Count result not reusable: {e}")
+            return False
+        identical_dms = (
+            DatedMeasure.objects.filter(
+                result_key=dm.result_key,
+                coalesced_into__isnull=True,
+                created_at__gte=timezone.now() - timedelta(seconds=settings.COUNT_RESULT_REUSE_TIMEOUT),
+            )
+            .exclude(pk=dm.pk)
+            .order_by("-created_at")
+        )
+        source_dm = (
+            identical_dms.filter(request_job_status=JobStatus.finished).first()
+            or identical_dms.filter(request_job_status__in=RUNNING_COUNT_STATUSES).first()
+        )
+        if source_dm is None:
+            dm.save(update_fields=["result_key"])
+            return False
+        dm.coalesced_into = source_dm
+        if source_dm.request_job_status == JobStatus.finished:
+            _logger.info(f"DatedMeasure[{dm.uuid}] Reusing count result of DatedMeasure[{source_dm.uuid}]")
+            self.copy_count_result(source_dm=source_dm, dm=dm)
+        else:
+            _logger.info(f"DatedMeasure[{dm.uuid}] Coalesced into running count of DatedMeasure[{source_dm.uuid}]")
+            dm.request_job_status = JobStatus.pending
+            dm.save()
+        return True
+
+    def propagate_count_result(self, dm: DatedMeasure) -> None:
+        """
+        Called on every save of a DM whose count ended, however it ended (callback, failed launch, cancellation...).
+        Its result is passed on to the DMs coalesced into it. If its job was cancelled, they are coalesced into the
+        first of them instead, whose count is relaunched.
+        """
+        if dm.coalesced_into_id is not None or not JobStatus(dm.request_job_status).is_end_state:
+            return
+        waiting_dms = list(dm.coalesced_dms.filter(request_job_status__in=RUNNING_COUNT_STATUSES).order_by("created_at"))
+        if not waiting_dms:
+            return
+        if dm.request_job_status != JobStatus.cancelled:
+            for coalesced_dm in waiting_dms:
+                self.copy_count_result(source_dm=dm, dm=coalesced_dm)
+            return
+        relaunched_dm, *coalesced_dms = waiting_dms
+        _logger.info(f"DatedMeasure[{dm.uuid}] Count cancelled, relaunched for DatedMeasure[{relaunched_dm.uuid}]")
+        relaunched_dm.coalesced_into = None
+        relaunched_dm.save()
+        DatedMeasure.objects.filter(pk__in=[coalesced_dm.pk for coalesced_dm in coalesced_dms]).update(coalesced_into=relaunched_dm)
+        transaction.on_commit(lambda: self.relaunch_count(dm=relaunched_dm))
+
+    def relaunch_count(self, dm: DatedMeasure) -> None:
+        # no user request to take the authorization from
+        auth_headers = {
+            "Authorization": f"Bearer {jwt_auth_service.generate_system_token()}",
+            settings.AUTHORIZATION_METHOD_HEADER: settings.JWT_AUTH_MODE,
+        }
+        try:
+            self.launch_count(dm=dm, auth_headers=auth_headers)
+        except Exception as e:
+            _logger.exception(f"DatedMeasure[{dm.uuid}] Could not relaunch count request")
+            self.mark_dm_as_failed(dm=dm, reason=f"Could not relaunch count request: {e}")
+
+    def copy_count_result(self, source_dm: DatedMeasure, dm: DatedMeasure) -> None:
+        for field in ("measure", "measure_min", "measure_max", "extra", "fhir_datetime", "request_job_status", "request_job_fail_msg"):
+            setattr(dm, field, getattr(source_dm, field))
+        dm.request_job_duration = str(timezone.now() - dm.created_at)
+        dm.save()
+        self.ws_send_to_client(dm=dm)
+        requests_refresher_service.update_refresh_scheduler(dm=dm)
+
+    @staticmethod
+    def invalidate_count_results() -> None:
+        try:
+            cache.incr(COUNT_RESULTS_EPOCH_KEY)
+        except ValueError:
+            cache.set(COUNT_RESULTS_EPOCH_KEY, 1, timeout=None)
+
     def handle_global_count(self, cohort: CohortResult, request) -> None:
         dm_global = DatedMeasure.objects.create(
             mode=GLOBAL_DM_MODE, owner=request.user, request_query_snapshot_id=request.data.get("request_query_snapshot")
@@ -1,35 +1,101 @@
+import logging
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from django.utils.timezone import now
-from django_celery_beat.models import CrontabSchedule, PeriodicTask
 
+from admin_cohort.types import JobStatus
 from cohort.models import RequestRefreshSchedule, DatedMeasure, RequestQuerySnapshot
+from cohort.models.request_query_snapshot import get_query_hash
 from cohort.services.base_service import CommonService, load_operator
-from cohort.services.utils import RefreshFrequency, get_authorization_header
-from cohort.tasks import refresh_count_request, send_email_count_request_refreshed
+from cohort.services.utils import get_authorization_header, get_next_refresh
+from cohort.tasks import refresh_count_requests, send_email_count_request_refreshed
 
-FREQUENCIES = {RefreshFrequency.DAILY.value: "*", RefreshFrequency.EVERY_OTHER_DAY.value: "*/2", RefreshFrequency.WEEKLY.value: "*/7"}
+_logger = logging.getLogger("info")
 
 
 class RequestRefreshScheduleService(CommonService):
     job_type = "count"
 
     def create_refresh_schedule(self, http_request, refresh_schedule: RequestRefreshSchedule) -> None:
-        crontab_schedule = self.create_crontab_schedule(refresh_schedule)
         snapshot = refresh_schedule.request_snapshot
-        dm_id = DatedMeasure.objects.create(owner=snapshot.owner, request_query_snapshot=snapshot).uuid
-        self.translate_snapshot_query(rqs=snapshot, dm_id=str(dm_id), auth_headers=get_authorization_header(http_request))
-        task_args = [dm_id, snapshot.translated_query, self.operator_cls]
-        task = f"{refresh_count_request.__module__}.{refresh_count_request.__name__}"
-        PeriodicTask.objects.create(name=snapshot.uuid, crontab=crontab_schedule, task=task, args=str(task_args))
+        dm = DatedMeasure.objects.create(owner=snapshot.owner, request_query_snapshot=snapshot)
+        self.translate_snapshot_query(rqs=snapshot, dm_id=str(dm.uuid), auth_headers=get_authorization_header(http_request))
+        refresh_schedule.dated_measure = dm
+        self.reset_next_refresh(refresh_schedule=refresh_schedule)
 
     def translate_snapshot_query(self, rqs: RequestQuerySnapshot, dm_id: str, auth_headers: dict) -> None:
         cohort_counter = load_operator(self.operator_cls)
         rqs.translated_query = cohort_counter.translate_query(dm_id=dm_id, json_query=rqs.serialized_query, auth_headers=auth_headers)
         rqs.save()
 
-    def reset_schedule_crontab(self, refresh_schedule: RequestRefreshSchedule) -> None:
-        periodic_task = PeriodicTask.objects.get(name=refresh_schedule.request_snapshot.uuid)
-        periodic_task.crontab = self.create_crontab_schedule(refresh_schedule)
-        periodic_task.save()
+    @staticmethod
+    def reset_next_refresh(refresh_schedule: RequestRefreshSchedule) -> None:
+        refresh_schedule.next_refresh = get_next_refresh(
+            refresh_time=refresh_schedule.refresh_time, refresh_frequency=refresh_schedule.refresh_frequency, after=timezone.now()
+        )
+        refresh_schedule.save()
+
+    def get_refresh_query_key(self, dm: DatedMeasure, rqs: RequestQuerySnapshot) -> str:
+        """identify the schedules giving the same count result, the DM's own key if the query cannot be read"""
+        try:
+            is_pseudo = self.operator.is_count_pseudo_read(json_query=rqs.serialized_query, owner_username=dm.owner_id)
+        except ValueError as e:
+            _logger.warning(f"DatedMeasure[{dm.uuid}] Refresh not deduplicated: {e}")
+            return str(dm.uuid)
+        return f"{rqs.query_hash or get_query_hash(rqs.serialized_query)}.{is_pseudo and 'pseudo' or 'nominative'}"
+
+    def refresh_due_schedules(self) -> None:
+        """
+        Refresh the counts of all schedules due by now. Schedules giving the same count result (same query and same
+        pseudonymized or nominative reading, whatever their DM and owner) are submitted once, the other DMs being
+        coalesced into the submitted one. Submissions are spread over rate-limited batches.
+        """
+        current_time = timezone.now()
+        with transaction.atomic():
+            due_schedules = list(
+                RequestRefreshSchedule.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(next_refresh__lte=current_time, dated_measure__isnull=False)
+                .select_related("dated_measure", "request_snapshot")
+            )
+            for schedule in due_schedules:
+                schedule.next_refresh = get_next_refresh(
+                    refresh_time=schedule.refresh_time,
+                    refresh_frequency=schedule.refresh_frequency,
+                    after=current_time,
+                    previous_refresh=schedule.next_refresh,
+                )
+            RequestRefreshSchedule.objects.bulk_update(due_schedules, ["next_refresh"])
+        if not due_schedules:
+            return
+
+        dms_per_query: Dict[str, List[DatedMeasure]] = {}
+        for schedule in due_schedules:
+            dm, rqs = schedule.dated_measure, schedule.request_snapshot
+            if dm is None:
+                # already filtered out by the query
+                continue
+            if not rqs.translated_query:
+                _logger.warning(f"RequestRefreshSchedule[{schedule.uuid}] No translated query to refresh")
+                continue
+            dms_per_query.setdefault(self.get_refresh_query_key(dm=dm, rqs=rqs), []).append(dm)
+
+        submitted_dms_ids = []
+        for submitted_dm, *coalesced_dms in dms_per_query.values():
+            DatedMeasure.objects.filter(pk=submitted_dm.pk).update(request_job_status=JobStatus.pending, coalesced_into=None)
+            DatedMeasure.objects.filter(pk__in=[dm.pk for dm in coalesced_dms]).update(
+                request_job_status=JobStatus.pending, coalesced_into=submitted_dm
+            )
+            submitted_dms_ids.append(str(submitted_dm.uuid))
+
+        batch_size = settings.REFRESH_BATCH_SIZE
+        for i in range(0, len(submitted_dms_ids), batch_size):
+            refresh_count_requests.s(dm_ids=submitted_dms_ids[i : i + batch_size], cohort_counter_cls=self.operator_cls).apply_async(
+                countdown=i // batch_size * settings.REFRESH_BATCH_INTERVAL
+            )
+        _logger.info(f"{len(due_schedules)} scheduled count requests due, {len(submitted_dms_ids)} distinct queries submitted")
 
     @staticmethod
     def update_refresh_scheduler(dm: DatedMeasure) -> None:
@@ -40,20 +106,15 @@ class RequestRefreshScheduleService(CommonService):
         if not qs.exists():
             return
         assert qs.count() == 1, "Multiple refresh schedules found"
-        qs.update(last_refresh=now(), last_refresh_succeeded=True, last_refresh_count=dm.measure, last_refresh_error_msg=dm.request_job_fail_msg)
+        qs.update(
+            last_refresh=now(),
+            last_refresh_succeeded=dm.request_job_status == JobStatus.finished,
+            last_refresh_count=dm.measure,
+            last_refresh_error_msg=dm.request_job_fail_msg,
+        )
         refresh_schedule = qs.last()
         if refresh_schedule and refresh_schedule.notify_owner:
             send_email_count_request_refreshed.s(snapshot_id=refresh_schedule.request_snapshot_id).apply_async()
 
-    @staticmethod
-    def create_crontab_schedule(refresh_schedule: RequestRefreshSchedule):
-        return CrontabSchedule.objects.create(
-            minute=refresh_schedule.refresh_time.minute,
-            hour=refresh_schedule.refresh_time.hour,
-            day_of_week="*",
-            day_of_month=FREQUENCIES.get(refresh_schedule.refresh_frequency, "*"),
-            month_of_year="*",
-        )
-
 
 requests_refresher_service = RequestRefreshScheduleService()
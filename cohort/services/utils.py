@@ -1,5 +1,6 @@
 import functools
 import logging
+from datetime import datetime, time, timedelta
 from enum import StrEnum
 from smtplib import SMTPException
 from time import sleep
@@ -7,6 +8,7 @@ from typing import Callable
 
 from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
 from rest_framework.request import Request
 
 from cohort.models import FeasibilityStudy
@@ -79,3 +81,21 @@ class RefreshFrequency(StrEnum):
     DAILY = "daily"
     EVERY_OTHER_DAY = "every_other_day"
     WEEKLY = "weekly"
+
+
+REFRESH_INTERVALS = {RefreshFrequency.DAILY.value: 1, RefreshFrequency.EVERY_OTHER_DAY.value: 2, RefreshFrequency.WEEKLY.value: 7}
+
+
+def get_next_refresh(refresh_time: time, refresh_frequency: str, after: datetime, previous_refresh: datetime | None = None) -> datetime:
+    """
+    Next refresh after `after`: `previous_refresh` shifted by the refresh interval, or the first `refresh_time` to come
+    """
+    if previous_refresh is None:
+        next_refresh = timezone.make_aware(datetime.combine(timezone.localdate(after), refresh_time))
+        interval = timedelta(days=1)
+    else:
+        next_refresh = previous_refresh
+        interval = timedelta(days=REFRESH_INTERVALS.get(refresh_frequency, 7))
+    while next_refresh <= after:
+        next_refresh += interval
+    return next_refresh
@@ -1,11 +1,13 @@
 import logging
-from typing import Optional
+from typing import List, Optional
 
 from celery import shared_task, current_task
+from django.db.models import Q
+from django.utils import timezone
 
 from admin_cohort import celery_app
 from admin_cohort.types import JobStatus
-from cohort.models import CohortResult, DatedMeasure, FeasibilityStudy, RequestQuerySnapshot
+from cohort.models import CohortResult, DatedMeasure, FeasibilityStudy, RequestQuerySnapshot, RequestRefreshSchedule
 from cohort.services.base_service import load_operator
 from cohort.services.emails import (
     send_email_notif_feasibility_report_requested,
@@ -13,7 +15,7 @@ from cohort.services.emails import (
     send_email_notif_feasibility_report_ready,
     send_email_notif_count_request_refreshed,
 )
-from cohort.services.utils import locked_instance_task, get_feasibility_study_by_id, send_email_notification, ServerError
+from cohort.services.utils import locked_instance_task, get_feasibility_study_by_id, send_email_notification
 
 _logger = logging.getLogger("django.request")
 
@@ -60,9 +62,14 @@ def cancel_previous_count_jobs(dm_id: str, cohort_counter_cls: str):
     for r_dm in running_dms:
         if r_dm.cohorts.all() or r_dm.global_cohorts.all():
             continue
+        # the job is shared with identical counts still waiting for its result
+        if r_dm.coalesced_dms.filter(request_job_status__in=(JobStatus.new, JobStatus.pending, JobStatus.started)).exists():
+            continue
         job_status = r_dm.request_job_status
         try:
-            if job_status == JobStatus.started:
+            if r_dm.coalesced_into_id:
+                r_dm.request_job_status = JobStatus.cancelled
+            elif job_status == JobStatus.started:
                 new_status = cohort_counter.cancel_job(job_id=r_dm.request_job_id)
                 r_dm.request_job_status = new_status
             else:
@@ -123,14 +130,26 @@ def send_email_count_request_refreshed(snapshot_id: str) -> None:
 
 
 @shared_task
-def refresh_count_request(dm_id: str, translated_query: str, cohort_counter_cls: str):
-    dm = DatedMeasure.objects.get(uuid=dm_id)
-    _logger.info(f"Request Snapshot Refreshing [{dm.request_query_snapshot.uuid}]")
-    try:
-        dm.count_task_id = current_task.request.id or ""
-        dm.request_job_status = JobStatus.pending
-        dm.save()
-        cohort_counter = load_operator(cohort_counter_cls)
-        cohort_counter.refresh_dated_measure_count(translated_query=translated_query)
-    except Exception as e:
-        raise ServerError("Error refreshing request") from e
+def refresh_due_count_requests() -> None:
+    from cohort.services.request_refresh_schedule import requests_refresher_service
+
+    requests_refresher_service.refresh_due_schedules()
+
+
+@shared_task
+def refresh_count_requests(dm_ids: List[str], cohort_counter_cls: str) -> None:
+    cohort_counter = load_operator(cohort_counter_cls)
+    for dm in DatedMeasure.objects.filter(uuid__in=dm_ids).select_related("request_query_snapshot"):
+        _logger.info(f"Request Snapshot Refreshing [{dm.request_query_snapshot.uuid}]")
+        try:
+            dm.count_task_id = current_task.request.id or ""
+            dm.save()
+            cohort_counter.refresh_dated_measure_count(translated_query=dm.request_query_snapshot.translated_query)
+        except Exception as e:
+            msg = f"Error refreshing request - {e}"
+            _logger.exception(f"DatedMeasure[{dm.uuid}] {msg}")
+            refreshed_dms = DatedMeasure.objects.filter(Q(pk=dm.pk) | Q(coalesced_into=dm, request_job_status=JobStatus.pending))
+            RequestRefreshSchedule.objects.filter(dated_measure__in=refreshed_dms).update(
+                last_refresh=timezone.now(), last_refresh_succeeded=False, last_refresh_error_msg=msg
+            )
+            refreshed_dms.update(request_job_status=JobStatus.failed, request_job_fail_msg=msg)
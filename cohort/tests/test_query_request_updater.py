@@ -1,9 +1,18 @@
 import dataclasses
 import json
+import tempfile
+from unittest import mock
+from unittest.mock import MagicMock
 
-from admin_cohort.tests.tests_tools import BaseTests
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TransactionTestCase
+
+from admin_cohort.tests.tests_tools import BaseTests, new_random_user
+from cohort.models import FhirFilter, Folder, Request as CohortRequest, RequestQuerySnapshot
+from cohort.models.request_query_snapshot import get_query_hash
 from cohort.scripts.patch_requests_v145 import return_filter_if_not_exist
-from cohort.scripts.query_request_updater import QueryRequestUpdater
+from cohort.scripts.query_request_updater import MigrationCheckpoint, QueryRequestUpdater, find_mapped_code
+from cohort.tests.tests_view_rqs import RqsTests
 
 
 class TestQueryRequestUpdater(BaseTests):
@@ -91,6 +100,130 @@ class TestQueryRequestUpdater(BaseTests):
         self.assertEqual(expected[3], saved[3])
 
 
+class TestFindMappedCode(BaseTests):
+    def test_all_mappings_are_loaded_in_one_query(self):
+        db = MagicMock()
+        db.cursor.return_value.fetchall.return_value = [("A01", "B01"), ("A02", "B02")]
+        cache = {}
+        find = dict(src_system="src", target_system="target", default_value=lambda code: f"default|{code}", db=db, code_mapping_cache=cache)
+        self.assertEqual(find_mapped_code("A01", **find), "target|B01")
+        self.assertEqual(find_mapped_code("A02", **find), "target|B02")
+        self.assertEqual(find_mapped_code("A03", **find), "default|A03")
+        db.cursor.return_value.execute.assert_called_once()
+
+
+class TestQueryRequestUpdaterMigration(RqsTests):
+    def setUp(self):
+        super().setUp()
+        self.updater = QueryRequestUpdater(
+            version_name="v2",
+            previous_version_name=["v1"],
+            filter_mapping={"Condition": {"code": "codeList"}},
+            filter_names_to_skip={},
+            filter_values_mapping={},
+            static_required_filters={},
+            resource_name_mapping={},
+        )
+        self.snapshots = [
+            RequestQuerySnapshot.objects.create(
+                owner=self.user1,
+                request=self.user1_req1,
+                serialized_query=json.dumps(
+                    {"version": "v1", "_type": "request", "request": {"criteria": [{"resourceType": "Condition", "filterFhir": f"code=A0{i}"}]}}
+                ),
+            )
+            for i in range(3)
+        ]
+        self.fhir_filter = FhirFilter.objects.create(
+            owner=self.user1, fhir_resource="Condition", name="Filter_01", filter="code=A00", query_version="v1"
+        )
+        MigrationCheckpoint("update_v2_snapshots").clear()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def run_update(self, **kwargs):
+        with mock.patch("cohort.scripts.query_request_updater.tempfile.mkdtemp", return_value=self.tmp_dir):
+            self.updater.update_old_query_snapshots(chunk_size=2, workers=1, **kwargs)
+
+    def test_snapshots_and_filters_are_updated_by_chunks_with_backups(self):
+        self.run_update(dry_run=False, debug=False)
+        for rqs in self.snapshots:
+            rqs.refresh_from_db()
+            query = json.loads(rqs.serialized_query)
+            self.assertEqual(query["version"], "v2")
+            self.assertTrue(query["request"]["criteria"][0]["filterFhir"].startswith("codeList="))
+            self.assertEqual(rqs.query_hash, get_query_hash(rqs.serialized_query))
+            self.assertEqual(list(rqs.patches.values_list("patch_version", flat=True)), [1])
+        self.fhir_filter.refresh_from_db()
+        self.assertEqual((self.fhir_filter.filter, self.fhir_filter.query_version), ("codeList=A00", "v2"))
+        self.assertEqual(self.fhir_filter.patches.get().filter, "code=A00")
+        self.assertIsNone(MigrationCheckpoint("update_v2_snapshots").load())
+
+        # updating again is a no-op
+        self.run_update(dry_run=False, debug=False)
+        self.assertEqual(self.snapshots[0].patches.count(), 1)
+
+    def test_dry_run_only_reports_the_changes(self):
+        self.run_update(dry_run=True, debug=False)
+        self.snapshots[0].refresh_from_db()
+        self.assertEqual(json.loads(self.snapshots[0].serialized_query)["version"], "v1")
+        with open(f"{self.tmp_dir}/snapshots.diff") as fh:
+            report = fh.read()
+        self.assertEqual(report.count('+  "version": "v2"'), 3)
+        self.assertIn('-        "filterFhir": "code=A00"', report)
+
+    def test_migration_resumes_after_the_checkpoint(self):
+        first, *others = sorted(self.snapshots, key=lambda rqs: rqs.pk)
+        MigrationCheckpoint("update_v2_snapshots").save(first.pk)
+        self.run_update(dry_run=False, debug=False, with_filters=False)
+        first.refresh_from_db()
+        self.assertEqual(json.loads(first.serialized_query)["version"], "v1")
+        for rqs in others:
+            rqs.refresh_from_db()
+            self.assertEqual(json.loads(rqs.serialized_query)["version"], "v2")
+
+
+class TestQueryRequestUpdaterParallelMigration(TransactionTestCase):
+    # the workers are forked after closing the DB connections, which a TestCase transaction would not survive
+    databases = {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        self.updater = QueryRequestUpdater(
+            version_name="v2",
+            previous_version_name=["v1"],
+            filter_mapping={"Condition": {"code": "codeList"}},
+            filter_names_to_skip={},
+            filter_values_mapping={},
+            static_required_filters={},
+            resource_name_mapping={},
+        )
+        user = new_random_user()
+        request = CohortRequest.objects.create(owner=user, name="Request", parent_folder=Folder.objects.create(owner=user, name="Folder"))
+        self.snapshots = [
+            RequestQuerySnapshot.objects.create(
+                owner=user,
+                request=request,
+                serialized_query=json.dumps(
+                    {"version": "v1", "_type": "request", "request": {"criteria": [{"resourceType": "Condition", "filterFhir": f"code=A0{i}"}]}}
+                ),
+            )
+            for i in range(5)
+        ]
+        MigrationCheckpoint("update_v2_snapshots").clear()
+
+    def test_chunks_are_upgraded_by_workers_written_and_checkpointed_in_order(self):
+        with mock.patch.object(MigrationCheckpoint, "save", autospec=True, side_effect=MigrationCheckpoint.save) as mock_save:
+            self.updater.update_old_query_snapshots(dry_run=False, debug=False, chunk_size=2, workers=2, with_filters=False)
+        pks = sorted(str(rqs.pk) for rqs in self.snapshots)
+        self.assertEqual([str(call.args[1]) for call in mock_save.call_args_list], [pks[1], pks[3], pks[4]])
+        self.assertIsNone(MigrationCheckpoint("update_v2_snapshots").load())
+        for i, rqs in enumerate(self.snapshots):
+            rqs.refresh_from_db()
+            query = json.loads(rqs.serialized_query)
+            self.assertEqual((query["version"], query["request"]["criteria"][0]["filterFhir"]), ("v2", f"codeList=A0{i}"))
+            self.assertEqual(rqs.query_hash, get_query_hash(rqs.serialized_query))
+            self.assertEqual(rqs.patches.count(), 1)
+
+
 @dataclasses.dataclass
 class Request:
     serialized_query: str
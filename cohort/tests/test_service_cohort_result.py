@@ -4,7 +4,8 @@ from requests import Request as HttpRequest
 
 from admin_cohort.tests.tests_tools import new_random_user, TestCaseWithDBs
 from cohort.models import Folder, Request, RequestQuerySnapshot, CohortResult, DatedMeasure, FhirFilter
-from cohort.services.cohort_result import CohortResultService
+from admin_cohort.types import JobStatus
+from cohort.services.cohort_result import CohortResultService, CohortSubset
 
 
 class TestCohortResultService(TestCaseWithDBs):
@@ -33,3 +34,35 @@ class TestCohortResultService(TestCaseWithDBs):
         )
         self.assertNotEqual(self.source_cohort.pk, cohort_subset.pk)
         self.assertNotEqual(self.source_cohort.dated_measure.pk, cohort_subset.dated_measure.pk)
+
+    @mock.patch("cohort.services.cohort_result.get_authorization_header")
+    @mock.patch("cohort.services.cohort_result.chord")
+    def test_create_cohort_subsets_in_batch(self, mock_chord, mock_get_auth_headers):
+        mock_get_auth_headers.return_value = {"authorization": "token"}
+        callback = mock.Mock()
+        subsets = [
+            CohortSubset(table_name=table_name, source_cohort=self.source_cohort, fhir_filter_id=str(self.fhir_filter.pk))
+            for table_name in ("Table_01", "Table_02")
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            cohort_subsets = self.cohort_result_service.create_cohort_subsets(
+                request=HttpRequest(data={}), owner_id=self.user1.pk, subsets=subsets, callback=callback
+            )
+        self.assertEqual([c.name for c in cohort_subsets], [f"Table_01_{self.source_cohort.group_id}", f"Table_02_{self.source_cohort.group_id}"])
+        self.assertEqual(CohortResult.objects.filter(is_subset=True, request_job_status=JobStatus.pending).count(), 2)
+        self.assertEqual(DatedMeasure.objects.filter(cohorts__in=cohort_subsets).count(), 2)
+        mock_chord.assert_called_once()
+        self.assertEqual(len(mock_chord.call_args.args[0].tasks), 2)
+        mock_chord.return_value.assert_called_once_with(callback)
+
+    @mock.patch("cohort.services.cohort_result.get_authorization_header")
+    @mock.patch("cohort.services.cohort_result.chord")
+    def test_cohort_subsets_callback_runs_if_jobs_cannot_be_launched(self, mock_chord, mock_get_auth_headers):
+        mock_get_auth_headers.return_value = {"authorization": "token"}
+        mock_chord.return_value.side_effect = Exception("Broker is down")
+        callback = mock.Mock()
+        subsets = [CohortSubset(table_name="Table_01", source_cohort=self.source_cohort, fhir_filter_id=str(self.fhir_filter.pk))]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cohort_result_service.create_cohort_subsets(request=HttpRequest(data={}), owner_id=self.user1.pk, subsets=subsets, callback=callback)
+        self.assertEqual(CohortResult.objects.filter(is_subset=True, request_job_status=JobStatus.failed).count(), 1)
+        callback.apply.assert_called_once()
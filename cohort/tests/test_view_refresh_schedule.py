@@ -1,14 +1,18 @@
 import datetime
+import json
 from unittest import mock
 
 from django.db import IntegrityError
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework import status
 
 from admin_cohort.tests.tests_tools import CreateCase, CaseRetrieveFilter, PatchCase
+from admin_cohort.types import JobStatus
 from cohort.models import RequestRefreshSchedule, Folder, Request, RequestQuerySnapshot, DatedMeasure
-from cohort.services.request_refresh_schedule import RequestRefreshScheduleService, FREQUENCIES, requests_refresher_service
-from cohort.services.utils import RefreshFrequency
+from cohort.services.request_refresh_schedule import RequestRefreshScheduleService, requests_refresher_service
+from cohort.services.utils import RefreshFrequency, get_next_refresh
+from cohort.tasks import refresh_count_requests
 from cohort.tests.cohort_app_tests import CohortAppTests
 from cohort.views import RequestRefreshScheduleViewSet
 
@@ -75,31 +79,30 @@ class RequestRefreshScheduleViewTests(CohortAppTests):
         self.check_create_case(case)
         mock_translate_query.assert_called_once()
         mock_get_auth_headers.assert_called_once()
-        periodic_task = PeriodicTask.objects.get(name=request_snapshot_id)
-        self.assertIsNotNone(periodic_task)
-        self.assertIsNotNone(periodic_task.crontab)
+        refresh_schedule = RequestRefreshSchedule.objects.get(request_snapshot_id=request_snapshot_id)
+        self.assertIsNotNone(refresh_schedule.dated_measure)
+        self.assertGreater(refresh_schedule.next_refresh, timezone.now())
+        self.assertEqual(timezone.localtime(refresh_schedule.next_refresh).time(), datetime.time(hour=11, minute=45))
 
     def test_successfully_patch_refresh_schedule(self):
-        request_snapshot_id = self.basic_data["request_snapshot_id"]
-        initial_crontab = CrontabSchedule.objects.create(
-            minute="10",
-            hour="12",
-            day_of_week="*",
-            day_of_month="*/7",  # weekly
-            month_of_year="*",
-        )
-        PeriodicTask.objects.create(name=request_snapshot_id, crontab=initial_crontab)
         data_to_update = {"refresh_time": datetime.time(hour=9, minute=45, second=0), "refresh_frequency": RefreshFrequency.EVERY_OTHER_DAY.value}
         case = PatchCase(initial_data=self.basic_data, data_to_update=data_to_update, user=self.user1, status=status.HTTP_200_OK, success=True)
         resp_data = self.check_patch_case(case=case, return_response_data=True)
         self.assertEqual(resp_data.get("refresh_time"), data_to_update["refresh_time"].strftime(format="%H:%M:%S"))
         self.assertEqual(resp_data.get("refresh_frequency"), data_to_update["refresh_frequency"])
-        updated_crontab = PeriodicTask.objects.get(name=request_snapshot_id).crontab
-        self.assertEqual(
-            f"{int(updated_crontab.hour) >= 10 and updated_crontab.hour or '0' + updated_crontab.hour}:{updated_crontab.minute}:00",
-            data_to_update["refresh_time"].strftime(format="%H:%M:%S"),
+        next_refresh = RequestRefreshSchedule.objects.get(request_snapshot_id=self.rqs.uuid).next_refresh
+        self.assertEqual(timezone.localtime(next_refresh).time(), data_to_update["refresh_time"])
+
+    def test_get_next_refresh(self):
+        after = timezone.make_aware(datetime.datetime(2026, 1, 10, 12, 0))
+        next_refresh = get_next_refresh(refresh_time=datetime.time(11, 45), refresh_frequency=RefreshFrequency.WEEKLY.value, after=after)
+        self.assertEqual(next_refresh, timezone.make_aware(datetime.datetime(2026, 1, 11, 11, 45)))
+        # refreshes missed while the scheduler was down are not replayed
+        later = after + datetime.timedelta(days=15)
+        next_refresh = get_next_refresh(
+            refresh_time=datetime.time(11, 45), refresh_frequency=RefreshFrequency.WEEKLY.value, after=later, previous_refresh=next_refresh
         )
-        self.assertEqual(updated_crontab.day_of_month, FREQUENCIES.get(data_to_update["refresh_frequency"], "*"))
+        self.assertEqual(next_refresh, timezone.make_aware(datetime.datetime(2026, 2, 1, 11, 45)))
 
     @mock.patch("cohort.services.request_refresh_schedule.send_email_count_request_refreshed.apply_async")
     def test_refresh_scheduler_updated(self, mock_send_email):
@@ -108,6 +111,7 @@ class RequestRefreshScheduleViewTests(CohortAppTests):
         self.assertIsNone(refresh_schedule.last_refresh)
         self.assertIsNone(refresh_schedule.last_refresh_succeeded)
         self.dm.measure = 700
+        self.dm.request_job_status = JobStatus.finished
         self.dm.save()
         requests_refresher_service.update_refresh_scheduler(dm=self.dm)
         refresh_schedule.refresh_from_db()
@@ -115,3 +119,65 @@ class RequestRefreshScheduleViewTests(CohortAppTests):
         self.assertIsNotNone(refresh_schedule.last_refresh)
         self.assertEqual(refresh_schedule.last_refresh_count, self.dm.measure)
         mock_send_email.assert_called_once()
+
+
+class RefreshDueSchedulesTests(CohortAppTests):
+    def setUp(self):
+        super().setUp()
+        folder = Folder.objects.create(owner=self.user1, name="f1")
+        self.schedules = []
+        for i, (owner, query) in enumerate([(self.user1, "query A"), (self.user2, "query A"), (self.user1, "query B")]):
+            request = Request.objects.create(owner=owner, name=f"Request {i}", parent_folder=folder)
+            rqs = RequestQuerySnapshot.objects.create(owner=owner, request=request, serialized_query=json.dumps({"cohortName": query}))
+            dm = DatedMeasure.objects.create(owner=owner, request_query_snapshot=rqs)
+            rqs.translated_query = f"input.cohortDefinitionSyntax = {query},input.ownerEntityId = {owner.pk},input.cohortUuid = {dm.uuid}"
+            rqs.save()
+            self.schedules.append(
+                RequestRefreshSchedule.objects.create(
+                    request_snapshot=rqs,
+                    owner=owner,
+                    dated_measure=dm,
+                    refresh_time="11:45:00",
+                    next_refresh=timezone.now() - datetime.timedelta(minutes=2),
+                )
+            )
+
+    @override_settings(REFRESH_BATCH_SIZE=1, REFRESH_BATCH_INTERVAL=30)
+    @mock.patch("cohort.services.request_refresh_schedule.refresh_count_requests.apply_async")
+    def test_identical_queries_submitted_once_in_batches(self, mock_refresh_task):
+        requests_refresher_service.refresh_due_schedules()
+        dm_a1, dm_a2, dm_b = [schedule.dated_measure for schedule in self.schedules]
+        self.assertEqual(
+            [(c.args[1]["dm_ids"], c.kwargs["countdown"]) for c in mock_refresh_task.call_args_list],
+            [([str(dm_a1.uuid)], 0), ([str(dm_b.uuid)], 30)],
+        )
+        dm_a2.refresh_from_db()
+        self.assertEqual((dm_a2.request_job_status, dm_a2.coalesced_into_id), (JobStatus.pending, dm_a1.uuid))
+        for schedule in self.schedules:
+            schedule.refresh_from_db()
+            self.assertGreater(schedule.next_refresh, timezone.now())
+
+        # not due anymore
+        mock_refresh_task.reset_mock()
+        requests_refresher_service.refresh_due_schedules()
+        mock_refresh_task.assert_not_called()
+
+    @mock.patch("cohort.services.request_refresh_schedule.refresh_count_requests.apply_async")
+    @mock.patch("cohort_job_server.cohort_counter.CohortCounter.refresh_dated_measure_count")
+    def test_failed_submission_marks_schedules_as_failed(self, mock_refresh_count, mock_refresh_task):
+        mock_refresh_count.side_effect = Exception("Query Executor unavailable")
+        requests_refresher_service.refresh_due_schedules()
+        refresh_count_requests(dm_ids=[str(self.schedules[0].dated_measure_id)], cohort_counter_cls=requests_refresher_service.operator_cls)
+        # the failure of the submitted query is reported on the schedules coalesced into it
+        for schedule, succeeded, dm_status in zip(self.schedules, (False, False, None), (JobStatus.failed, JobStatus.failed, JobStatus.pending)):
+            schedule.refresh_from_db()
+            self.assertEqual(schedule.last_refresh_succeeded, succeeded)
+            self.assertEqual(schedule.dated_measure.request_job_status, dm_status)
+
+    @mock.patch("cohort.services.request_refresh_schedule.refresh_count_requests.apply_async")
+    @mock.patch("cohort_job_server.cohort_counter.CohortCounter.is_count_pseudo_read")
+    def test_identical_queries_read_in_different_modes_submitted_apart(self, mock_is_pseudo, mock_refresh_task):
+        mock_is_pseudo.side_effect = lambda json_query, owner_username: owner_username == self.user2.pk
+        requests_refresher_service.refresh_due_schedules()
+        [submitted_dms_ids] = [c.args[1]["dm_ids"] for c in mock_refresh_task.call_args_list]
+        self.assertCountEqual(submitted_dms_ids, [str(schedule.dated_measure_id) for schedule in self.schedules])
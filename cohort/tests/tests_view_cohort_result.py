@@ -4,14 +4,18 @@ from typing import List, Any
 from unittest import mock
 from unittest.mock import MagicMock
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import force_authenticate
 
+from accesses.models import Access, Perimeter, Profile, Role
 from admin_cohort.tests.tests_tools import random_str, ListCase, RetrieveCase, CaseRetrieveFilter, CreateCase, PatchCase
 from admin_cohort.types import JobStatus
 from cohort.models import CohortResult, RequestQuerySnapshot, DatedMeasure
 from cohort.models.dated_measure import GLOBAL_DM_MODE, SNAPSHOT_DM_MODE
+from cohort.services.cohort_rights import cohort_rights_service
 from cohort.tests.tests_view_dated_measure import DatedMeasuresTests, DMDeleteCase
 from cohort.views import CohortResultViewSet
 
@@ -457,3 +461,52 @@ class CohortsUpdateTests(CohortsTests):
         self.check_patch_case(case)
         mock_patch_handler.assert_called_once()
         mock_ws_send_to_client.assert_called_once()
+
+
+class CohortRightsTests(CohortsTests):
+    def setUp(self):
+        super().setUp()
+        hospital = Perimeter.objects.create(id=1, name="Hospital", local_id="h1", cohort_id="c1", level=1)
+        Perimeter.objects.create(id=2, name="Service", local_id="s2", cohort_id="c2", level=2, parent=hospital, above_levels_ids="1")
+        Perimeter.objects.create(id=3, name="Other hospital", local_id="h3", cohort_id="c3", level=1)
+        profile = Profile.objects.create(user=self.user1, is_active=True)
+        nomi_role = Role.objects.create(name="Nomi", right_read_patient_nominative=True, right_export_jupyter_nominative=True)
+        pseudo_role = Role.objects.create(name="Pseudo", right_read_patient_pseudonymized=True)
+        start, end = timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1)
+        Access.objects.create(profile=profile, role=nomi_role, perimeter=hospital, start_datetime=start, end_datetime=end)
+        Access.objects.create(profile=profile, role=pseudo_role, perimeter_id=3, start_datetime=start, end_datetime=end)
+        self.cohorts = {
+            group_id: CohortResult.objects.create(
+                owner=self.user1,
+                group_id=group_id,
+                request_query_snapshot=RequestQuerySnapshot.objects.create(
+                    owner=self.user1, request=self.user1_req1, serialized_query="{}", perimeters_ids=perimeters_ids
+                ),
+            )
+            for group_id, perimeters_ids in (("g1", ["c2"]), ("g2", ["c2", "c3"]), ("g3", ["c3"]))
+        }
+
+    def get_rights(self, group_ids: str) -> dict:
+        return {r["cohort_id"]: r["rights"] for r in cohort_rights_service.get_user_rights_on_cohorts(group_ids=group_ids, user=self.user1)}
+
+    def test_rights_are_inherited_from_parent_perimeters(self):
+        rights = self.get_rights("g1,g2,g3")
+        self.assertEqual(
+            rights["g1"],
+            dict(read_patient_nomi=True, read_patient_pseudo=True, export_csv_xlsx_nomi=False, export_jupyter_nomi=True, export_jupyter_pseudo=True),
+        )
+        self.assertEqual(
+            rights["g2"],
+            dict(
+                read_patient_nomi=False, read_patient_pseudo=True, export_csv_xlsx_nomi=False, export_jupyter_nomi=False, export_jupyter_pseudo=False
+            ),
+        )
+        self.assertEqual(rights["g3"], rights["g2"])
+
+    def test_queries_count_does_not_depend_on_cohorts_count(self):
+        self.get_rights("g1")
+        with CaptureQueriesContext(connection) as single_cohort_queries:
+            self.get_rights("g1")
+        with CaptureQueriesContext(connection) as all_cohorts_queries:
+            self.get_rights("g1,g2,g3")
+        self.assertEqual(len(single_cohort_queries), len(all_cohorts_queries))
@@ -4,6 +4,7 @@ from typing import List, Any
 from unittest import mock
 from unittest.mock import MagicMock
 
+from django.test import override_settings
 from django.utils import timezone
 from rest_framework import status
 
@@ -11,6 +12,8 @@ from admin_cohort.tests.tests_tools import random_str, ListCase, RetrieveCase, C
 from admin_cohort.types import JobStatus
 from cohort.models import DatedMeasure, RequestQuerySnapshot, Request
 from cohort.models.dated_measure import DATED_MEASURE_MODE_CHOICES, GLOBAL_DM_MODE
+from cohort.services.dated_measure import dm_service, COUNT_RESULTS_EPOCH_KEY
+from cohort.tasks import cancel_previous_count_jobs
 from cohort.tests.tests_view_rqs import RqsTests
 from cohort.views import DatedMeasureViewSet
 
@@ -268,3 +271,105 @@ class DMUpdateTests(DatedMeasuresTests):
         self.check_patch_case(case)
         mock_patch_handler.assert_called_once()
         mock_ws_send_to_client.assert_called_once()
+
+
+@mock.patch("admin_cohort.services.ws_event_manager.WebsocketManager.send_to_client")
+@mock.patch("cohort.services.dated_measure.cancel_previous_count_jobs.apply_async")
+@mock.patch("cohort.services.dated_measure.count_cohort.apply_async")
+class DMCountResultReuseTests(DatedMeasuresTests):
+    def setUp(self):
+        super(DMCountResultReuseTests, self).setUp()
+        self.source_dm = DatedMeasure.objects.create(request_query_snapshot=self.user1_req1_branch1_snap2, owner=self.user1)
+        self.source_dm.result_key = dm_service.get_count_result_key(dm=self.source_dm)
+        self.source_dm.save()
+        # same query, formatted differently
+        self.identical_snapshot = RequestQuerySnapshot.objects.create(
+            owner=self.user1, request=self.user1_req1, serialized_query='{ "perimeter" :  "Terra" }'
+        )
+        self.dm = DatedMeasure.objects.create(request_query_snapshot=self.identical_snapshot, owner=self.user1)
+
+    def test_count_reuses_recent_identical_result(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.finished, measure=42)
+        dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        mock_count_task.assert_not_called()
+        mock_ws_send_to_client.assert_called_once()
+        self.dm.refresh_from_db()
+        self.assertEqual((self.dm.request_job_status, self.dm.measure), (JobStatus.finished, 42))
+        self.assertEqual(self.dm.coalesced_into, self.source_dm)
+
+    def test_count_launched_if_identical_result_is_outdated(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(
+            request_job_status=JobStatus.finished, measure=42, created_at=timezone.now() - timedelta(days=1)
+        )
+        dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        mock_count_task.assert_called_once()
+        self.dm.refresh_from_db()
+        self.assertEqual(self.dm.result_key, self.source_dm.result_key)
+        self.assertIsNone(self.dm.coalesced_into)
+
+    @override_settings(COUNT_RESULT_REUSE_TIMEOUT=0)
+    def test_count_launched_if_reuse_is_disabled(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.finished, measure=42)
+        dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        mock_count_task.assert_called_once()
+        self.dm.refresh_from_db()
+        self.assertIsNone(self.dm.coalesced_into)
+
+    def test_count_coalesced_into_running_identical_count(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.started)
+        dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        mock_count_task.assert_not_called()
+        self.dm.refresh_from_db()
+        self.assertEqual((self.dm.request_job_status, self.dm.coalesced_into), (JobStatus.pending, self.source_dm))
+
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.finished, measure=7)
+        self.source_dm.refresh_from_db()
+        dm_service.propagate_count_result(dm=self.source_dm)
+        self.dm.refresh_from_db()
+        self.assertEqual((self.dm.request_job_status, self.dm.measure), (JobStatus.finished, 7))
+        mock_ws_send_to_client.assert_called_once()
+
+    def test_count_results_invalidated(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.finished, measure=42)
+        # data loaded in the warehouse since the source count
+        with mock.patch(
+            "cohort.services.dated_measure.cache.get", side_effect=lambda key, default=None: 1 if key == COUNT_RESULTS_EPOCH_KEY else default
+        ):
+            dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        mock_count_task.assert_called_once()
+
+    def test_running_count_is_not_cancelled_once_coalesced(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.started)
+        mock_cancel_task.side_effect = lambda *args, **kwargs: cancel_previous_count_jobs(
+            dm_id=self.dm.uuid, cohort_counter_cls=dm_service.operator_cls
+        )
+        with mock.patch("cohort_job_server.cohort_counter.CohortCounter.cancel_job") as mock_cancel_job:
+            dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        mock_cancel_job.assert_not_called()
+        self.source_dm.refresh_from_db()
+        self.assertEqual(self.source_dm.request_job_status, JobStatus.started)
+
+    def test_coalesced_count_gets_failure_of_source_count(self, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.started)
+        dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        self.source_dm.refresh_from_db()
+        # ex: launch of the source count rejected by the query executor
+        dm_service.mark_dm_as_failed(dm=self.source_dm, reason="Query executor unavailable")
+        self.dm.refresh_from_db()
+        self.assertEqual((self.dm.request_job_status, self.dm.request_job_fail_msg), (JobStatus.failed, "Query executor unavailable"))
+
+    @mock.patch("cohort.services.dated_measure.jwt_auth_service.generate_system_token", return_value="system_token")
+    def test_coalesced_count_relaunched_if_source_count_cancelled(self, mock_token, mock_count_task, mock_cancel_task, mock_ws_send_to_client):
+        DatedMeasure.objects.filter(pk=self.source_dm.pk).update(request_job_status=JobStatus.started)
+        dm_service.handle_count(dm=self.dm, request=MagicMock(data={}))
+        other_dm = DatedMeasure.objects.create(request_query_snapshot=self.identical_snapshot, owner=self.user1)
+        dm_service.handle_count(dm=other_dm, request=MagicMock(data={}))
+        self.source_dm.refresh_from_db()
+        self.source_dm.request_job_status = JobStatus.cancelled
+        with self.captureOnCommitCallbacks(execute=True):
+            self.source_dm.save()
+        mock_count_task.assert_called_once()
+        self.dm.refresh_from_db()
+        other_dm.refresh_from_db()
+        self.assertEqual((self.dm.request_job_status, self.dm.coalesced_into), (JobStatus.pending, None))
+        self.assertEqual(other_dm.coalesced_into, self.dm)
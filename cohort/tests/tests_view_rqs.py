@@ -1,3 +1,4 @@
+import json
 import random
 from datetime import timedelta
 from os import environ
@@ -465,3 +466,57 @@ class RqsUpdateTests(RqsTests):
                 user=self.user1,
             )
         )
+
+
+class RqsQueryHashTests(RqsTests):
+    query = {
+        "_type": "request",
+        "sourcePopulation": {"caresiteCohortList": ["1", "2"]},
+        "request": {
+            "_type": "orGroup",
+            "_id": 0,
+            "criteria": [
+                {"_type": "basicResource", "_id": 1, "resourceType": "Condition", "filterFhir": "codeList=A00"},
+                {"_type": "andGroup", "_id": -1, "criteria": [{"_id": 2, "_type": "basicResource"}, {"_id": 3, "_type": "basicResource"}]},
+            ],
+        },
+    }
+    reordered_query = {
+        "request": {
+            "_id": 0,
+            "criteria": [
+                {"criteria": [{"_type": "basicResource", "_id": 3}, {"_type": "basicResource", "_id": 2}], "_id": -1, "_type": "andGroup"},
+                {"filterFhir": "codeList=A00", "resourceType": "Condition", "_id": 1, "_type": "basicResource"},
+            ],
+            "_type": "orGroup",
+        },
+        "sourcePopulation": {"caresiteCohortList": ["2", "1"]},
+        "_type": "request",
+    }
+
+    def create_snapshot(self, query: dict) -> RequestQuerySnapshot:
+        return RequestQuerySnapshot.objects.create(owner=self.user1, request=self.user1_req1, serialized_query=json.dumps(query))
+
+    def test_equivalent_queries_have_the_same_hash(self):
+        rqs = self.create_snapshot(self.query)
+        equivalent_rqs = self.create_snapshot(self.reordered_query)
+        self.assertEqual(len(rqs.query_hash), 64)
+        self.assertEqual(rqs.query_hash, equivalent_rqs.query_hash)
+        self.assertEqual(RequestQuerySnapshot.objects.filter(query_hash=rqs.query_hash).count(), 2)
+
+    def test_different_queries_have_different_hashes(self):
+        rqs = self.create_snapshot(self.query)
+        other_rqs = self.create_snapshot({**self.query, "request": {**self.query["request"], "_type": "andGroup"}})
+        self.assertNotEqual(rqs.query_hash, other_rqs.query_hash)
+
+    def test_patch_created_only_on_query_change(self):
+        rqs = self.create_snapshot(self.query)
+        rqs.serialized_query = json.dumps(self.reordered_query, indent=2)
+        rqs.save(update_fields=["serialized_query"])
+        self.assertFalse(rqs.patches.exists())
+
+        rqs.serialized_query = json.dumps({**self.query, "sourcePopulation": {"caresiteCohortList": ["3"]}})
+        rqs.save(update_fields=["serialized_query"])
+        self.assertEqual(rqs.patches.count(), 1)
+        rqs.refresh_from_db()
+        self.assertEqual(rqs.query_hash, self.create_snapshot(json.loads(rqs.serialized_query)).query_hash)
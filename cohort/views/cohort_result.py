@@ -10,6 +10,7 @@ from rest_framework.response import Response
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
 from admin_cohort.tools.cache import cache_response
+from admin_cohort.types import JobStatus
 from admin_cohort.tools import join_qs
 from cohort.services.cohort_result import cohort_service
 from cohort.models import CohortResult
@@ -131,9 +132,11 @@ class CohortResultViewSet(NestedViewSetMixin, UserObjectsRestrictedViewSet):
         else:
             response = super().partial_update(request, *args, **kwargs)
             cohort_service.handle_cohort_post_update(cohort=cohort, caller=request.user.username)
-            if cohort.export_table.exists():
-                export_service.check_all_cohort_subsets_created(export=cohort.export_table.first().export)
         cohort_service.ws_send_to_client(cohort=cohort)
+        if cohort.is_subset and JobStatus(cohort.request_job_status).is_end_state:
+            export_table = cohort.export_table.select_related("export").first()
+            if export_table is not None:
+                export_service.check_all_cohort_subsets_created(export=export_table.export)
         return response
 
     @action(methods=["get"], detail=False, url_path="jobs/active")
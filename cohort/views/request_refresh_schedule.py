@@ -33,5 +33,5 @@ class RequestRefreshScheduleViewSet(UserObjectsRestrictedViewSet):
     @extend_schema(responses={status.HTTP_200_OK: RequestRefreshScheduleSerializer})
     def partial_update(self, request, *args, **kwargs):
         response = super().partial_update(request, *args, **kwargs)
-        requests_refresher_service.reset_schedule_crontab(refresh_schedule=self.get_object())
+        requests_refresher_service.reset_next_refresh(refresh_schedule=self.get_object())
         return response
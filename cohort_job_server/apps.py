@@ -10,6 +10,9 @@ class CohortJobServerConfig(AppConfig):
 
     USE_SOLR = env.get("USE_SOLR", "False").lower() == "true"
     TEST_FHIR_QUERIES = env.get("TEST_FHIR_QUERIES", "False").lower() == "true"
+    FHIR_TERMINOLOGY_VERSION = env.get("FHIR_TERMINOLOGY_VERSION", "")
+    FHIR_TO_SOLR_CACHE_TIMEOUT = int(env.get("FHIR_TO_SOLR_CACHE_TIMEOUT", 24 * 60 * 60))
+    FHIR_TRANSLATION_MAX_WORKERS = int(env.get("FHIR_TRANSLATION_MAX_WORKERS", 8))
 
     COHORT_OPERATORS = [
         {"TYPE": "count", "OPERATOR_CLASS": "cohort_job_server.cohort_counter.CohortCounter"},
@@ -13,6 +13,7 @@ from cohort_job_server.query_executor_api import (
     query_executor_status_mapper,
     QueryExecutorClient,
     CohortQuery,
+    BaseCohortRequest,
 )
 from cohort_job_server.utils import _logger, JOB_STATUS, COUNT, MINIMUM, MAXIMUM, EXTRA, ERR_MESSAGE
 
@@ -40,6 +41,12 @@ class CohortCounter(BaseCohortOperator):
         cohort_count = CohortCount(instance_id=dm_id, json_query=json_query, auth_headers=auth_headers)
         return cohort_count.create_query_executor_request(cohort_query=cohort_query)
 
+    @staticmethod
+    def is_count_pseudo_read(json_query: str, owner_username: str) -> bool:
+        cohort_query = CohortQuery(**json.loads(json_query))
+        source_population = cohort_query.source_population and cohort_query.source_population.care_site_cohort_list or []
+        return BaseCohortRequest.is_cohort_request_pseudo_read(username=owner_username, source_population=source_population)
+
     @staticmethod
     def refresh_dated_measure_count(translated_query: str) -> None:
         QueryExecutorClient().count(input_payload=translated_query)
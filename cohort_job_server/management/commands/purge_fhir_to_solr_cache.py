@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cohort_job_server.query_executor_api.query_formatter import fhir_to_solr_cache
+
+
+class Command(BaseCommand):
+    help = "Purge the FHIR to Solr criteria translation cache of all workers, to be run once the FHIR server is redeployed"
+
+    def handle(self, *args, **options):
+        fhir_to_solr_cache.bump_generation()
+        self.stdout.write("FHIR to Solr translation cache purged")
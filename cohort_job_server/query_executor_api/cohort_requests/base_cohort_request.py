@@ -3,9 +3,7 @@ from __future__ import annotations
 import logging
 from typing import TYPE_CHECKING, List, Optional
 
-from accesses.models import Perimeter
 from accesses.services.accesses import accesses_service
-from admin_cohort.models import User
 from cohort_job_server.query_executor_api.exceptions import FhirException
 from cohort_job_server.query_executor_api.schemas import ModeOptions
 from cohort_job_server.query_executor_api.query_executor_client import format_spark_job_request_for_query_executor
@@ -45,9 +43,7 @@ class BaseCohortRequest:
 
     @staticmethod
     def is_cohort_request_pseudo_read(username: str, source_population: List[int]) -> bool:
-        user = User.objects.filter(pk=username).first()
-        perimeters = Perimeter.objects.filter(cohort_id__in=source_population)
-        return not accesses_service.user_can_access_at_least_one_target_perimeter_in_nomi(user=user, target_perimeters=perimeters)
+        return accesses_service.is_user_read_pseudo_only(username=username, cohorts_ids=source_population)
 
     def create_query_executor_request(self, cohort_query: CohortQuery) -> str:
         """Format the given query with the Fhir nomenclature and return a dict to be sent
@@ -5,16 +5,17 @@ import logging
 import os
 from typing import TYPE_CHECKING
 
-import requests
 from requests import Response
 
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
+from admin_cohort.tools.http_client import HttpClient
 
 if TYPE_CHECKING:
     from cohort_job_server.query_executor_api import CohortQuery, SparkJobObject
 
 _logger = logging.getLogger("info")
 
+query_executor_http_client = HttpClient(service="query_executor")
+
 
 class QueryExecutorClient:
     APP_NAME = "omop-spark-job"
@@ -29,14 +30,14 @@ class QueryExecutorClient:
 
     def count(self, input_payload: str) -> Response:
         params = {"appName": self.APP_NAME, "classPath": self.COUNT_CLASSPATH, "context": self.CONTEXT}
-        return requests.post(self.api_url, params=params, data=input_payload, timeout=HTTP_REQUEST_TIMEOUT)
+        return query_executor_http_client.post(self.api_url, params=params, data=input_payload)
 
     def create(self, input_payload: str) -> Response:
         params = {"appName": self.APP_NAME, "classPath": self.CREATE_CLASSPATH, "context": self.CONTEXT, "sync": "false"}
-        return requests.post(self.api_url, params=params, data=input_payload, timeout=HTTP_REQUEST_TIMEOUT)
+        return query_executor_http_client.post(self.api_url, params=params, data=input_payload)
 
     def delete(self, job_id: str) -> Response:
-        return requests.delete(f"{self.api_url}/{job_id}", timeout=HTTP_REQUEST_TIMEOUT)
+        return query_executor_http_client.delete(f"{self.api_url}/{job_id}")
 
 
 def replace_pattern(text: str, replacements: list[tuple[str, str]]) -> str:
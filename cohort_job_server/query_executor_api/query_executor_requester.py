@@ -1,4 +1,5 @@
 import json
+import time
 from typing import Type, Callable
 
 from django.db.models import Model
@@ -26,6 +27,7 @@ class QueryExecutorRequester:
         _logger = cohort_request.log
         instance_id = cohort_request.instance_id
         json_query = cohort_request.json_query
+        start = time.perf_counter()
         try:
             _logger(msg=f"Converting the json query: {json_query}")
             cohort_query = CohortQuery(instance_id=instance_id, **json.loads(json_query))
@@ -36,7 +38,7 @@ class QueryExecutorRequester:
         else:
             response_data = {"success": True, **response.json()}
         response = QueryExecutorResponse(**response_data)
-        _logger(msg=f"Received Query Executor response {response.__dict__}")
+        _logger(msg=f"Received Query Executor response {response.__dict__} after {(time.perf_counter() - start) * 1000:.0f}ms")
         if instance_id is not None and cohort_request.model is not None:
             self.update_request_instance(cohort_request.model, instance_id, response)
         _logger(msg=f"Done: {response.success and f'{cohort_request.model.__name__} updated' or response.err_msg}")
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import contextvars
+import hashlib
+import json
 import logging
 import os
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from typing import TYPE_CHECKING
 
-import requests
 from django.conf import settings
 
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
 from admin_cohort.middleware.context_request_middleware import get_trace_id
+from admin_cohort.tools.cache import GenerationalCache
+from admin_cohort.tools.http_client import HttpClient
 from cohort_job_server.apps import CohortJobServerConfig
 from cohort_job_server.query_executor_api.enums import CriteriaType, ResourceType
 from cohort_job_server.query_executor_api.exceptions import FhirException
@@ -24,6 +29,17 @@ META_SECURITY_PSEUDED = "meta.security=http://terminology.hl7.org/CodeSystem/v3-
 
 _logger = logging.getLogger("info")
 
+fhir_http_client = HttpClient(service="fhir")
+
+FHIR_TO_SOLR_CACHE_VERSION_KEY = "cohort_job_server.fhir_to_solr.version"
+
+fhir_to_solr_cache = GenerationalCache(
+    namespace="cohort_job_server.fhir_to_solr",
+    generation_key=FHIR_TO_SOLR_CACHE_VERSION_KEY,
+    maxsize=4096,
+    timeout=CohortJobServerConfig.FHIR_TO_SOLR_CACHE_TIMEOUT,
+)
+
 
 def query_fhir(resource: str, params: dict[str, list[str]], auth_headers: dict) -> FhirParameters:
     url = f"{FHIR_URL}/{resource}/$query"
@@ -32,14 +48,15 @@ def query_fhir(resource: str, params: dict[str, list[str]], auth_headers: dict)
     if CohortJobServerConfig.TEST_FHIR_QUERIES:
         url_test = f"{FHIR_URL}/{resource}"
         _logger.info(f"Testing real fhir query with {url_test=} {params=}")
-        response = requests.get(url_test, params={**params, "_count": 0}, headers=auth_headers, timeout=HTTP_REQUEST_TIMEOUT)
+        response = fhir_http_client.get(url_test, params={**params, "_count": 0}, headers=auth_headers)
         response.raise_for_status()
 
     _logger.info(f"Attempting to query fhir with {url=} {params=}")
 
-    auth_headers[settings.TRACE_ID_HEADER] = get_trace_id()
+    # copied as the same headers are shared by the concurrent translations of a query
+    headers = {**auth_headers, settings.TRACE_ID_HEADER: get_trace_id()}
 
-    response = requests.get(url, params=params, headers=auth_headers, timeout=HTTP_REQUEST_TIMEOUT)
+    response = fhir_http_client.get(url, params=params, headers=headers)
     response.raise_for_status()
     result = response.json()
     return FhirParameters(**result)
@@ -58,25 +75,46 @@ class QueryFormatter:
 
     def format_to_fhir(self, cohort_query: CohortQuery, is_pseudo: bool) -> Criteria | None:
 
-        def build_solr_criteria(criteria: Criteria, source_population: SourcePopulation) -> Criteria | None:
-            if criteria is None:
-                return None
-
+        def collect_basic_criteria(criteria: Criteria, source_population: SourcePopulation) -> list[Criteria]:
             if criteria.criteria_type == CriteriaType.BASIC_RESOURCE:
                 filter_fhir_enriched = add_security_params_to_filter_fhir(criteria, source_population, is_pseudo)
-
                 _logger.info(f"filterFhirEnriched {filter_fhir_enriched}")
-
-                if CohortJobServerConfig.USE_SOLR:
-                    solr_filter = self.get_mapping_criteria_filter_fhir_to_solr(criteria.filter_fhir, criteria.resource_type)
-                    criteria.filter_solr = solr_filter
-                return criteria
-
-            for sub_criteria in criteria.criteria:
-                build_solr_criteria(sub_criteria, source_population)
-            return criteria
-
-        return build_solr_criteria(cohort_query.criteria, cohort_query.source_population)
+                return [criteria]
+            return [c for sub_criteria in criteria.criteria for c in collect_basic_criteria(sub_criteria, source_population)]
+
+        criteria = cohort_query.criteria
+        if criteria is None:
+            return None
+        basic_criteria = collect_basic_criteria(criteria, cohort_query.source_population)
+        if CohortJobServerConfig.USE_SOLR:
+            self.translate_criteria_to_solr(basic_criteria)
+            _logger.info(f"FHIR to Solr translation cache stats: {fhir_to_solr_cache.get_stats()}")
+        return criteria
+
+    def translate_criteria_to_solr(self, basic_criteria: list[Criteria]) -> None:
+        """
+        Identical criteria are translated once. Distinct ones are translated concurrently, each in a copy of the
+        current context (trace id). The first failure, in the criteria tree order, is raised.
+        """
+        criteria_per_filter: dict[tuple[ResourceType, str], list[Criteria]] = {}
+        for criteria in basic_criteria:
+            criteria_per_filter.setdefault((criteria.resource_type, criteria.filter_fhir), []).append(criteria)
+        if not criteria_per_filter:
+            return
+        start = time.perf_counter()
+        max_workers = min(len(criteria_per_filter), CohortJobServerConfig.FHIR_TRANSLATION_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fhir-to-solr") as executor:
+            translations = [
+                executor.submit(contextvars.copy_context().run, self.get_mapping_criteria_filter_fhir_to_solr, filter_fhir, resource_type)
+                for resource_type, filter_fhir in criteria_per_filter
+            ]
+        for criteria_list, translation in zip(criteria_per_filter.values(), translations):
+            solr_filter = translation.result()
+            for criteria in criteria_list:
+                criteria.filter_solr = solr_filter
+        _logger.info(
+            f"{len(basic_criteria)} criteria ({len(criteria_per_filter)} distinct) translated to Solr in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
 
     def get_mapping_criteria_filter_fhir_to_solr(self, filter_fhir: str, original_resource_type: ResourceType) -> str:
 
@@ -104,9 +142,8 @@ class QueryFormatter:
     def remove_identifier(self, filter_fhir: str) -> str:
         return "&".join([s for s in filter_fhir.split("&") if self.IDENTIFIER_VALUE not in s])
 
-    def call_fhir_resource(self, resource_type: ResourceType, filter_fhir: str) -> dict:
-        if not resource_type:
-            raise FhirException(f"Resource type does not exist {resource_type=}, {filter_fhir=}")
+    @staticmethod
+    def parse_filter_fhir(filter_fhir: str) -> dict[str, list[str]]:
         fhir_params: dict[str, list[str]] = {}
         if filter_fhir:
             params = filter_fhir.split("&")
@@ -120,9 +157,25 @@ class QueryFormatter:
                     fhir_params[key].append(decoded_value)
                 else:
                     fhir_params[key] = [decoded_value]
-        params = query_fhir(resource_type, fhir_params, self.auth_headers)
-        _logger.info(f"output: {params}")
-        return params.to_dict()
+        return fhir_params
+
+    @staticmethod
+    def get_translation_cache_key(resource_type: ResourceType, fhir_params: dict[str, list[str]]) -> str:
+        """content-addressed key: the order of the distinct params and the encoding of their values do not matter"""
+        content = [resource_type, CohortJobServerConfig.FHIR_TERMINOLOGY_VERSION, sorted(fhir_params.items())]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    def call_fhir_resource(self, resource_type: ResourceType, filter_fhir: str) -> dict:
+        if not resource_type:
+            raise FhirException(f"Resource type does not exist {resource_type=}, {filter_fhir=}")
+        fhir_params = self.parse_filter_fhir(filter_fhir)
+
+        def translate() -> dict:
+            params = query_fhir(resource_type, fhir_params, self.auth_headers)
+            _logger.info(f"output: {params}")
+            return params.to_dict()
+
+        return fhir_to_solr_cache.get_or_set(key=self.get_translation_cache_key(resource_type, fhir_params), compute=translate)
 
     def merge_fq(self, full_query, ipp_list_filter) -> str:
         if ipp_list_filter is None:
@@ -10,6 +10,7 @@ from cohort_job_server.apps import CohortJobServerConfig
 from cohort_job_server.query_executor_api import QueryFormatter, BaseCohortRequest
 from cohort_job_server.query_executor_api.enums import ResourceType
 from cohort_job_server.query_executor_api.exceptions import FhirException
+from cohort_job_server.query_executor_api.query_formatter import fhir_to_solr_cache
 from cohort_job_server.query_executor_api.schemas import FhirParameters, FhirParameter, CohortQuery
 
 
@@ -122,6 +123,7 @@ class TestQueryFormatter(TestCase):
             ],
         )
         CohortJobServerConfig.USE_SOLR = True
+        fhir_to_solr_cache.bump_generation()
 
     @mock.patch("cohort_job_server.query_executor_api.query_formatter.query_fhir")
     def test_format_to_fhir_simple_query(self, query_fhir):
@@ -162,6 +164,42 @@ class TestQueryFormatter(TestCase):
         )
         self.assertEqual("patient-active=true&codeList=A00-B99", res_criteria.filter_fhir)
 
+    @mock.patch("cohort_job_server.query_executor_api.query_formatter.query_fhir")
+    def test_format_to_fhir_translates_distinct_criteria_once(self, query_fhir):
+        def translate(resource, params, auth_headers):
+            fq = "&".join(f"fq={key}:{'|'.join(values)}" for key, values in params.items())
+            return FhirParameters(resourceType=resource, parameter=[FhirParameter(name="fq", valueString=f"{resource}:{fq}")])
+
+        query_fhir.side_effect = translate
+        res = self.query_formatter.format_to_fhir(self.cohort_query_complex, False)
+        self.assertEqual(query_fhir.call_count, 7)
+        duplicated_criteria, nested_duplicated_criteria = res.criteria[2], res.criteria[4].criteria[0]
+        self.assertEqual(duplicated_criteria.filter_solr, "Condition:fq=patient-active:true&fq=codeList:G00-G99")
+        self.assertEqual(nested_duplicated_criteria.filter_solr, duplicated_criteria.filter_solr)
+        self.assertEqual(res.criteria[1].filter_solr, "Condition:fq=patient-active:true&fq=codeList:A00-B99")
+        self.assertEqual(res.criteria[5].criteria[1].filter_solr, "MedicationRequest:fq=patient-active:true")
+
+    @mock.patch("cohort_job_server.query_executor_api.query_formatter.query_fhir")
+    def test_fhir_to_solr_translation_is_cached(self, query_fhir):
+        query_fhir.return_value = self.mocked_query_fhir_result
+        local_hits = fhir_to_solr_cache.get_stats()["local_hits"]
+        self.query_formatter.format_to_fhir(self.cohort_query_simple, False)
+        self.query_formatter.format_to_fhir(self.cohort_query_simple, True)
+        query_fhir.assert_called_once()
+        self.assertEqual(fhir_to_solr_cache.get_stats()["local_hits"], local_hits + 1)
+        fhir_to_solr_cache.bump_generation()
+        self.query_formatter.format_to_fhir(self.cohort_query_simple, False)
+        self.assertEqual(query_fhir.call_count, 2)
+
+    def test_translation_cache_key_is_normalised(self):
+        get_key = self.query_formatter.get_translation_cache_key
+        parse = self.query_formatter.parse_filter_fhir
+        key = get_key(ResourceType.CONDITION, parse("patient-active=true&codeList=A00-B99"))
+        self.assertEqual(key, get_key(ResourceType.CONDITION, parse("codeList=A00%2DB99&patient-active=true&")))
+        self.assertNotEqual(key, get_key(ResourceType.PATIENT, parse("patient-active=true&codeList=A00-B99")))
+        with mock.patch.object(CohortJobServerConfig, "FHIR_TERMINOLOGY_VERSION", "v2"):
+            self.assertNotEqual(key, get_key(ResourceType.CONDITION, parse("patient-active=true&codeList=A00-B99")))
+
     def test_cohort_request_pseudo_read(self):
         user1 = User.objects.create(firstname="Test", lastname="USER", email="test.user@aphp.fr", username="1111111")
         read_in_pseudo = BaseCohortRequest.is_cohort_request_pseudo_read(username=user1.username, source_population=[])
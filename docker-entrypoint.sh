@@ -80,7 +80,16 @@ fi
 if [ "$WITHOUT_APP_SERVER" = false ]; then
   python manage.py collectstatic --noinput
 
-  celery -A admin_cohort worker $WITH_CELERY_BEAT --loglevel=INFO --logfile=log/celery.log &
+  if [ "${CELERY_ROUTING_ENABLED:-true}" = true ]; then
+    # One worker per queue family, so that batch jobs never hold up the interactive ones
+    celery -A admin_cohort worker $WITH_CELERY_BEAT -n default@%h -Q celery,notifications --concurrency="${CELERY_DEFAULT_CONCURRENCY:-2}" --loglevel=INFO --logfile=log/celery.log &
+    celery -A admin_cohort worker -n interactive@%h -Q interactive --concurrency="${CELERY_INTERACTIVE_CONCURRENCY:-8}" --loglevel=INFO --logfile=log/celery.interactive.log &
+    celery -A admin_cohort worker -n long_pending@%h -Q long_pending --concurrency="${CELERY_LONG_PENDING_CONCURRENCY:-2}" --loglevel=INFO --logfile=log/celery.long_pending.log &
+    celery -A admin_cohort worker -n batch@%h -Q batch --concurrency="${CELERY_BATCH_CONCURRENCY:-2}" --loglevel=INFO --logfile=log/celery.batch.log &
+    celery -A admin_cohort worker -n exports@%h -Q exports --concurrency="${CELERY_EXPORTS_CONCURRENCY:-2}" --loglevel=INFO --logfile=log/celery.exports.log &
+  else
+    celery -A admin_cohort worker $WITH_CELERY_BEAT --loglevel=INFO --logfile=log/celery.log &
+  fi
   sleep 5
 
   # For websockets
@@ -1,9 +1,7 @@
 import logging
 from typing import Literal
 
-import requests
-
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
+from admin_cohort.tools.http_client import HttpClient
 from exporters.apps import ExportersConfig
 
 _logger = logging.getLogger("django.request")
@@ -11,6 +9,7 @@ _logger = logging.getLogger("django.request")
 
 class BaseAPI:
     conf_key: Literal["HADOOP_API", "EXPORT_API"]
+    http_client: HttpClient
 
     def __init__(self):
         self.api_conf = ExportersConfig.THIRD_PARTY_API_CONF.get(self.conf_key)
@@ -20,10 +19,5 @@ class BaseAPI:
 
     def get_export_logs(self, job_id: str) -> dict:
         params = {"task_uuid": job_id, "return_out_logs": True, "return_err_logs": True}
-        response = requests.get(
-            url=f"{self.url}{self.task_status_endpoint}",
-            params=params,
-            headers={"auth-token": self.auth_token},
-            timeout=HTTP_REQUEST_TIMEOUT,
-        )
+        response = self.http_client.get(url=f"{self.url}{self.task_status_endpoint}", params=params, headers={"auth-token": self.auth_token})
         return response.json()
@@ -3,12 +3,11 @@ from io import BytesIO
 from typing import Union
 from uuid import UUID
 
-import requests
 import yaml
 from django.http import JsonResponse
 from rest_framework import status
 
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
+from admin_cohort.tools.http_client import HttpClient
 from exporters.apis.base import BaseAPI
 
 
@@ -17,6 +16,7 @@ _logger = logging.getLogger("django.request")
 
 class ExportAPI(BaseAPI):
     conf_key = "EXPORT_API"
+    http_client = HttpClient(service="export_api")
 
     def __init__(self):
         super().__init__()
@@ -32,11 +32,10 @@ class ExportAPI(BaseAPI):
         except yaml.YAMLError as e:
             _logger.error(f"Export[{export_id}] Error generating the yaml config from export params")
             raise e
-        response = requests.post(
+        response = self.http_client.post(
             url=f"{self.url}/yaml",
             files={"yaml_file": ("yaml_file.yaml", yaml_file, "application/x-yaml")},
             headers={"auth-token": self.auth_token},
-            timeout=HTTP_REQUEST_TIMEOUT,
         )
         if response.status_code == status.HTTP_200_OK:
             return response.json().get("task_id")
@@ -1,10 +1,9 @@
 import logging
 
-import requests
 from requests import RequestException, Response
 from rest_framework import status
 
-from admin_cohort.http_timeout import HTTP_REQUEST_TIMEOUT
+from admin_cohort.tools.http_client import HttpClient
 from exporters.apis.base import BaseAPI
 
 _logger = logging.getLogger("django.request")
@@ -12,6 +11,7 @@ _logger = logging.getLogger("django.request")
 
 class HadoopAPI(BaseAPI):
     conf_key = "HADOOP_API"
+    http_client = HttpClient(service="hadoop_api")
 
     def __init__(self):
         super().__init__()
@@ -35,9 +35,4 @@ class HadoopAPI(BaseAPI):
             raise RequestException(f"Granting rights did not succeed: {response.get('err')}")
 
     def query_hadoop(self, endpoint: str, params: dict) -> Response:
-        return requests.post(
-            url=f"{self.url}{endpoint}",
-            params=params,
-            headers={"auth-token": self.auth_token},
-            timeout=HTTP_REQUEST_TIMEOUT,
-        )
+        return self.http_client.post(url=f"{self.url}{endpoint}", params=params, headers={"auth-token": self.auth_token})
@@ -1,5 +1,4 @@
 import logging
-import time
 from typing import Any, List
 
 from django.utils import timezone
@@ -13,11 +12,19 @@ from exporters.enums import APIJobType, status_mapper
 from exports.emails import check_email_address
 from exports.models import Export, ExportTable
 from exports.services.rights_checker import rights_checker
-from exporters.tasks import notify_export_received, notify_export_succeeded, notify_export_failed
+from exporters.tasks import notify_export_received, notify_export_succeeded, notify_export_failed, track_export_job
 
 _celery_logger = logging.getLogger("celery.app")
 _logger = logging.getLogger("django.request")
 
+JOB_STATUS_CHECK_COUNTDOWN = 10
+JOB_STATUS_CHECK_MAX_COUNTDOWN = 120
+JOB_STATUS_CHECK_MAX_ERRORS = 5
+
+
+def get_job_status_check_countdown(attempt: int) -> int:
+    return int(min(JOB_STATUS_CHECK_COUNTDOWN * 1.5**attempt, JOB_STATUS_CHECK_MAX_COUNTDOWN))
+
 
 class BaseExporter:
     def __init__(self):
@@ -58,24 +65,18 @@ class BaseExporter:
 
     def handle_export(self, export: Export, params: dict | None = None) -> None:
         self.log_export_task(export.pk, "Sending request to the Export API.")
-        start_time = timezone.now()
         try:
             params = {**(params or {}), "overwrite": True}
             job_id = self.send_export(export=export, params=params)
             if job_id is None:
                 raise RequestException(f"Got an invalid Job ID: `{job_id}`")
-            export.request_job_status = JobStatus.pending
-            export.request_job_id = job_id
-            export.save()
-            self.log_export_task(export.pk, f"Request sent, job `{job_id}` is now {JobStatus.pending}")
-            self.wait_for_export_job(export)
         except RequestException as e:
             self.mark_export_as_failed(export=export, reason=f"Export terminated with an error: {e}")
             return
-        export.request_job_duration = str(timezone.now() - start_time)
-        export.save()
-        self.log_export_task(export.pk, "Export job finished")
-        self.confirm_export_succeeded(export=export)
+        export.request_job_status = JobStatus.pending
+        export.request_job_id = job_id
+        self.track_job(export=export, job_id=job_id, job_type=APIJobType.EXPORT)
+        self.log_export_task(export.pk, f"Request sent, job `{job_id}` is now {JobStatus.pending}")
 
     def build_tables_input(self, export) -> List[dict[str, str]]:
         required_table_name = self.export_api.required_table
@@ -113,42 +114,70 @@ class BaseExporter:
             params["pseudo"] = export.datalab.name
         return self.export_api.launch_export(export_id=export.uuid, params=params)
 
-    def wait_for_export_job(self, export: Export) -> None:
-        job_status = self.wait_for_job(export=export, job_id=export.request_job_id, job_type=APIJobType.EXPORT)
-        export.request_job_status = job_status.value
+    def track_job(self, export: Export, job_id: str, job_type: APIJobType) -> None:
+        export.tracked_job_id = job_id
+        export.tracked_job_type = job_type
+        export.tracked_job_started_at = timezone.now()
+        export.save()
+        self.schedule_job_status_check(export=export, attempt=0, errors_count=0)
+
+    @staticmethod
+    def schedule_job_status_check(export: Export, attempt: int, errors_count: int) -> None:
+        track_export_job.apply_async(
+            kwargs={"export_id": export.pk, "job_id": export.tracked_job_id, "attempt": attempt, "errors_count": errors_count},
+            countdown=get_job_status_check_countdown(attempt),
+        )
+
+    def get_job_status(self, job_id: str, job_type: APIJobType) -> JobStatus:
+        target_api: Any
+        if job_type == APIJobType.EXPORT:
+            target_api = self.export_api
+        elif job_type == APIJobType.HIVE_DB_CREATE:
+            target_api = self.hadoop_api
+        else:
+            raise ValueError(f"No configured API found matching the job type `{job_type}`")
+        logs_response = target_api.get_export_logs(job_id=job_id)
+        return status_mapper.get(logs_response.get("task_status"), JobStatus.unknown)
+
+    def check_job_status(self, export: Export, job_id: str, attempt: int, errors_count: int) -> None:
+        """
+        Check once the status of the job tracked by the export, then either schedule the next check (with backoff)
+        or move the export to its next step. The export is only saved when the job status changes.
+        """
+        if export.tracked_job_id != job_id or export.request_job_status == JobStatus.failed:
+            self.log_export_task(export.pk, f"Job `{job_id}` is no longer tracked")
+            return
+        job_type = APIJobType(export.tracked_job_type)
+        self.log_export_task(export.pk, f"Asking for status of job `{job_id}`")
+        try:
+            job_status = self.get_job_status(job_id=job_id, job_type=job_type)
+        except RequestException as e:
+            errors_count += 1
+            if errors_count >= JOB_STATUS_CHECK_MAX_ERRORS:
+                self.on_job_failed(export=export, job_type=job_type, reason=f"Could not get the status of job `{job_id}`: {e}")
+                return
+        else:
+            if job_status != export.request_job_status:
+                self.log_export_task(export.pk, f"Job `{job_id}` is {job_status}")
+                export.request_job_status = job_status
+                export.save(update_fields=["request_job_status", "modified_at"])
+            if job_status.is_end_state:
+                if job_status == JobStatus.finished:
+                    self.on_job_finished(export=export, job_type=job_type)
+                else:
+                    self.on_job_failed(export=export, job_type=job_type, reason=f"Job `{job_id}` ended with status `{job_status}`")
+                return
+        self.schedule_job_status_check(export=export, attempt=attempt + 1, errors_count=errors_count)
+
+    def on_job_finished(self, export: Export, job_type: APIJobType) -> None:
+        if export.tracked_job_started_at is not None:
+            export.request_job_duration = str(timezone.now() - export.tracked_job_started_at)
         export.save()
+        self.log_export_task(export.pk, "Export job finished")
+        self.confirm_export_succeeded(export=export)
 
-    def wait_for_job(self, export: Export, job_id: str, job_type: APIJobType) -> JobStatus:
-        errors_count = 0
-        job_status = JobStatus.pending
-
-        while errors_count < 5 and not job_status.is_end_state:
-            time.sleep(10)
-            self.log_export_task(export.uuid, f"Asking for status of job `{job_id}`")
-            target_api: Any
-            if job_type == APIJobType.EXPORT:
-                target_api = self.export_api
-            elif job_type == APIJobType.HIVE_DB_CREATE:
-                target_api = self.hadoop_api
-            else:
-                target_api = None
-            try:
-                if target_api is None:
-                    raise RequestException("No API for job type")
-                logs_response = target_api.get_export_logs(job_id=job_id)
-                job_status = status_mapper.get(logs_response.get("task_status"), JobStatus.unknown)
-                self.log_export_task(export.uuid, f"Job `{job_id}` is {job_status}")
-                export.request_job_status = job_status.value
-                export.save()
-            except AttributeError as e:
-                logging.error(f"No configured API found matching the job type `{job_type}`")
-                raise e
-            except RequestException:
-                errors_count += 1
-
-        if job_status != JobStatus.finished:
-            raise RequestException(f"Job `{job_id}` ended with status `{job_status}`")
-        return job_status
+    def on_job_failed(self, export: Export, job_type: APIJobType, reason: str) -> None:
+        self.mark_export_as_failed(export=export, reason=f"Export terminated with an error: {reason}")
 
     @staticmethod
     def confirm_export_received(export: Export) -> None:
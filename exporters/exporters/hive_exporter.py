@@ -56,48 +56,49 @@ class HiveExporter(BaseExporter):
         self.confirm_export_received(export=export)
         try:
             _logger.info(f"Export[{export.pk}] Preparing database...")
-            self.prepare_db(export)
-            _logger.info(f"Export[{export.pk}] Database preparation completed successfully")
+            self.create_db(export)
         except RequestException as e:
             _logger.error(f"Export[{export.pk}] Failed to prepare database: {e}")
             self.mark_export_as_failed(export=export, reason=f"Error while preparing DB for export: {e}")
+
+    def on_job_finished(self, export: Export, job_type: APIJobType) -> None:
+        if job_type == APIJobType.HIVE_DB_CREATE:
+            self.log_export_task(export.pk, f"DB '{export.target_name}' created.")
+            try:
+                _logger.info(f"Export[{export.pk}] Changing database ownership to user '{self.user}'")
+                self.change_db_ownership(export=export, db_user=self.user)
+            except RequestException as e:
+                _logger.error(f"Export[{export.pk}] Failed to prepare database: {e}")
+                self.mark_export_as_failed(export=export, reason=f"Error while preparing DB for export: {e}")
+                return
+            _logger.info(f"Export[{export.pk}] Database preparation completed successfully")
+            super().handle_export(export=export, params={"output": {"type": self.type, "databaseName": export.target_name}})
         else:
-            params = params or {"output": {"type": self.type, "databaseName": export.target_name}}
-            _logger.info(f"Export[{export.pk}] Calling parent handle_export with params: {params}")
-            super().handle_export(export=export, params=params)
             _logger.info(f"Export[{export.pk}] Concluding export...")
-            self.conclude_export(export=export)
+            if self.conclude_export(export=export):
+                super().on_job_finished(export=export, job_type=job_type)
             _logger.info(f"Export[{export.pk}] Hive export process finished")
 
-    def prepare_db(self, export: Export) -> None:
-        _logger.info(f"Export[{export.pk}] prepare_db: Creating database")
-        self.create_db(export=export)
-        _logger.info(f"Export[{export.pk}] prepare_db: Changing database ownership to user '{self.user}'")
-        self.change_db_ownership(export=export, db_user=self.user)
-        _logger.info(f"Export[{export.pk}] prepare_db: Database preparation steps completed")
+    def on_job_failed(self, export: Export, job_type: APIJobType, reason: str) -> None:
+        if job_type == APIJobType.HIVE_DB_CREATE:
+            self.mark_export_as_failed(export=export, reason=f"Error while preparing DB for export: {reason}")
+        else:
+            super().on_job_failed(export=export, job_type=job_type, reason=reason)
 
     @staticmethod
     def get_db_location(export: Export) -> str:
         return f"{export.target_full_path}.db"
 
     def create_db(self, export: Export) -> None:
-        _logger.info(f"Export[{export.pk}] create_db: Starting database creation")
         db_location = self.get_db_location(export=export)
-        _logger.info(f"Export[{export.pk}] create_db: DB location resolved to '{db_location}'")
         self.log_export_task(export.pk, f"Creating DB '{export.target_name}', location: {db_location}")
         try:
-            _logger.info(f"Export[{export.pk}] create_db: Calling hadoop_api.create_db(name='{export.target_name}')")
             job_id = self.hadoop_api.create_db(name=export.target_name, location=db_location)
-            _logger.info(f"Export[{export.pk}] create_db: Received job_id='{job_id}'")
-            self.log_export_task(export.pk, f"Received Hive DB creation job_id: {job_id}")
-            _logger.info(f"Export[{export.pk}] create_db: Waiting for job completion...")
-            self.wait_for_job(export=export, job_id=job_id, job_type=APIJobType.HIVE_DB_CREATE)
-            _logger.info(f"Export[{export.pk}] create_db: Job completed successfully")
         except RequestException as e:
             _logger.error(f"Export[{export.pk}] create_db: Error on call to create Hive DB: {e}")
             raise e
-        self.log_export_task(export.pk, f"DB '{export.target_name}' created.")
-        _logger.info(f"Export[{export.pk}] create_db: Database '{export.target_name}' created successfully")
+        self.log_export_task(export.pk, f"Received Hive DB creation job_id: {job_id}")
+        self.track_job(export=export, job_id=job_id, job_type=APIJobType.HIVE_DB_CREATE)
 
     def change_db_ownership(self, export: Export, db_user: str) -> None:
         try:
@@ -106,10 +107,12 @@ class HiveExporter(BaseExporter):
         except RequestException as e:
             raise RequestException(f"Error granting `{db_user}` rights on DB `{export.target_name}` - {e}")
 
-    def conclude_export(self, export: Export) -> None:
+    def conclude_export(self, export: Export) -> bool:
         db_user = export.datalab.name
         try:
             self.change_db_ownership(export=export, db_user=db_user)
             self.log_export_task(export.pk, f"Export concluded: DB '{export.target_name}' attributed to {db_user}.")
         except RequestException as e:
             self.mark_export_as_failed(export=export, reason=f"Could not conclude export: {e}")
+            return False
+        return True
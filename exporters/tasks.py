@@ -6,6 +6,7 @@ from django.conf import settings
 
 from exports.models import Export
 from exports.emails import push_email_notification
+from exports.services.export_operators import ExportManager
 from exporters.notifications import (
     export_failed_notif_for_owner,
     export_failed_notif_for_admins,
@@ -35,6 +36,11 @@ def get_selected_tables(export: Export) -> list[str]:
     return list(export.export_tables.values_list("name", flat=True))
 
 
+@shared_task
+def track_export_job(export_id: str, job_id: str, attempt: int = 0, errors_count: int = 0) -> None:
+    ExportManager().check_job_status(export_id=export_id, job_id=job_id, attempt=attempt, errors_count=errors_count)
+
+
 @shared_task
 def notify_export_received(export_id: str) -> None:
     export = get_export_by_id(export_id)
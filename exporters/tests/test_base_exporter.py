@@ -1,7 +1,10 @@
 from unittest import mock
 
-from exporters.exporters.base_exporter import BaseExporter
-from exporters.enums import ExportTypes
+from requests import RequestException
+
+from admin_cohort.types import JobStatus
+from exporters.exporters.base_exporter import BaseExporter, JOB_STATUS_CHECK_MAX_ERRORS
+from exporters.enums import APIJobType, ExportTypes
 from exporters.tests.base_test import ExportersTestBase
 
 
@@ -39,3 +42,42 @@ class TestBaseExporter(ExportersTestBase):
         self.assertIn("target_name", export_data)
         self.assertIn("target_location", export_data)
         self.assertNotIn("\n", export_data["motivation"])
+
+    def track_export_job(self, job_id: str = "some-job-id") -> None:
+        with mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async"):
+            self.exporter.track_job(export=self.csv_export, job_id=job_id, job_type=APIJobType.EXPORT)
+
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
+    def test_next_job_status_check_is_scheduled_with_backoff(self, mock_track_export_job):
+        self.track_export_job()
+        self.exporter.export_api = mock.MagicMock()
+        self.exporter.export_api.get_export_logs.return_value = {"task_status": "Running"}
+        with mock.patch.object(self.csv_export, "save") as mock_save:
+            self.exporter.check_job_status(export=self.csv_export, job_id="some-job-id", attempt=0, errors_count=0)
+            self.exporter.check_job_status(export=self.csv_export, job_id="some-job-id", attempt=1, errors_count=0)
+        mock_save.assert_called_once()
+        self.assertEqual(self.csv_export.request_job_status, JobStatus.started)
+        countdowns = [call.kwargs["countdown"] for call in mock_track_export_job.call_args_list]
+        self.assertLess(countdowns[0], countdowns[1])
+        self.assertEqual(mock_track_export_job.call_args.kwargs["kwargs"]["attempt"], 2)
+
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
+    def test_untracked_job_status_is_not_checked(self, mock_track_export_job):
+        self.track_export_job(job_id="new-job-id")
+        self.exporter.export_api = mock.MagicMock()
+        self.exporter.check_job_status(export=self.csv_export, job_id="previous-job-id", attempt=0, errors_count=0)
+        self.exporter.export_api.get_export_logs.assert_not_called()
+        mock_track_export_job.assert_not_called()
+
+    @mock.patch("exporters.exporters.base_exporter.notify_export_failed.delay")
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
+    def test_export_fails_after_too_many_job_status_errors(self, mock_track_export_job, mock_notify_export_failed):
+        self.track_export_job()
+        self.exporter.export_api = mock.MagicMock()
+        self.exporter.export_api.get_export_logs.side_effect = RequestException("unreachable")
+        self.exporter.check_job_status(export=self.csv_export, job_id="some-job-id", attempt=0, errors_count=0)
+        mock_track_export_job.assert_called_once()
+        self.exporter.check_job_status(export=self.csv_export, job_id="some-job-id", attempt=4, errors_count=JOB_STATUS_CHECK_MAX_ERRORS - 1)
+        mock_track_export_job.assert_called_once()
+        self.assertEqual(self.csv_export.request_job_status, JobStatus.failed)
+        mock_notify_export_failed.assert_called_once()
@@ -35,15 +35,20 @@ class TestCSVExporter(ExportersTestBase):
         with self.assertRaises(ValueError):
             self.exporter.validate(export_data=export_data, owner=self.csv_exporter_user)
 
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
     @mock.patch("exporters.exporters.base_exporter.notify_export_succeeded.delay")
     @mock.patch("exporters.exporters.base_exporter.notify_export_received.delay")
-    def test_successfully_handle_export(self, mock_notify_export_received, mock_notify_export_succeeded):
+    def test_successfully_handle_export(self, mock_notify_export_received, mock_notify_export_succeeded, mock_track_export_job):
         self.mock_export_api.required_table = "person"
         self.mock_export_api.target_environment = "target_environment"
         self.mock_export_api.launch_export.return_value = "some-job-id"
         self.mock_export_api.get_export_logs.return_value = {"task_status": "FinishedSuccessfully"}
         self.exporter.handle_export(export=self.csv_export)
         mock_notify_export_received.assert_called_once()
+        mock_track_export_job.assert_called_once()
+        self.assertEqual(self.csv_export.request_job_status, JobStatus.pending.value)
+        mock_notify_export_succeeded.assert_not_called()
+        self.exporter.check_job_status(export=self.csv_export, job_id="some-job-id", attempt=0, errors_count=0)
         mock_notify_export_succeeded.assert_called_once()
         self.assertEqual(self.csv_export.request_job_status, JobStatus.finished.value)
         self.assertIsNotNone(self.csv_export.request_job_id)
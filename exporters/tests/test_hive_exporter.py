@@ -2,6 +2,8 @@ from unittest import mock
 
 from requests import RequestException
 
+from admin_cohort.types import JobStatus
+from exporters.enums import APIJobType
 from exporters.exporters.hive_exporter import HiveExporter
 from exporters.tests.base_test import ExportersTestBase
 
@@ -59,19 +61,46 @@ class TestHiveExporter(ExportersTestBase):
         with self.assertRaises(ValueError):
             self.exporter.validate_tables_data(tables_data=tables_data)
 
-    def test_successfully_create_db(self):
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
+    def test_successfully_create_db(self, mock_track_export_job):
         self.mock_hadoop_api.create_db.return_value = "some-job-id"
-        self.mock_hadoop_api.get_export_logs.return_value = {"task_status": "FinishedSuccessfully"}
         self.exporter.create_db(export=self.hive_export)
         self.mock_hadoop_api.create_db.assert_called_once()
-        self.mock_hadoop_api.get_export_logs.assert_called_once()
+        mock_track_export_job.assert_called_once()
+        self.assertEqual(self.hive_export.tracked_job_id, "some-job-id")
+        self.assertEqual(self.hive_export.tracked_job_type, APIJobType.HIVE_DB_CREATE)
 
     def test_error_create_db(self):
-        self.mock_hadoop_api.create_db.return_value = "some-job-id"
-        self.mock_hadoop_api.get_export_logs.return_value = {"task_status": "FinishedWithError"}
+        self.mock_hadoop_api.create_db.side_effect = RequestException()
         with self.assertRaises(RequestException):
             self.exporter.create_db(export=self.hive_export)
 
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
+    def test_export_is_launched_once_db_is_created(self, mock_track_export_job):
+        self.mock_hadoop_api.create_db.return_value = "db-job-id"
+        self.mock_hadoop_api.get_export_logs.return_value = {"task_status": "FinishedSuccessfully"}
+        self.exporter.export_api = mock.MagicMock(required_table="person")
+        self.exporter.export_api.launch_export.return_value = "export-job-id"
+        self.exporter.create_db(export=self.hive_export)
+        self.exporter.check_job_status(export=self.hive_export, job_id="db-job-id", attempt=0, errors_count=0)
+        self.mock_hadoop_api.change_db_ownership.assert_called_once()
+        self.exporter.export_api.launch_export.assert_called_once()
+        self.assertEqual(mock_track_export_job.call_count, 2)
+        self.assertEqual(self.hive_export.tracked_job_id, "export-job-id")
+        self.assertEqual(self.hive_export.tracked_job_type, APIJobType.EXPORT)
+
+    @mock.patch("exporters.exporters.base_exporter.notify_export_failed.delay")
+    @mock.patch("exporters.exporters.base_exporter.track_export_job.apply_async")
+    def test_export_fails_if_db_creation_fails(self, mock_track_export_job, mock_notify_export_failed):
+        self.mock_hadoop_api.create_db.return_value = "db-job-id"
+        self.mock_hadoop_api.get_export_logs.return_value = {"task_status": "FinishedWithError"}
+        self.exporter.create_db(export=self.hive_export)
+        self.exporter.check_job_status(export=self.hive_export, job_id="db-job-id", attempt=0, errors_count=0)
+        self.assertEqual(self.hive_export.request_job_status, JobStatus.failed)
+        self.assertIn("Error while preparing DB", self.hive_export.request_job_fail_msg)
+        mock_notify_export_failed.assert_called_once()
+        self.mock_hadoop_api.change_db_ownership.assert_not_called()
+
     def test_successfully_change_db_ownership(self):
         self.mock_hadoop_api.change_db_ownership.return_value = None
         self.exporter.change_db_ownership(export=self.hive_export, db_user=self.hive_user)
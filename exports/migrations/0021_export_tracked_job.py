@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exports', '0020_alter_string_based_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='tracked_job_id',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='export',
+            name='tracked_job_started_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='export',
+            name='tracked_job_type',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
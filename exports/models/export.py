@@ -28,6 +28,9 @@ class Export(ExportsBaseModel, JobModel):
     motivation = models.TextField(null=True, blank=True)
     clean_datetime = models.DateTimeField(null=True)
     retried = models.BooleanField(null=False, default=False)
+    tracked_job_id = models.TextField(blank=True, default="")
+    tracked_job_type = models.CharField(blank=True, default="", max_length=20)
+    tracked_job_started_at = models.DateTimeField(null=True)
 
     class Meta:
         db_table = "export"
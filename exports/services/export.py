@@ -2,16 +2,17 @@ import logging
 from typing import List
 from urllib.parse import quote_plus
 
+from django.db import transaction
 from django.http import StreamingHttpResponse
 from requests.exceptions import RequestException
 from rest_framework.exceptions import ValidationError
 
 from admin_cohort.types import JobStatus
 from cohort.models import CohortResult, FhirFilter
-from cohort.services.cohort_result import cohort_service
+from cohort.services.cohort_result import CohortSubset, cohort_service
 from exports.models import ExportTable, Export
 from exports.services.export_operators import ExportDownloader, ExportManager
-from exports.tasks import launch_export_task, get_logs
+from exports.tasks import check_cohort_subsets_created, launch_export_task, get_logs
 
 _logger = logging.getLogger("info")
 
@@ -77,8 +78,9 @@ class ExportService:
             ).uuid
         )
 
+    @transaction.atomic
     def create_tables(self, export: Export, tables: List[dict], **kwargs) -> bool:
-        requires_cohort_subsets = False
+        export_tables, subsets, subset_tables = [], [], []
         for table in tables:
             fhir_filter_id = table.get("fhir_filter")
             cohort_source_id = table.get("cohort_result_source")
@@ -95,10 +97,19 @@ class ExportService:
                     table_name,
                 )
 
+            export_table = ExportTable(
+                export=export,
+                name=table_name or "",
+                fhir_filter_id=fhir_filter_id,
+                cohort_result_source=cohort_source,
+                columns=table.get("columns"),
+                pivot_merge=bool(table.get("pivot_merge")),
+                pivot_merge_columns=table.get("pivot_merge_columns"),
+                pivot_merge_ids=table.get("pivot_merge_ids"),
+            )
             if cohort_source and fhir_filter_id and table_name not in EXCLUDED_TABLES:
-                requires_cohort_subsets = True
                 _logger.info(
-                    "Export[%s]: creating cohort subset for table=%s (source_cohort_id=%s, fhir_filter_id=%s)",
+                    "Export[%s]: cohort subset required for table=%s (source_cohort_id=%s, fhir_filter_id=%s)",
                     export.uuid,
                     table_name,
                     cohort_source_id,
@@ -106,40 +117,24 @@ class ExportService:
                 )
                 if not isinstance(table_name, str) or not table_name or not fhir_filter_id:
                     raise ValidationError("table_name and fhir_filter_id are required for cohort subset")
-                cohort_subset = cohort_service.create_cohort_subset(
-                    request=kwargs.get("http_request"),
-                    owner_id=export.owner_id,
-                    table_name=table_name,
-                    fhir_filter_id=fhir_filter_id,
-                    source_cohort=cohort_source,
-                )
-
-                subset_id = cohort_subset.pk if cohort_subset else None
-                group_id = cohort_subset.group_id if cohort_subset else None
-                _logger.info(
-                    "Export[%s]: cohort subset created for table=%s (subset_id='%s', group_id='%s')",
-                    export.uuid,
-                    table_name,
-                    subset_id,
-                    group_id,
-                )
-
-            else:
-                cohort_subset = None
-
-            t = ExportTable.objects.create(
-                export=export,
-                name=table_name or "",
-                fhir_filter_id=fhir_filter_id,
-                cohort_result_source=cohort_source,
-                cohort_result_subset=cohort_subset,
-                columns=table.get("columns"),
-                pivot_merge=bool(table.get("pivot_merge")),
-                pivot_merge_columns=table.get("pivot_merge_columns"),
-                pivot_merge_ids=table.get("pivot_merge_ids"),
+                subsets.append(CohortSubset(table_name=table_name, source_cohort=cohort_source, fhir_filter_id=fhir_filter_id))
+                subset_tables.append(export_table)
+            export_tables.append(export_table)
+
+        if subsets:
+            created_subsets = cohort_service.create_cohort_subsets(
+                request=kwargs.get("http_request"),
+                owner_id=export.owner_id,
+                subsets=subsets,
+                callback=check_cohort_subsets_created.si(export_id=export.pk),
             )
-            _logger.info(f"Export[{export.uuid}]: table `{t.name}` created")
-        return requires_cohort_subsets
+            for export_table, cohort_subset in zip(subset_tables, created_subsets):
+                export_table.cohort_result_subset = cohort_subset
+            _logger.info(f"Export[{export.uuid}]: {len(subsets)} cohort subsets created in batch")
+
+        ExportTable.objects.bulk_create(export_tables)
+        _logger.info(f"Export[{export.uuid}]: tables created {[t.name for t in export_tables]}")
+        return bool(subsets)
 
     @staticmethod
     def check_all_cohort_subsets_created(export: Export):
@@ -147,19 +142,24 @@ class ExportService:
         if export.request_job_status == JobStatus.failed:
             _logger.info(f"Export[{export.uuid}]: export has already been marked failed")
             return
-        for table in export.export_tables.filter(cohort_result_subset__isnull=False):
-            subset = table.cohort_result_subset
-            if subset is None:
-                continue
-            cohort_subset_status = subset.request_job_status
-            if cohort_subset_status == JobStatus.failed:
-                failure_reason = "One or multiple cohort subsets has failed"
-                _logger.info(f"Export[{export.uuid}]: Aborting export - {failure_reason}")
-                ExportManager().mark_as_failed(export=export, reason=failure_reason)
-                return
-            elif cohort_subset_status != JobStatus.finished:
-                _logger.info(f"Export[{export.uuid}]: waiting for cohort subsets to finish before launching export")
-                return
+        subsets_statuses = set(
+            export.export_tables.filter(cohort_result_subset__isnull=False).values_list("cohort_result_subset__request_job_status", flat=True)
+        )
+        if any(JobStatus(s).is_end_state and s != JobStatus.finished for s in subsets_statuses):
+            failure_reason = "One or multiple cohort subsets has failed"
+            _logger.info(f"Export[{export.uuid}]: Aborting export - {failure_reason}")
+            ExportManager().mark_as_failed(export=export, reason=failure_reason)
+            return
+        if subsets_statuses - {JobStatus.finished}:
+            _logger.info(f"Export[{export.uuid}]: waiting for cohort subsets to finish before launching export")
+            return
+        # the chord callback and the last subset's PATCH callback may both get here, only the first one launches the export
+        launched = Export.objects.filter(pk=export.pk, request_job_status__in=(JobStatus.new, JobStatus.validated)).update(
+            request_job_status=JobStatus.pending
+        )
+        if not launched:
+            _logger.info(f"Export[{export.uuid}]: export already launched")
+            return
         _logger.info(f"Export[{export.uuid}]: all cohort subsets were successfully created. Launching export.")
         launch_export_task.delay(export.pk)
 
@@ -72,6 +72,11 @@ class ExportManager:
         exporter = self._get_exporter(export.output_format)
         exporter().handle_export(export=export)
 
+    def check_job_status(self, export_id: str, job_id: str, attempt: int, errors_count: int) -> None:
+        export = Export.objects.get(pk=export_id)
+        exporter = self._get_exporter(export.output_format)
+        exporter().check_job_status(export=export, job_id=job_id, attempt=attempt, errors_count=errors_count)
+
     def mark_as_failed(self, export: Export, reason: str) -> None:
         exporter = self._get_exporter(export.output_format)
         exporter().mark_export_as_failed(export=export, reason=reason)
@@ -15,6 +15,13 @@ def launch_export_task(export_id: str):
     ExportManager().handle_export(export_id=export_id)
 
 
+@shared_task
+def check_cohort_subsets_created(export_id: str):
+    from exports.services.export import export_service
+
+    export_service.check_all_cohort_subsets_created(export=Export.objects.get(pk=export_id))
+
+
 @celery_app.task()
 def delete_exported_files():
     ExportCleaner().delete_exported_files()
@@ -49,9 +49,9 @@ class TestServiceExport(ExportsTests):
         export_service.check_all_cohort_subsets_created(export=self.basic_export)
         mock_launch_export_task.assert_not_called()
 
-    @mock.patch("exports.services.export.cohort_service.create_cohort_subset")
+    @mock.patch("exports.services.export.cohort_service.create_cohort_subsets")
     def test_create_cohort_subsets_when_create_tables(self, mock_create_cohort_subset):
-        mock_create_cohort_subset.return_value = None
+        mock_create_cohort_subset.return_value = [None]
         tables = [
             {
                 "table_name": "person",
@@ -63,18 +63,40 @@ class TestServiceExport(ExportsTests):
         mock_create_cohort_subset.assert_called_once()
         self.assertTrue(requires_cohort_subsets)
 
-    @mock.patch("exports.services.export.cohort_service.create_cohort_subset")
+    @mock.patch("exports.services.export.cohort_service.create_cohort_subsets")
     def test_force_create_cohort_subsets_without_filter_when_create_tables(self, mock_create_cohort_subset):
-        mock_create_cohort_subset.return_value = None
+        mock_create_cohort_subset.return_value = [None]
         tables = [{"table_name": TABLES_REQUIRING_SUB_COHORTS[0], "cohort_result_source": self.main_cohort.uuid}]
         requires_cohort_subsets = export_service.create_tables(export=self.second_export, tables=tables)
         mock_create_cohort_subset.assert_called_once()
         self.assertTrue(requires_cohort_subsets)
 
-    @mock.patch("exports.services.export.cohort_service.create_cohort_subset")
+    @mock.patch("exports.services.export.cohort_service.create_cohort_subsets")
     def test_not_create_cohort_subsets_when_create_tables(self, mock_create_cohort_subset):
-        mock_create_cohort_subset.return_value = None
+        mock_create_cohort_subset.return_value = [None]
         tables = [{"table_name": EXCLUDED_TABLES[0], "cohort_result_source": self.main_cohort.uuid}]
         requires_cohort_subsets = export_service.create_tables(export=self.second_export, tables=tables)
         mock_create_cohort_subset.assert_not_called()
         self.assertFalse(requires_cohort_subsets)
+
+    @mock.patch("exports.services.export.cohort_service.create_cohort_subsets")
+    def test_cohort_subsets_are_created_in_one_batch_when_create_tables(self, mock_create_cohort_subsets):
+        mock_create_cohort_subsets.return_value = [None, None]
+        tables = [
+            {"table_name": table_name, "cohort_result_source": self.main_cohort.uuid, "fhir_filter": self.fhir_filter.uuid}
+            for table_name in ("person", "visit_occurrence")
+        ]
+        requires_cohort_subsets = export_service.create_tables(export=self.second_export, tables=tables)
+        mock_create_cohort_subsets.assert_called_once()
+        subsets = mock_create_cohort_subsets.call_args.kwargs["subsets"]
+        self.assertEqual([subset.table_name for subset in subsets], ["person", "visit_occurrence"])
+        self.assertEqual(mock_create_cohort_subsets.call_args.kwargs["callback"].kwargs, {"export_id": self.second_export.pk})
+        self.assertEqual(self.second_export.export_tables.count(), 2)
+        self.assertTrue(requires_cohort_subsets)
+
+    @mock.patch("exports.services.export.launch_export_task.delay")
+    def test_export_is_launched_once_when_checked_twice(self, mock_launch_export_task):
+        mock_launch_export_task.return_value = None
+        export_service.check_all_cohort_subsets_created(export=self.basic_export)
+        export_service.check_all_cohort_subsets_created(export=self.basic_export)
+        mock_launch_export_task.assert_called_once_with(self.basic_export.pk)